@@ -1,18 +1,24 @@
-from ._async.base import AsyncByteStream, AsyncHTTPTransport
+from ._async.base import AsyncByteStream, AsyncFileByteStream, AsyncHTTPTransport
 from ._async.connection_pool import AsyncConnectionPool
 from ._async.http_proxy import AsyncHTTPProxy
-from ._sync.base import SyncByteStream, SyncHTTPTransport
+from ._backends.base import AsyncResolver
+from ._backends.sync import SyncResolver
+from ._sync.base import SyncByteStream, SyncFileByteStream, SyncHTTPTransport
 from ._sync.connection_pool import SyncConnectionPool
 from ._sync.http_proxy import SyncHTTPProxy
 
 __all__ = [
     "AsyncHTTPTransport",
     "AsyncByteStream",
+    "AsyncFileByteStream",
     "AsyncConnectionPool",
     "AsyncHTTPProxy",
+    "AsyncResolver",
     "SyncHTTPTransport",
     "SyncByteStream",
+    "SyncFileByteStream",
     "SyncConnectionPool",
     "SyncHTTPProxy",
+    "SyncResolver",
 ]
 __version__ = "0.5.0"
@@ -1,6 +1,7 @@
 import enum
+import os
 from types import TracebackType
-from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Type
+from typing import Any, AsyncIterator, BinaryIO, Dict, List, Optional, Tuple, Type
 
 
 async def empty():
@@ -53,7 +54,40 @@ class AsyncByteStream:
         Yield bytes representing the request or response body.
         """
         async for chunk in self.iterator:
-            yield chunk
+            # Connections may yield views onto their own buffers, which are
+            # only copied here if the body is iterated over.
+            yield bytes(chunk)
+
+    async def readinto(self, buffer: memoryview) -> int:
+        """
+        Read up to `len(buffer)` bytes of the body into the buffer, returning
+        the number of bytes read, or zero once the body has been read.
+
+        Avoids allocating a new `bytes` for each chunk of the body. Should not
+        be mixed with iterating over the stream.
+
+        This is not a zero-copy path. For HTTP/1.1 responses `h11` still
+        allocates a new `bytearray` for each chunk of the body that it parses,
+        and the chunk is then copied into `buffer`.
+        """
+        if not hasattr(self, "_readinto_chunks"):
+            if type(self).__aiter__ is AsyncByteStream.__aiter__:
+                self._readinto_chunks = self.iterator.__aiter__()
+            else:
+                self._readinto_chunks = self.__aiter__()
+            self._readinto_pending = memoryview(b"")
+
+        pending = self._readinto_pending
+        while not pending:
+            try:
+                pending = memoryview(await self._readinto_chunks.__anext__())
+            except StopAsyncIteration:
+                return 0
+
+        num_bytes = min(len(buffer), len(pending))
+        buffer[:num_bytes] = pending[:num_bytes]
+        self._readinto_pending = pending[num_bytes:]
+        return num_bytes
 
     async def aclose(self) -> None:
         """
@@ -63,6 +97,53 @@ class AsyncByteStream:
             await self.close_func()
 
 
+class AsyncFileByteStream(AsyncByteStream):
+    """
+    A request body that is read from a file.
+
+    HTTP/1.1 connections send the file with `sendfile()` where the platform
+    and backend support it, rather than reading it in chunks. The request
+    headers should include either a `Content-Length` of `count` bytes, or
+    `Transfer-Encoding: chunked`.
+
+    **Parameters:**
+
+    * **file** - `BinaryIO` - A regular file, opened in binary mode.
+    * **offset** - `int` - The position in the file to start sending from.
+    * **count** - `Optional[int]` - The number of bytes to send. Defaults to the rest of the file.
+    * **close_func** - `Optional[Callable]` - A function to call when the stream is closed.
+    """
+
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(
+        self,
+        file: BinaryIO,
+        offset: int = 0,
+        count: int = None,
+        close_func: Any = None,
+    ) -> None:
+        self.file = file
+        self.offset = offset
+        if count is None:
+            count = os.fstat(file.fileno()).st_size - offset
+        self.count = count
+        self.close_func = close_func
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        """
+        Yield the file in chunks, for connections that cannot use `sendfile()`.
+        """
+        self.file.seek(self.offset)
+        remaining = self.count
+        while remaining:
+            chunk = self.file.read(min(remaining, self.CHUNK_SIZE))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
 class AsyncHTTPTransport:
     """
     The base interface for sending HTTP requests.
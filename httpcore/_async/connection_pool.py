@@ -1,9 +1,24 @@
-from ssl import SSLContext
-from typing import Callable, Dict, List, Optional, Set, Tuple
+import functools
+import heapq
+import itertools
+from collections import OrderedDict
+from ssl import SSLContext, SSLSession
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
 
-from .._backends.auto import AsyncSemaphore, AutoBackend
-from .._exceptions import PoolTimeout
+from .._backends.auto import (
+    HAPPY_EYEBALLS_DELAY,
+    AsyncEvent,
+    AsyncResolver,
+    AutoBackend,
+    SocketOption,
+)
+from .._buffers import MAX_READ_SIZE
+from .._dns import DNSCache
+from .._exceptions import ConnectError, ConnectTimeout, PoolTimeout
+from .._flowcontrol import CONNECTION_WINDOW_SIZE, STREAM_WINDOW_SIZE
 from .._threadlock import ThreadLock
+from .._tls import default_ssl_context
+from .._trace import TraceCallback, trace
 from .base import (
     AsyncByteStream,
     AsyncHTTPTransport,
@@ -11,22 +26,16 @@ from .base import (
     NewConnectionRequired,
 )
 from .connection import AsyncHTTPConnection
+from .http11 import is_pipelinable
+from .resolver import AsyncCachingResolver, AsyncResolvedResolver, AsyncSystemResolver
 
 Origin = Tuple[bytes, bytes, int]
 URL = Tuple[bytes, bytes, int, bytes]
 Headers = List[Tuple[bytes, bytes]]
 TimeoutDict = Dict[str, Optional[float]]
 
-
-class NullSemaphore(AsyncSemaphore):
-    def __init__(self) -> None:
-        pass
-
-    async def acquire(self, timeout: float = None) -> None:
-        return
-
-    def release(self) -> None:
-        return
+# The maximum number of origins to keep TLS sessions for.
+MAX_TLS_SESSIONS = 256
 
 
 class ResponseByteStream(AsyncByteStream):
@@ -50,6 +59,9 @@ class ResponseByteStream(AsyncByteStream):
         async for chunk in self.stream:
             yield chunk
 
+    async def readinto(self, buffer: memoryview) -> int:
+        return await self.stream.readinto(buffer)
+
     async def aclose(self):
         try:
             #  Call the underlying stream close callback.
@@ -62,17 +74,185 @@ class ResponseByteStream(AsyncByteStream):
             await self.callback(self.connection)
 
 
+class OriginConnections:
+    """
+    The set of connections in the pool for a single origin.
+
+    Connections are additionally indexed by their state, so that acquiring
+    a connection never requires a scan over every connection for the origin.
+    The pool is responsible for calling `update()` whenever it observes that
+    a connection may have changed state.
+
+    Running totals of connections by state and by HTTP version are also kept
+    up to date, so that reporting on them never requires a scan.
+
+    IDLE connections are also added to `idle_lru`, which is shared between all
+    the origins in the pool, and is ordered from least to most recently used.
+    """
+
+    def __init__(self, idle_lru: "OrderedDict[AsyncHTTPConnection, None]") -> None:
+        self.connections: Set[AsyncHTTPConnection] = set()
+        # IDLE connections, used as a LIFO stack so that we reuse the most
+        # recently released connection first.
+        self.idle: "OrderedDict[AsyncHTTPConnection, None]" = OrderedDict()
+        self.idle_lru = idle_lru
+        # PENDING connections, which HTTP/2 requests may attempt to share.
+        self.pending: Set[AsyncHTTPConnection] = set()
+        # ACTIVE HTTP/2 connections, which may accept further streams.
+        self.http2: Set[AsyncHTTPConnection] = set()
+        # Connections that have negotiated HTTP/1.1.
+        self.http11: Set[AsyncHTTPConnection] = set()
+        # ACTIVE HTTP/1.1 connections which may accept pipelined requests.
+        self.pipelining: Set[AsyncHTTPConnection] = set()
+        # The (state, http_version) of each connection when it was last updated.
+        self.observed: Dict[
+            AsyncHTTPConnection, Tuple[ConnectionState, Optional[str]]
+        ] = {}
+        self.state_counts: Dict[ConnectionState, int] = {}
+        self.http_version_counts: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.connections)
+
+    def __iter__(self) -> Iterator[AsyncHTTPConnection]:
+        return iter(self.connections)
+
+    def __contains__(self, connection: object) -> bool:
+        return connection in self.connections
+
+    def add(self, connection: AsyncHTTPConnection) -> None:
+        self.connections.add(connection)
+        self.update(connection)
+
+    def remove(self, connection: AsyncHTTPConnection) -> None:
+        self.connections.remove(connection)
+        self.discard_idle(connection)
+        self.pending.discard(connection)
+        self.http2.discard(connection)
+        self.http11.discard(connection)
+        self.pipelining.discard(connection)
+        self._uncount(connection)
+
+    def update(self, connection: AsyncHTTPConnection) -> None:
+        """
+        Re-index a connection according to its current state.
+        """
+        if connection not in self.connections:
+            return
+
+        self.discard_idle(connection)
+        self.pending.discard(connection)
+        self.http2.discard(connection)
+        self.pipelining.discard(connection)
+
+        state = connection.state
+        if connection.is_http11:
+            self.http11.add(connection)
+        if connection.is_retired:
+            # Retired connections may not be acquired for any new requests.
+            pass
+        elif state == ConnectionState.IDLE:
+            self.idle[connection] = None
+            self.idle_lru[connection] = None
+        elif state == ConnectionState.PENDING:
+            self.pending.add(connection)
+        elif state == ConnectionState.ACTIVE and connection.is_http2:
+            self.http2.add(connection)
+        elif state == ConnectionState.ACTIVE and connection.can_pipeline():
+            self.pipelining.add(connection)
+
+        observed = (state, connection.http_version)
+        if self.observed.get(connection) != observed:
+            self._uncount(connection)
+            self.observed[connection] = observed
+            self.state_counts[state] = self.state_counts.get(state, 0) + 1
+            if observed[1] is not None:
+                self.http_version_counts[observed[1]] = (
+                    self.http_version_counts.get(observed[1], 0) + 1
+                )
+
+    def pop_idle(self) -> Optional[AsyncHTTPConnection]:
+        """
+        Remove and return the most recently released IDLE connection.
+        """
+        if not self.idle:
+            return None
+        connection, _ = self.idle.popitem()
+        self.idle_lru.pop(connection, None)
+        return connection
+
+    def discard_idle(self, connection: AsyncHTTPConnection) -> None:
+        """
+        Remove a connection from the IDLE indexes, if present.
+        """
+        if connection in self.idle:
+            del self.idle[connection]
+            del self.idle_lru[connection]
+
+    def _uncount(self, connection: AsyncHTTPConnection) -> None:
+        observed = self.observed.pop(connection, None)
+        if observed is None:
+            return
+
+        state, http_version = observed
+        self.state_counts[state] -= 1
+        if not self.state_counts[state]:
+            del self.state_counts[state]
+        if http_version is not None:
+            self.http_version_counts[http_version] -= 1
+            if not self.http_version_counts[http_version]:
+                del self.http_version_counts[http_version]
+
+
+class ConnectionWaiter:
+    """
+    A request that is waiting for a connection, because the pool has
+    reached `max_connections`.
+
+    Waiters are served in FIFO order. A waiter is either handed an IDLE
+    connection for its origin as soon as one is released, or is granted
+    the slot of a connection that has been removed from the pool, so that
+    it may open a new connection.
+    """
+
+    def __init__(self, origin: Origin, event: AsyncEvent) -> None:
+        self.origin = origin
+        self.event = event
+        self.connection: Optional[AsyncHTTPConnection] = None
+        self.granted_slot = False
+
+
 class AsyncConnectionPool(AsyncHTTPTransport):
     """
     A connection pool for making HTTP requests.
 
     **Parameters:**
 
-    * **ssl_context** - `Optional[SSLContext]` - An SSL context to use for verifying connections.
+    * **ssl_context** - `Optional[SSLContext]` - An SSL context to use for verifying connections. Defaults to a shared context that verifies certificates against the system trust store.
     * **max_connections** - `Optional[int]` - The maximum number of concurrent connections to allow.
+    * **max_connections_per_origin** - `Optional[int]` - The maximum number of concurrent connections to allow to any single origin.
+    * **origin_max_connections** - `Optional[Dict[Tuple[bytes, bytes, int], int]]` - Overrides `max_connections_per_origin` for specific origins, given as 3-tuples of (scheme, host, port).
     * **max_keepalive** - `Optional[int]` - The maximum number of connections to allow before closing keep-alive connections.
     * **keepalive_expiry** - `Optional[float]` - The maximum time to allow before closing a keep-alive connection.
+    * **keepalive_reaper** - `bool` - Close expired keep-alive connections from a background task, rather than while handling requests.
+    * **max_requests_per_connection** - `Optional[int]` - The maximum number of requests to send on a connection before retiring it.
+    * **max_connection_age** - `Optional[float]` - The maximum time in seconds after a connection is established before retiring it.
+    * **happy_eyeballs_delay** - `float` - The delay in seconds before racing a connection attempt to the next address for a host, if the previous attempt has not yet succeeded.
+    * **resolver** - `Optional[AsyncResolver]` - A resolver to use for looking up the addresses for a hostname. Defaults to the concurrency backend's `getaddrinfo()`.
+    * **dns_cache_ttl** - `Optional[float]` - The time in seconds to cache the addresses for a hostname, shared by all connections in the pool. Defaults to `None`, which disables DNS caching.
+    * **dns_cache_negative_ttl** - `float` - The time in seconds to cache a failure to resolve a hostname, if DNS caching is enabled. Defaults to `0`, which never caches failures.
+    * **dns_cache_max_entries** - `int` - The maximum number of hostnames to cache, evicting the least recently used hostname beyond this.
+    * **uds** - `Optional[str]` - The path to a Unix domain socket to connect through, rather than opening a TCP connection to each origin. The origin is still used for the Host header, TLS and pooling.
+    * **socket_options** - `Optional[List[Tuple[int, int, Union[int, bytes]]]]` - Options to set on each TCP socket before connecting, as (level, option, value) tuples for `socket.setsockopt()`. For example `[(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]`.
+    * **local_address** - `Optional[str]` - The local IP address to bind each TCP socket to, in order to connect from a specific interface.
+    * **pipeline_depth** - `int` - The number of requests that may be in flight at once on each HTTP/1.1 connection. Values greater than 1 enable pipelining of GET and HEAD requests without a body. A pipelined request waits at most the "pool" timeout for the responses ahead of it to be read. Defaults to 1, which disables pipelining.
+    * **read_buffer_size** - `Optional[int]` - The number of bytes to read from each connection at a time, initially. Defaults to 4096.
+    * **max_read_buffer_size** - `int` - The number of bytes that the read size may grow to, while reads continue to fill the buffer. The read size returns to `read_buffer_size` once a connection is idle.
     * **http2** - `bool` - Enable HTTP/2 support.
+    * **http2_stream_window_size** - `int` - The HTTP/2 flow control window for each response, which bounds how much of its body the server may send before it is read. Defaults to 16 MiB.
+    * **http2_connection_window_size** - `int` - The HTTP/2 flow control window shared by all of the responses on a connection. Defaults to 16 MiB.
+    * **http2_max_window_size** - `Optional[int]` - If set, the HTTP/2 windows start at the sizes above, and grow up to this size as the connection's bandwidth-delay product, measured with PING frames, calls for. Defaults to `None`, which keeps the windows fixed.
+    * **trace** - `Optional[Callable[[str, Dict[str, Any]], None]]` - A callback that is invoked at the start and end of each phase of a request, with the event name and a dictionary including a monotonic "timestamp".
     """
 
     def __init__(
@@ -82,30 +262,97 @@ class AsyncConnectionPool(AsyncHTTPTransport):
         max_keepalive: int = None,
         keepalive_expiry: float = None,
         http2: bool = False,
+        max_connections_per_origin: int = None,
+        origin_max_connections: Dict[Origin, int] = None,
+        keepalive_reaper: bool = False,
+        trace: TraceCallback = None,
+        max_requests_per_connection: int = None,
+        max_connection_age: float = None,
+        happy_eyeballs_delay: float = HAPPY_EYEBALLS_DELAY,
+        resolver: AsyncResolver = None,
+        dns_cache_ttl: float = None,
+        dns_cache_negative_ttl: float = 0.0,
+        dns_cache_max_entries: int = 256,
+        uds: str = None,
+        socket_options: List[SocketOption] = None,
+        local_address: str = None,
+        pipeline_depth: int = 1,
+        read_buffer_size: int = None,
+        max_read_buffer_size: int = MAX_READ_SIZE,
+        http2_stream_window_size: int = STREAM_WINDOW_SIZE,
+        http2_connection_window_size: int = CONNECTION_WINDOW_SIZE,
+        http2_max_window_size: int = None,
     ):
-        self.ssl_context = SSLContext() if ssl_context is None else ssl_context
+        if ssl_context is None:
+            ssl_context = default_ssl_context(http2)
+        elif http2:
+            # Enable HTTP/2 on the given context once, rather than for every
+            # new connection.
+            ssl_context.set_alpn_protocols(["http/1.1", "h2"])
+        self.ssl_context = ssl_context
         self.max_connections = max_connections
+        self.max_connections_per_origin = max_connections_per_origin
+        self.origin_max_connections = (
+            {} if origin_max_connections is None else origin_max_connections
+        )
         self.max_keepalive = max_keepalive
         self.keepalive_expiry = keepalive_expiry
         self.http2 = http2
-        self.connections: Dict[Origin, Set[AsyncHTTPConnection]] = {}
+        self.keepalive_reaper = keepalive_reaper
+        self.trace = trace
+        self.max_requests_per_connection = max_requests_per_connection
+        self.max_connection_age = max_connection_age
+        self.happy_eyeballs_delay = happy_eyeballs_delay
+        self.uds = uds
+        self.socket_options = socket_options
+        self.local_address = local_address
+        self.pipeline_depth = pipeline_depth
+        self.read_buffer_size = read_buffer_size
+        self.max_read_buffer_size = max_read_buffer_size
+        self.http2_stream_window_size = http2_stream_window_size
+        self.http2_connection_window_size = http2_connection_window_size
+        self.http2_max_window_size = http2_max_window_size
+        self.resolver = AsyncSystemResolver() if resolver is None else resolver
+        if dns_cache_ttl is not None:
+            cache = DNSCache(
+                ttl=dns_cache_ttl,
+                negative_ttl=dns_cache_negative_ttl,
+                max_entries=dns_cache_max_entries,
+            )
+            self.resolver = AsyncCachingResolver(self.resolver, cache)
+        self.connections: Dict[Origin, OriginConnections] = {}
+        # IDLE connections for every origin, from least to most recently used.
+        self.idle_connections: "OrderedDict[AsyncHTTPConnection, None]" = (
+            OrderedDict()
+        )
+        # The number of connection slots in use. This includes any slots that
+        # have been granted to waiters which are about to open a connection.
+        self.num_connections = 0
+        self.num_origin_connections: Dict[Origin, int] = {}
+        self.waiters: "OrderedDict[ConnectionWaiter, None]" = OrderedDict()
+        self.origin_waiters: Dict[Origin, "OrderedDict[ConnectionWaiter, None]"] = {}
+        # HTTP/2 connections to other origins, that have been found to be
+        # reusable for requests to an origin. See `_coalesce_connection()`.
+        self.coalesced_connections: Dict[Origin, AsyncHTTPConnection] = {}
+        # The most recent TLS session for each origin, from least to most
+        # recently used, so that new connections may resume them.
+        self.tls_sessions: "OrderedDict[Origin, SSLSession]" = OrderedDict()
         self.thread_lock = ThreadLock()
         self.backend = AutoBackend()
-        self.next_keepalive_check = 0.0
-
-    @property
-    def connection_semaphore(self) -> AsyncSemaphore:
-        # We do this lazily, to make sure backend autodetection always
-        # runs within an async context.
-        if not hasattr(self, "_connection_semaphore"):
-            if self.max_connections is not None:
-                self._connection_semaphore = self.backend.create_semaphore(
-                    self.max_connections, exc_class=PoolTimeout
-                )
-            else:
-                self._connection_semaphore = NullSemaphore()
-
-        return self._connection_semaphore
+        # A min-heap of (expires_at, sequence, connection) entries for IDLE
+        # connections. Entries are not removed when a connection is reused,
+        # instead they are ignored if `expires_at` no longer matches.
+        self.expiry_heap: List[Tuple[float, int, AsyncHTTPConnection]] = []
+        self.expiry_sequence = itertools.count()
+        self.reaper_closed_event: Optional[AsyncEvent] = None
+        self.is_closed = False
+        # Running totals, as reported by `stats()`.
+        self.num_connects = 0
+        self.num_reuses = 0
+        self.num_closes = 0
+        self.num_waits = 0
+        self.num_pool_timeouts = 0
+        self.wait_time = 0.0
 
     async def request(
         self,
@@ -117,156 +364,754 @@ class AsyncConnectionPool(AsyncHTTPTransport):
     ) -> Tuple[bytes, int, bytes, Headers, AsyncByteStream]:
         timeout = {} if timeout is None else timeout
         origin = url[:3]
+        pipeline = self.pipeline_depth > 1 and is_pipelinable(method, headers or [])
 
         if self.keepalive_expiry is not None:
             await self._keepalive_sweep()
 
         connection: Optional[AsyncHTTPConnection] = None
         while connection is None:
-            connection = await self._get_connection_from_pool(origin)
-            is_new_connection = False
-
-            if connection is None:
-                connection = AsyncHTTPConnection(
-                    origin=origin, http2=self.http2, ssl_context=self.ssl_context,
+            with trace(
+                self.trace,
+                self.backend.time,
+                "connection_pool.acquire_connection",
+                url=url,
+            ):
+                connection = await self._acquire_connection(
+                    origin, timeout=timeout, pipeline=pipeline
                 )
-                await self._add_to_pool(connection, timeout=timeout)
 
             try:
                 response = await connection.request(
                     method, url, headers=headers, stream=stream, timeout=timeout
                 )
             except NewConnectionRequired:
+                await self._update_connection_state(connection)
                 connection = None
             except:
                 await self._remove_from_pool(connection)
                 raise
 
+        await self._update_connection_state(connection)
+
         wrapped_stream = ResponseByteStream(
             response[4], connection=connection, callback=self._response_closed
         )
         return response[0], response[1], response[2], response[3], wrapped_stream
 
-    async def _get_connection_from_pool(
-        self, origin: Origin
+    async def warm(
+        self, origin: Origin, count: int, timeout: TimeoutDict = None
+    ) -> int:
+        """
+        Concurrently open up to `count` new connections to the given origin,
+        and add them to the pool as IDLE keep-alive connections.
+
+        Connections are only opened while the pool has free connection slots,
+        and while the number of connections is within `max_keepalive`.
+
+        **Parameters:**
+
+        * **origin** - `Tuple[bytes, bytes, int]` - The origin to connect to, as a 3-tuple of (scheme, host, port).
+        * **count** - `int` - The number of connections to open.
+        * **timeout** - `Optional[Dict[str, Optional[float]]]` - A dictionary of timeout values for I/O operations.
+
+        **Returns:**
+
+        The number of connections that were opened.
+        """
+        timeout = {} if timeout is None else timeout
+        connections: List[AsyncHTTPConnection] = []
+        errors: List[Exception] = []
+
+        if self.keepalive_expiry is not None:
+            await self._keepalive_sweep()
+
+        async with self.thread_lock:
+            while len(connections) < count and self._has_free_slot(origin):
+                if (
+                    self.max_keepalive is not None
+                    and self.num_connections >= self.max_keepalive
+                ):
+                    break
+                self._take_slot(origin)
+                connection = AsyncHTTPConnection(
+                    origin=origin,
+                    http2=self.http2,
+                    ssl_context=self.ssl_context,
+                    trace=self.trace,
+                    happy_eyeballs_delay=self.happy_eyeballs_delay,
+                    resolver=self.resolver,
+                    uds=self.uds,
+                    socket_options=self.socket_options,
+                    local_address=self.local_address,
+                    tls_session=self.tls_sessions.get(origin),
+                    pipeline_depth=self.pipeline_depth,
+                    read_buffer_size=self.read_buffer_size,
+                    max_read_buffer_size=self.max_read_buffer_size,
+                    http2_stream_window_size=self.http2_stream_window_size,
+                    http2_connection_window_size=self.http2_connection_window_size,
+                    http2_max_window_size=self.http2_max_window_size,
+                )
+                connections.append(connection)
+
+        async def open_connection(connection: AsyncHTTPConnection) -> None:
+            await self._add_to_pool(connection)
+            try:
+                await connection.connect(timeout)
+            except Exception as exc:
+                errors.append(exc)
+                await self._remove_from_pool(connection)
+            else:
+                # Release the newly IDLE connection, exactly as if it had
+                # just finished handling a response.
+                await self._response_closed(connection)
+
+        await self.backend.run_concurrently(
+            [
+                functools.partial(open_connection, connection)
+                for connection in connections
+            ]
+        )
+
+        if errors and len(errors) == len(connections):
+            raise errors[0]
+        return len(connections) - len(errors)
+
+    async def stats(self) -> Dict[str, Any]:
+        """
+        Return a snapshot of the state of the pool, and of its activity so far.
+
+        The counts are maintained as the pool runs, so this is cheap to call.
+        Connection states are as last observed by the pool, which is whenever
+        a connection is acquired, begins a request, or is released.
+
+        **Returns:**
+
+        A dictionary with the following keys:
+
+        * **connections** - `int` - The number of connection slots in use.
+        * **connects** - `int` - The total number of connections opened.
+        * **reuses** - `int` - The total number of times an existing connection was reused.
+        * **closes** - `int` - The total number of connections removed from the pool.
+        * **waits** - `int` - The total number of times a request waited for a connection.
+        * **wait_time** - `float` - The total time in seconds spent waiting for a connection.
+        * **pool_timeouts** - `int` - The number of waits that ended in a `PoolTimeout`.
+        * **origins** - `Dict[Tuple[bytes, bytes, int], Dict[str, Any]]` - For each origin, the number of `connections`, the connection counts by `states` and by `http_versions`, and a list of per-connection `bytes_read` and `bytes_written`.
+        """
+        async with self.thread_lock:
+            origins = {
+                origin: {
+                    "connections": len(connections),
+                    "states": {
+                        state.name: count
+                        for state, count in connections.state_counts.items()
+                    },
+                    "http_versions": dict(connections.http_version_counts),
+                    "bytes_read": [c.bytes_read for c in connections],
+                    "bytes_written": [c.bytes_written for c in connections],
+                }
+                for origin, connections in self.connections.items()
+            }
+            return {
+                "connections": self.num_connections,
+                "connects": self.num_connects,
+                "reuses": self.num_reuses,
+                "closes": self.num_closes,
+                "waits": self.num_waits,
+                "wait_time": self.wait_time,
+                "pool_timeouts": self.num_pool_timeouts,
+                "origins": origins,
+            }
+
+    async def _acquire_connection(
+        self, origin: Origin, timeout: TimeoutDict, pipeline: bool = False
+    ) -> AsyncHTTPConnection:
+        """
+        Return a connection for the given origin, either by reusing an
+        existing connection, or by adding a new connection to the pool.
+        If `pipeline` is set, the request may also be queued on an ACTIVE
+        HTTP/1.1 connection.
+
+        If the pool is at its `max_connections` limit, or the origin is at its
+        per-origin limit, then we queue up and wait until either a connection
+        for this origin is released, or a connection slot becomes available.
+        """
+        connections_to_close: List[AsyncHTTPConnection] = []
+        waiter = None
+        resolver = self.resolver
+
+        if self.http2 and origin[0] == b"https" and self.uds is None:
+            # Every origin shares the same socket path, so coalescing based on
+            # the resolved addresses does not apply.
+            addresses = await self._coalesce_connection(origin, timeout)
+            if addresses is not None:
+                # Don't look the host up again if we open a new connection.
+                resolver = AsyncResolvedResolver(
+                    self.resolver, origin[1], origin[2], addresses
+                )
+
+        async with self.thread_lock:
+            connection = self._get_connection_from_pool(
+                origin, connections_to_close, pipeline
+            )
+            if connection is None:
+                if self._at_global_limit() and self._has_free_origin_slot(origin):
+                    # Release the slot of an IDLE connection to some other
+                    # origin, rather than waiting on it to expire. The slot
+                    # goes to any older waiter that can use it first.
+                    evicted = self._pop_idle_connection()
+                    if evicted is not None:
+                        self._discard_connection(evicted)
+                        connections_to_close.append(evicted)
+
+                if self._has_free_slot(origin):
+                    self._take_slot(origin)
+                else:
+                    waiter = ConnectionWaiter(origin, self.backend.create_event())
+                    self._enqueue_waiter(waiter)
+            else:
+                self.num_reuses += 1
+
+        for dropped in connections_to_close:
+            await dropped.aclose()
+
+        if connection is not None:
+            return connection
+
+        if waiter is not None:
+            connection = await self._wait_for_connection(waiter, timeout)
+            if connection is not None:
+                return connection
+
+        # We now hold a connection slot, so we can open a new connection.
+        connection = AsyncHTTPConnection(
+            origin=origin,
+            http2=self.http2,
+            ssl_context=self.ssl_context,
+            trace=self.trace,
+            happy_eyeballs_delay=self.happy_eyeballs_delay,
+            resolver=resolver,
+            uds=self.uds,
+            socket_options=self.socket_options,
+            local_address=self.local_address,
+            tls_session=self.tls_sessions.get(origin),
+            pipeline_depth=self.pipeline_depth,
+            read_buffer_size=self.read_buffer_size,
+            max_read_buffer_size=self.max_read_buffer_size,
+            http2_stream_window_size=self.http2_stream_window_size,
+            http2_connection_window_size=self.http2_connection_window_size,
+            http2_max_window_size=self.http2_max_window_size,
+        )
+        await self._add_to_pool(connection)
+        return connection
+
+    async def _wait_for_connection(
+        self, waiter: ConnectionWaiter, timeout: TimeoutDict
+    ) -> Optional[AsyncHTTPConnection]:
+        """
+        Wait until the waiter is handed a connection, or granted a connection
+        slot. Returns the connection that was handed over, if any.
+        """
+        started = self.backend.time()
+        try:
+            await waiter.event.wait(timeout=timeout.get("pool", None))
+        except BaseException:
+            await self._cancel_waiter(waiter)
+            raise
+        elapsed = self.backend.time() - started
+
+        async with self.thread_lock:
+            self.num_waits += 1
+            self.wait_time += elapsed
+            if waiter.connection is None and not waiter.granted_slot:
+                self._dequeue_waiter(waiter)
+                self.num_pool_timeouts += 1
+                raise PoolTimeout()
+            if waiter.connection is not None:
+                self.num_reuses += 1
+        return waiter.connection
+
+    async def _cancel_waiter(self, waiter: ConnectionWaiter) -> None:
+        """
+        Clean up after a waiter that was cancelled, returning anything that
+        it was given in the meantime.
+        """
+        connection_to_close = None
+
+        async with self.thread_lock:
+            self._dequeue_waiter(waiter)
+            connection = waiter.connection
+            if connection is not None:
+                # A connection that has been handed over but not yet used
+                # cannot be returned to IDLE, so we close it instead.
+                # Shared HTTP/2 connections that are in use are left alone.
+                if connection.state == ConnectionState.READY:
+                    self._discard_connection(connection)
+                    connection_to_close = connection
+            elif waiter.granted_slot:
+                self._release_slot(waiter.origin)
+
+        if connection_to_close is not None:
+            await connection_to_close.aclose()
+
+    def _get_connection_from_pool(
+        self,
+        origin: Origin,
+        connections_to_close: List[AsyncHTTPConnection],
+        pipeline: bool = False,
     ) -> Optional[AsyncHTTPConnection]:
-        # Determine expired keep alive connections on this origin.
-        seen_http11 = False
-        pending_connection = None
+        """
+        Return a reusable connection for the given origin, if one exists.
+
+        Any dropped connections that are found are removed from the pool, and
+        added to `connections_to_close`. Must be called with the thread lock held.
+        """
+        connections = self.connections.get(origin)
+        if connections is None:
+            return self._get_coalesced_connection(origin)
+
         reuse_connection = None
-        connections_to_close = set()
-
-        for connection in self._connections_for_origin(origin):
-            if connection.is_http11:
-                seen_http11 = True
-
-            if connection.state == ConnectionState.IDLE:
-                if connection.is_connection_dropped():
-                    # IDLE connections that have been dropped should be
-                    # removed from the pool.
-                    connections_to_close.add(connection)
-                    await self._remove_from_pool(connection)
-                else:
-                    # IDLE connections that are still maintained may
-                    # be reused.
-                    reuse_connection = connection
-            elif connection.state == ConnectionState.ACTIVE and connection.is_http2:
-                # HTTP/2 connections may be reused.
-                reuse_connection = connection
-            elif connection.state == ConnectionState.PENDING:
-                # Pending connections may potentially be reused.
-                pending_connection = connection
+
+        while reuse_connection is None and connections.http2:
+            # ACTIVE HTTP/2 connections may be reused, unless they are due to
+            # be retired, in which case they are closed once their streams
+            # have completed.
+            active = next(iter(connections.http2))
+            if self._check_retirement(active):
+                connections.update(active)
+            else:
+                reuse_connection = active
+
+        while reuse_connection is None and connections.idle:
+            idle = connections.pop_idle()
+            assert idle is not None
+            if idle.is_connection_dropped() or self._check_retirement(idle):
+                # IDLE connections that have been dropped, or are due to be
+                # retired, should be removed from the pool.
+                self._discard_connection(idle)
+                connections_to_close.append(idle)
+            else:
+                # IDLE connections that are still maintained may
+                # be reused.
+                reuse_connection = idle
+
+        while reuse_connection is None and pipeline and connections.pipelining:
+            # Queue the request on an ACTIVE HTTP/1.1 connection, if one has
+            # room for it, rather than opening a new connection. Connections
+            # that have filled up since they were indexed are re-indexed once
+            # a response on them is closed.
+            active = next(iter(connections.pipelining))
+            if active.can_pipeline() and not self._check_retirement(active):
+                return active
+            connections.pipelining.discard(active)
 
         if reuse_connection is not None:
             # Mark the connection as READY before we return it, to indicate
             # that if it is HTTP/1.1 then it should not be re-acquired.
             reuse_connection.mark_as_ready()
             reuse_connection.expires_at = None
-        elif self.http2 and pending_connection is not None and not seen_http11:
+            connections.update(reuse_connection)
+        elif self.http2 and connections.pending and not connections.http11:
             # If we have a PENDING connection, and no HTTP/1.1 connections
             # on this origin, then we can attempt to share the connection.
-            reuse_connection = pending_connection
-
-        # Close any dropped connections.
-        for connection in connections_to_close:
-            await connection.aclose()
+            reuse_connection = next(iter(connections.pending))
 
         return reuse_connection
 
+    async def _coalesce_connection(
+        self, origin: Origin, timeout: TimeoutDict
+    ) -> Optional[List[str]]:
+        """
+        If there are no connections to an origin, then look for an HTTP/2
+        connection to another origin on the same port that may be reused for
+        it instead, as described in RFC 7540, section 9.1.1.
+
+        Returns the addresses that the origin's host resolved to, if it had to
+        be looked up and no connection could be reused.
+        """
+        async with self.thread_lock:
+            if origin in self.connections or self._get_coalesced_connection(
+                origin, acquire=False
+            ):
+                return None
+            candidates = [
+                connection
+                for other, connections in self.connections.items()
+                if (other[0], other[2]) == (origin[0], origin[2])
+                for connection in connections
+                if connection.is_http2
+            ]
+
+        if not candidates:
+            return None
+
+        try:
+            addresses = await self.resolver.resolve(origin[1], origin[2], timeout)
+        except (ConnectError, ConnectTimeout):
+            # We'll raise an appropriate error when opening a new connection.
+            return None
+
+        async with self.thread_lock:
+            for connection in candidates:
+                if connection.can_coalesce(origin, addresses):
+                    self.coalesced_connections[origin] = connection
+                    return None
+        return addresses
+
+    def _get_coalesced_connection(
+        self, origin: Origin, acquire: bool = True
+    ) -> Optional[AsyncHTTPConnection]:
+        """
+        Return an HTTP/2 connection to another origin that may be reused for
+        this origin, if it is still usable. If `acquire` is set then an IDLE
+        connection is marked as READY. Must be called with the thread lock held.
+        """
+        connection = self.coalesced_connections.get(origin)
+        if connection is None:
+            return None
+
+        connections = self.connections.get(connection.origin)
+        if connections is None or connection not in connections:
+            # The connection has since been removed from the pool.
+            del self.coalesced_connections[origin]
+            return None
+
+        if connection in connections.idle:
+            if connection.is_connection_dropped():
+                return None
+            if acquire:
+                connections.discard_idle(connection)
+                connection.mark_as_ready()
+                connection.expires_at = None
+                connections.update(connection)
+            return connection
+        elif not connection.is_retired and connection.state in (
+            ConnectionState.READY,
+            ConnectionState.ACTIVE,
+        ):
+            return connection
+        return None
+
+    def _pop_idle_connection(self) -> Optional[AsyncHTTPConnection]:
+        """
+        Remove and return the least recently used IDLE connection for any
+        origin, if one exists.
+        """
+        if not self.idle_connections:
+            return None
+        connection = next(iter(self.idle_connections))
+        self.connections[connection.origin].discard_idle(connection)
+        return connection
+
     async def _response_closed(self, connection: AsyncHTTPConnection):
-        remove_from_pool = False
-        close_connection = False
-
-        if connection.state == ConnectionState.CLOSED:
-            remove_from_pool = True
-        elif connection.state == ConnectionState.IDLE:
-            num_connections = len(self._get_all_connections())
-            if self.max_keepalive is not None and num_connections > self.max_keepalive:
-                remove_from_pool = True
-                close_connection = True
-            elif self.keepalive_expiry is not None:
-                now = self.backend.time()
-                connection.expires_at = now + self.keepalive_expiry
-
-        if remove_from_pool:
-            await self._remove_from_pool(connection)
+        connection_to_close = None
 
-        if close_connection:
-            await connection.aclose()
+        async with self.thread_lock:
+            if connection.state == ConnectionState.CLOSED:
+                self._discard_connection(connection)
+            elif connection.state == ConnectionState.IDLE:
+                self._save_tls_session(connection)
+                if self._check_retirement(connection):
+                    self._discard_connection(connection)
+                    connection_to_close = connection
+                elif self._hand_off_connection(connection):
+                    pass
+                else:
+                    if self.keepalive_expiry is not None:
+                        now = self.backend.time()
+                        self._set_expiry(connection, now + self.keepalive_expiry)
+                    self._update_index(connection)
+
+                    if self._next_waiter(ignore_global_limit=True) is not None or (
+                        self.max_keepalive is not None
+                        and self.num_connections > self.max_keepalive
+                    ):
+                        # Either requests to other origins are waiting for a
+                        # connection slot, or we have too many keep-alive
+                        # connections, so close the least recently used
+                        # IDLE connection, which may be this one.
+                        connection_to_close = self._pop_idle_connection()
+                        if connection_to_close is not None:
+                            self._discard_connection(connection_to_close)
+            else:
+                self._save_tls_session(connection)
+                self._update_index(connection)
+
+        if connection_to_close is not None:
+            await connection_to_close.aclose()
 
-    async def _keepalive_sweep(self):
+    def _save_tls_session(self, connection: AsyncHTTPConnection) -> None:
         """
-        Remove any IDLE connections that have expired past their keep-alive time.
+        Remember the TLS session for a connection, so that later connections
+        to the same origin can use an abbreviated handshake. We do this once
+        a response has been read, since TLS 1.3 servers only issue session
+        tickets after the handshake. Must be called with the thread lock held.
+        """
+        session = connection.tls_session
+        if session is None:
+            return
+        self.tls_sessions[connection.origin] = session
+        self.tls_sessions.move_to_end(connection.origin)
+        while len(self.tls_sessions) > MAX_TLS_SESSIONS:
+            self.tls_sessions.popitem(last=False)
+
+    async def _keepalive_sweep(self) -> None:
+        """
+        Remove any IDLE connections that have expired past their keep-alive time,
+        or if the background reaper is enabled, ensure that it is running.
         """
         assert self.keepalive_expiry is not None
 
-        now = self.backend.time()
-        if now < self.next_keepalive_check:
-            return
+        if not self.keepalive_reaper:
+            await self._close_expired_connections()
+        elif self.reaper_closed_event is None:
+            async with self.thread_lock:
+                start_reaper = self.reaper_closed_event is None
+                if start_reaper:
+                    self.reaper_closed_event = self.backend.create_event()
+            if start_reaper:
+                self.backend.start_background_task(self._keepalive_reaper)
 
-        self.next_keepalive_check = now + 1.0
-        connections_to_close = set()
+    async def _keepalive_reaper(self) -> None:
+        """
+        Close IDLE connections as they expire, until the pool is closed.
+        """
+        assert self.keepalive_expiry is not None
+        assert self.reaper_closed_event is not None
 
-        for connection in self._get_all_connections():
-            if (
-                connection.state == ConnectionState.IDLE
-                and connection.expires_at is not None
-                and now > connection.expires_at
-            ):
-                connections_to_close.add(connection)
-                await self._remove_from_pool(connection)
+        while not self.is_closed:
+            async with self.thread_lock:
+                if self.expiry_heap:
+                    delay = self.expiry_heap[0][0] - self.backend.time()
+                else:
+                    # Any connection that becomes IDLE from now on will not
+                    # expire for at least this long.
+                    delay = self.keepalive_expiry
+
+            await self.reaper_closed_event.wait(timeout=max(delay, 0.0))
+
+            try:
+                await self._close_expired_connections()
+            except Exception:
+                # Failing to cleanly close one expired connection should not
+                # stop us from expiring any others.
+                pass
+
+    async def _close_expired_connections(self) -> None:
+        now = self.backend.time()
+        connections_to_close = []
+
+        async with self.thread_lock:
+            while self.expiry_heap and self.expiry_heap[0][0] < now:
+                expires_at, _, connection = heapq.heappop(self.expiry_heap)
+                if (
+                    connection.expires_at == expires_at
+                    and connection.state == ConnectionState.IDLE
+                    and self._discard_connection(connection)
+                ):
+                    connections_to_close.append(connection)
 
         for connection in connections_to_close:
             await connection.aclose()
 
-    async def _add_to_pool(
-        self, connection: AsyncHTTPConnection, timeout: TimeoutDict = None
-    ):
-        timeout = {} if timeout is None else timeout
+    def _set_expiry(self, connection: AsyncHTTPConnection, expires_at: float) -> None:
+        """
+        Set the keep-alive expiry time for an IDLE connection. Must be called
+        with the thread lock held.
+        """
+        connection.expires_at = expires_at
+        entry = (expires_at, next(self.expiry_sequence), connection)
+        heapq.heappush(self.expiry_heap, entry)
+
+        if len(self.expiry_heap) > 2 * self.num_connections + 16:
+            # Drop any stale entries, so that a busy pool does not accumulate
+            # entries for connections that have since been reused or closed.
+            self.expiry_heap = [
+                entry
+                for entry in self.expiry_heap
+                if entry[2].expires_at == entry[0]
+                and entry[2].state == ConnectionState.IDLE
+            ]
+            heapq.heapify(self.expiry_heap)
 
-        await self.connection_semaphore.acquire(timeout=timeout.get("pool", None))
+    async def _add_to_pool(self, connection: AsyncHTTPConnection) -> None:
+        """
+        Add a new connection to the pool, using a connection slot that
+        the caller has already acquired.
+        """
         async with self.thread_lock:
-            self.connections.setdefault(connection.origin, set())
+            if connection.origin not in self.connections:
+                self.connections[connection.origin] = OriginConnections(
+                    self.idle_connections
+                )
             self.connections[connection.origin].add(connection)
+            self.num_connects += 1
 
     async def _remove_from_pool(self, connection: AsyncHTTPConnection) -> None:
         async with self.thread_lock:
-            if connection in self.connections.get(connection.origin, set()):
-                self.connection_semaphore.release()
-                self.connections[connection.origin].remove(connection)
-                if not self.connections[connection.origin]:
-                    del self.connections[connection.origin]
+            self._discard_connection(connection)
+
+    async def _update_connection_state(self, connection: AsyncHTTPConnection) -> None:
+        async with self.thread_lock:
+            self._update_index(connection)
+
+    def _update_index(self, connection: AsyncHTTPConnection) -> None:
+        connections = self.connections.get(connection.origin)
+        if connections is not None:
+            if connection.state == ConnectionState.CLOSED:
+                # For example, a connection that was closed while a request
+                # raised `NewConnectionRequired`. It no longer needs its slot.
+                self._discard_connection(connection)
+                return
+            self._check_retirement(connection)
+            connections.update(connection)
+            if connection.is_http2 and connection.state == ConnectionState.ACTIVE:
+                # Any requests waiting on this origin may share the connection.
+                self._hand_off_connection(connection)
+
+    def _check_retirement(self, connection: AsyncHTTPConnection) -> bool:
+        """
+        Mark a connection as retired if it has reached either the
+        `max_requests_per_connection` or `max_connection_age` limits, so that it
+        is not used for any new requests. Returns `True` if it is retired.
+        """
+        if connection.is_retired:
+            return True
 
-    def _connections_for_origin(self, origin: Origin) -> Set[AsyncHTTPConnection]:
-        return set(self.connections.get(origin, set()))
+        if (
+            self.max_requests_per_connection is not None
+            and connection.num_requests >= self.max_requests_per_connection
+        ) or (
+            self.max_connection_age is not None
+            and connection.connected_at is not None
+            and self.backend.time() - connection.connected_at >= self.max_connection_age
+        ):
+            connection.is_retired = True
+        return connection.is_retired
+
+    def _discard_connection(self, connection: AsyncHTTPConnection) -> bool:
+        """
+        Remove a connection from the pool, if present, and release its slot.
+        Returns `True` if the connection was in the pool. Must be called with
+        the thread lock held.
+        """
+        connections = self.connections.get(connection.origin)
+        if connections is None or connection not in connections:
+            return False
+
+        connections.remove(connection)
+        if not connections:
+            del self.connections[connection.origin]
+        self._release_slot(connection.origin)
+        self.num_closes += 1
+        return True
+
+    def _has_free_origin_slot(self, origin: Origin) -> bool:
+        limit = self.origin_max_connections.get(origin, self.max_connections_per_origin)
+        return limit is None or self.num_origin_connections.get(origin, 0) < limit
+
+    def _at_global_limit(self) -> bool:
+        return (
+            self.max_connections is not None
+            and self.num_connections >= self.max_connections
+        )
+
+    def _has_free_slot(self, origin: Origin) -> bool:
+        return not self._at_global_limit() and self._has_free_origin_slot(origin)
+
+    def _take_slot(self, origin: Origin) -> None:
+        self.num_connections += 1
+        self.num_origin_connections[origin] = (
+            self.num_origin_connections.get(origin, 0) + 1
+        )
+
+    def _release_slot(self, origin: Origin) -> None:
+        """
+        Release a connection slot, passing it directly to the oldest waiter
+        that is able to use it. Must be called with the thread lock held.
+        """
+        self.num_connections -= 1
+        self.num_origin_connections[origin] -= 1
+        if not self.num_origin_connections[origin]:
+            del self.num_origin_connections[origin]
+
+        waiter = self._next_waiter()
+        if waiter is not None:
+            self._dequeue_waiter(waiter)
+            self._take_slot(waiter.origin)
+            waiter.granted_slot = True
+            waiter.event.set()
+
+    def _next_waiter(
+        self, ignore_global_limit: bool = False
+    ) -> Optional[ConnectionWaiter]:
+        """
+        Return the oldest waiter that could be granted a connection slot.
+        """
+        if self._at_global_limit() and not ignore_global_limit:
+            return None
+
+        for waiter in self.waiters:
+            if self._has_free_origin_slot(waiter.origin):
+                return waiter
+        return None
+
+    def _hand_off_connection(self, connection: AsyncHTTPConnection) -> bool:
+        """
+        Pass a connection directly to the oldest waiter for its origin, or to
+        every waiter for its origin if it is an HTTP/2 connection. Returns
+        `True` if there were any waiters. Must be called with the thread
+        lock held.
+        """
+        connections = self.connections.get(connection.origin)
+        origin_waiters = self.origin_waiters.get(connection.origin)
+        if (
+            connections is None
+            or connection not in connections
+            or connection.is_retired
+            or not origin_waiters
+        ):
+            return False
+
+        if connection.is_http2:
+            waiters = list(origin_waiters)
+        else:
+            waiters = [next(iter(origin_waiters))]
+
+        connection.mark_as_ready()
+        connection.expires_at = None
+        connections.update(connection)
+        for waiter in waiters:
+            self._dequeue_waiter(waiter)
+            waiter.connection = connection
+            waiter.event.set()
+        return True
+
+    def _enqueue_waiter(self, waiter: ConnectionWaiter) -> None:
+        self.waiters[waiter] = None
+        self.origin_waiters.setdefault(waiter.origin, OrderedDict())[waiter] = None
+
+    def _dequeue_waiter(self, waiter: ConnectionWaiter) -> None:
+        self.waiters.pop(waiter, None)
+        origin_waiters = self.origin_waiters.get(waiter.origin)
+        if origin_waiters is not None:
+            origin_waiters.pop(waiter, None)
+            if not origin_waiters:
+                del self.origin_waiters[waiter.origin]
 
     def _get_all_connections(self) -> Set[AsyncHTTPConnection]:
         connections: Set[AsyncHTTPConnection] = set()
-        for connection_set in self.connections.values():
-            connections |= connection_set
+        for origin_connections in self.connections.values():
+            connections |= origin_connections.connections
         return connections
 
     async def aclose(self) -> None:
+        self.is_closed = True
+        self.coalesced_connections.clear()
+        self.tls_sessions.clear()
+        if self.reaper_closed_event is not None:
+            self.reaper_closed_event.set()
+
         connections = self._get_all_connections()
         for connection in connections:
             await self._remove_from_pool(connection)
@@ -1,8 +1,11 @@
+from collections import deque
 from ssl import SSLContext
 from typing import (
     AsyncIterator,
     Awaitable,
+    BinaryIO,
     Callable,
+    Deque,
     Dict,
     List,
     Optional,
@@ -12,9 +15,18 @@ from typing import (
 
 import h11
 
-from .._backends.auto import AsyncSocketStream
-from .._exceptions import ProtocolError, map_exceptions
-from .base import AsyncByteStream, AsyncHTTPTransport, ConnectionState
+from .._backends.auto import AsyncEvent, AsyncLock, AsyncSocketStream, AutoBackend
+from .._buffers import DEFAULT_READ_SIZE, MAX_READ_SIZE, ReadBuffer, WriteBuffer
+from .._exceptions import PoolTimeout, ProtocolError, map_exceptions
+from .._tls import default_ssl_context
+from .._trace import TraceCallback, trace
+from .base import (
+    AsyncByteStream,
+    AsyncFileByteStream,
+    AsyncHTTPTransport,
+    ConnectionState,
+    NewConnectionRequired,
+)
 
 H11Event = Union[
     h11.Request,
@@ -25,15 +37,65 @@ H11Event = Union[
     h11.ConnectionClosed,
 ]
 
+# Requests with these methods may be pipelined, if they have no body, since
+# they can safely be sent again on a new connection if the server closes the
+# connection before responding to them. See RFC 7230, section 6.3.2.
+PIPELINE_METHODS = frozenset([b"GET", b"HEAD"])
+
+
+def is_pipelinable(method: bytes, headers: List[Tuple[bytes, bytes]]) -> bool:
+    """
+    Return `True` if a request may be pipelined, which is only the case for
+    GET and HEAD requests without a body. A request body is sent from a
+    stream, and so could not be sent again if the request needs to be retried.
+    """
+    if method not in PIPELINE_METHODS:
+        return False
+    for name, value in headers:
+        name = name.lower()
+        if name == b"transfer-encoding":
+            return False
+        elif name == b"content-length" and value.strip() != b"0":
+            return False
+    return True
+
+
+class FileSegment:
+    """
+    A region of a file to send with `sendfile()`, which is passed through
+    `h11` in place of the data itself.
+    """
+
+    def __init__(self, file: BinaryIO, offset: int, count: int) -> None:
+        self.file = file
+        self.offset = offset
+        self.count = count
+
+    def __len__(self) -> int:
+        return self.count
+
 
 class AsyncHTTP11Connection(AsyncHTTPTransport):
-    READ_NUM_BYTES = 4096
+    READ_NUM_BYTES = DEFAULT_READ_SIZE
 
     def __init__(
-        self, socket: AsyncSocketStream, ssl_context: SSLContext = None,
+        self,
+        socket: AsyncSocketStream,
+        ssl_context: SSLContext = None,
+        backend: AutoBackend = None,
+        trace: TraceCallback = None,
+        read_buffer_size: int = None,
+        max_read_buffer_size: int = MAX_READ_SIZE,
     ):
         self.socket = socket
-        self.ssl_context = SSLContext() if ssl_context is None else ssl_context
+        self.ssl_context = default_ssl_context() if ssl_context is None else ssl_context
+        self.backend = AutoBackend() if backend is None else backend
+        self.trace = trace
+        self.read_buffer = ReadBuffer(
+            self.READ_NUM_BYTES if read_buffer_size is None else read_buffer_size,
+            max_read_buffer_size,
+        )
+        self.write_buffer = WriteBuffer()
 
         self.h11_state = h11.Connection(our_role=h11.CLIENT)
 
@@ -57,16 +119,23 @@ class AsyncHTTP11Connection(AsyncHTTPTransport):
 
         self.state = ConnectionState.ACTIVE
 
-        await self._send_request(method, url, headers, timeout)
-        await self._send_request_body(stream, timeout)
-        (
-            http_version,
-            status_code,
-            reason_phrase,
-            headers,
-        ) = await self._receive_response(timeout)
+        with trace(
+            self.trace, self.backend.time, "http11.send_request_headers", url=url
+        ):
+            await self._send_request(method, url, headers, timeout)
+        with trace(self.trace, self.backend.time, "http11.send_request_body", url=url):
+            await self._send_request_body(stream, timeout)
+        with trace(
+            self.trace, self.backend.time, "http11.receive_response_headers", url=url
+        ):
+            (
+                http_version,
+                status_code,
+                reason_phrase,
+                headers,
+            ) = await self._receive_response(timeout)
         stream = AsyncByteStream(
-            iterator=self._receive_response_data(timeout),
+            iterator=self._receive_response_data(url, timeout),
             close_func=self._response_closed,
         )
         return (http_version, status_code, reason_phrase, headers, stream)
@@ -85,11 +154,12 @@ class AsyncHTTP11Connection(AsyncHTTPTransport):
         timeout: Dict[str, Optional[float]],
     ) -> None:
         """
-        Send the request line and headers.
+        Send the request line and headers. These are held back, to be sent
+        along with the first chunk of the request body.
         """
         _scheme, _host, _port, target = url
         event = h11.Request(method=method, target=target, headers=headers)
-        await self._send_event(event, timeout)
+        await self._send_event(event, timeout, flush=False)
 
     async def _send_request_body(
         self, stream: AsyncByteStream, timeout: Dict[str, Optional[float]]
@@ -98,23 +168,60 @@ class AsyncHTTP11Connection(AsyncHTTPTransport):
         Send the request body.
         """
         # Send the request body.
-        async for chunk in stream:
-            event = h11.Data(data=chunk)
-            await self._send_event(event, timeout)
+        if isinstance(stream, AsyncFileByteStream):
+            await self._send_file(stream, timeout)
+        else:
+            async for chunk in stream:
+                # Sent as soon as it is available, since the stream may be
+                # slow to produce the next chunk.
+                event = h11.Data(data=chunk)
+                await self._send_event(event, timeout)
 
         # Finalize sending the request.
         event = h11.EndOfMessage()
         await self._send_event(event, timeout)
 
     async def _send_event(
-        self, event: H11Event, timeout: Dict[str, Optional[float]]
+        self, event: H11Event, timeout: Dict[str, Optional[float]], flush: bool = True
     ) -> None:
         """
         Send a single `h11` event to the network, waiting for the data to
         drain before returning.
+
+        If `flush` is `False` then the data may be held back, and sent along
+        with later events in a single write.
+        """
+        self.write_buffer.append(self.h11_writer.send(event))
+        if flush or self.write_buffer.is_full():
+            await self.socket.write_many(self.write_buffer.take(), timeout)
+
+    async def _send_file(
+        self, stream: "AsyncFileByteStream", timeout: Dict[str, Optional[float]]
+    ) -> None:
+        """
+        Send a file-backed request body, using `sendfile()` where possible.
+        """
+        segment = FileSegment(stream.file, stream.offset, stream.count)
+        # `h11` passes the segment through in place of the data, along with
+        # any framing for it.
+        event = h11.Data(data=segment)
+        for data in self.h11_writer.send_with_data_passthrough(event):
+            if isinstance(data, FileSegment):
+                # Send anything held back first, such as the headers.
+                await self.socket.write_many(self.write_buffer.take(), timeout)
+                if data.count:
+                    await self.socket.sendfile(
+                        data.file, data.offset, data.count, timeout
+                    )
+            else:
+                self.write_buffer.append(data)
+
+    @property
+    def h11_writer(self) -> h11.Connection:
+        """
+        The `h11` state that requests are sent with.
         """
-        bytes_to_send = self.h11_state.send(event)
-        await self.socket.write(bytes_to_send, timeout)
+        return self.h11_state
 
     async def _receive_response(
         self, timeout: Dict[str, Optional[float]]
@@ -130,17 +237,24 @@ class AsyncHTTP11Connection(AsyncHTTPTransport):
         return http_version, event.status_code, event.reason, event.headers
 
     async def _receive_response_data(
-        self, timeout: Dict[str, Optional[float]]
+        self, url: Tuple[bytes, bytes, int, bytes], timeout: Dict[str, Optional[float]]
     ) -> AsyncIterator[bytes]:
         """
         Read the response data from the network.
         """
-        while True:
-            event = await self._receive_event(timeout)
-            if isinstance(event, h11.Data):
-                yield bytes(event.data)
-            elif isinstance(event, h11.EndOfMessage):
-                break
+        with trace(
+            self.trace, self.backend.time, "http11.receive_response_body", url=url
+        ):
+            while True:
+                event = await self._receive_event(timeout)
+                if isinstance(event, h11.Data):
+                    # `h11` has already copied the data out of its receive
+                    # buffer, into a new `bytearray` for each chunk. It is not
+                    # copied again here, so that `readinto()` only needs to
+                    # copy it once more, into the caller's buffer.
+                    yield event.data
+                elif isinstance(event, h11.EndOfMessage):
+                    break
 
     async def _receive_event(self, timeout: Dict[str, Optional[float]]) -> H11Event:
         """
@@ -151,8 +265,17 @@ class AsyncHTTP11Connection(AsyncHTTPTransport):
                 event = self.h11_state.next_event()
 
             if event is h11.NEED_DATA:
-                data = await self.socket.read(self.READ_NUM_BYTES, timeout)
+                # `h11` copies the data into its own buffer, so the read
+                # buffer may be reused straight away.
+                if self.socket.supports_readinto:
+                    view = self.read_buffer.view()
+                    num_bytes = await self.socket.readinto(view, timeout)
+                    data: Union[bytes, memoryview] = view[:num_bytes]
+                else:
+                    data = await self.socket.read(self.read_buffer.size, timeout)
+                    num_bytes = len(data)
                 self.h11_state.receive_data(data)
+                self.read_buffer.filled(num_bytes)
             else:
                 assert event is not h11.NEED_DATA
                 break
@@ -161,6 +284,7 @@ class AsyncHTTP11Connection(AsyncHTTPTransport):
     async def _response_closed(self) -> None:
         if self.h11_state.our_state is h11.DONE:
             self.h11_state.start_next_cycle()
+            self.read_buffer.shrink()
             self.state = ConnectionState.IDLE
         else:
             await self.aclose()
@@ -177,3 +301,220 @@ class AsyncHTTP11Connection(AsyncHTTPTransport):
 
     def is_connection_dropped(self) -> bool:
         return self.socket.is_connection_dropped()
+
+
+class AsyncPipelinedHTTP11Connection(AsyncHTTP11Connection):
+    """
+    An HTTP/1.1 connection which may send up to `pipeline_depth` requests
+    before reading any of their responses, which are then read in order.
+
+    `h11` only supports a single request/response cycle at a time, so each
+    request is sent using its own `h11.Connection`, while responses are read
+    by `h11_state`, which is sent a copy of each request just before reading
+    the response to it.
+
+    If the server closes the connection, or a response is not read to the
+    end, then any requests that have not yet had a response raise
+    `NewConnectionRequired`, so that the pool sends them again on a new
+    connection. Only GET and HEAD requests without a body are pipelined, see
+    `is_pipelinable()`.
+
+    A request that has been sent waits for its turn to read a response for
+    at most the "pool" timeout, after which it raises `PoolTimeout`, and the
+    connection is closed once the responses ahead of it have been read.
+    """
+
+    def __init__(
+        self,
+        socket: AsyncSocketStream,
+        ssl_context: SSLContext = None,
+        backend: AutoBackend = None,
+        trace: TraceCallback = None,
+        read_buffer_size: int = None,
+        max_read_buffer_size: int = MAX_READ_SIZE,
+        pipeline_depth: int = 2,
+    ):
+        super().__init__(
+            socket,
+            ssl_context=ssl_context,
+            backend=backend,
+            trace=trace,
+            read_buffer_size=read_buffer_size,
+            max_read_buffer_size=max_read_buffer_size,
+        )
+        self.pipeline_depth = pipeline_depth
+        # An event for each request that has been sent, or is being sent, but
+        # whose response has not yet been closed, in order. The first event is
+        # set, since that response may be read.
+        self.response_turns: Deque[AsyncEvent] = deque()
+        self.accepts_pipelining = True
+        self.must_close = False
+        self.writer = h11.Connection(our_role=h11.CLIENT)
+
+    @property
+    def write_lock(self) -> AsyncLock:
+        # We do this lazily, to make sure backend autodetection always
+        # runs within an async context.
+        if not hasattr(self, "_write_lock"):
+            self._write_lock = self.backend.create_lock()
+        return self._write_lock
+
+    def can_pipeline(self) -> bool:
+        """
+        Return `True` if the connection has requests in flight, and may send
+        another request that `is_pipelinable()` before they complete.
+        """
+        return (
+            self.state == ConnectionState.ACTIVE
+            and self.accepts_pipelining
+            and not self.must_close
+            and 0 < len(self.response_turns) < self.pipeline_depth
+        )
+
+    async def request(
+        self,
+        method: bytes,
+        url: Tuple[bytes, bytes, int, bytes],
+        headers: List[Tuple[bytes, bytes]] = None,
+        stream: AsyncByteStream = None,
+        timeout: Dict[str, Optional[float]] = None,
+    ) -> Tuple[bytes, int, bytes, List[Tuple[bytes, bytes]], AsyncByteStream]:
+        headers = [] if headers is None else headers
+        stream = AsyncByteStream() if stream is None else stream
+        timeout = {} if timeout is None else timeout
+
+        # Requests are written one at a time, in the same order as their
+        # turns to read a response.
+        async with self.write_lock:
+            if self.state == ConnectionState.CLOSED or self.must_close:
+                raise NewConnectionRequired()
+            elif self.response_turns and not (
+                self.can_pipeline() and is_pipelinable(method, headers)
+            ):
+                raise NewConnectionRequired()
+
+            turn = self.backend.create_event()
+            if not self.response_turns:
+                turn.set()
+                self.accepts_pipelining = is_pipelinable(method, headers)
+            self.response_turns.append(turn)
+            self.state = ConnectionState.ACTIVE
+
+            try:
+                with trace(
+                    self.trace,
+                    self.backend.time,
+                    "http11.send_request_headers",
+                    url=url,
+                ):
+                    self.writer = h11.Connection(our_role=h11.CLIENT)
+                    await self._send_request(method, url, headers, timeout)
+                with trace(
+                    self.trace, self.backend.time, "http11.send_request_body", url=url
+                ):
+                    await self._send_request_body(stream, timeout)
+            except BaseException:
+                was_closing = self.must_close
+                self.must_close = True
+                await self._release_turn(turn)
+                if was_closing:
+                    # The server closed the connection while we were writing.
+                    raise NewConnectionRequired()
+                raise
+
+        await turn.wait(timeout=timeout.get("pool"))
+        if self.must_close:
+            # The connection is being closed before this request was
+            # responded to, so it needs to be sent again.
+            await self._release_turn(turn)
+            raise NewConnectionRequired()
+        elif self.response_turns[0] is not turn:
+            # The responses ahead of this one were not read in time. The
+            # server will still send a response to this request, so the
+            # connection cannot be used for anything else afterwards.
+            self.must_close = True
+            await self._release_turn(turn)
+            raise PoolTimeout()
+
+        # Let `h11_state` know about the request, so that it can read the
+        # response to it. Only the headers that affect how the response is
+        # read are included.
+        shadow_headers = [
+            (name, value)
+            for name, value in headers
+            if name.lower() in (b"host", b"connection")
+        ]
+        if not any(name.lower() == b"host" for name, value in shadow_headers):
+            shadow_headers.insert(0, (b"host", url[1]))
+        self.h11_state.send(
+            h11.Request(method=method, target=url[3], headers=shadow_headers)
+        )
+        self.h11_state.send(h11.EndOfMessage())
+
+        try:
+            with trace(
+                self.trace,
+                self.backend.time,
+                "http11.receive_response_headers",
+                url=url,
+            ):
+                (
+                    http_version,
+                    status_code,
+                    reason_phrase,
+                    headers,
+                ) = await self._receive_response(timeout)
+        except BaseException:
+            self.must_close = True
+            await self._release_turn(turn)
+            raise
+
+        async def response_closed() -> None:
+            await self._pipelined_response_closed(turn)
+
+        stream = AsyncByteStream(
+            iterator=self._receive_response_data(url, timeout),
+            close_func=response_closed,
+        )
+        return (http_version, status_code, reason_phrase, headers, stream)
+
+    @property
+    def h11_writer(self) -> h11.Connection:
+        return self.writer
+
+    async def _pipelined_response_closed(self, turn: AsyncEvent) -> None:
+        if (
+            self.h11_state.our_state is h11.DONE
+            and self.h11_state.their_state is h11.DONE
+        ):
+            self.h11_state.start_next_cycle()
+        else:
+            # Either the response was not read to the end, or the server
+            # is closing the connection.
+            self.must_close = True
+        await self._release_turn(turn)
+
+    async def _release_turn(self, turn: AsyncEvent) -> None:
+        """
+        Remove a request from the queue of requests awaiting a response, and
+        pass the turn to read a response on to the next request.
+        """
+        self.response_turns.remove(turn)
+        if self.must_close:
+            # Wake up every other request, so that they can be sent again on
+            # a new connection, and close the connection once they are done.
+            for other in self.response_turns:
+                other.set()
+            if not self.response_turns:
+                await self.aclose()
+        elif self.response_turns:
+            self.response_turns[0].set()
+        else:
+            self.read_buffer.shrink()
+            self.state = ConnectionState.IDLE
+
+    async def aclose(self) -> None:
+        self.must_close = True
+        for turn in self.response_turns:
+            turn.set()
+        await super().aclose()
@@ -2,8 +2,8 @@ from ssl import SSLContext
 from typing import Dict, List, Optional, Tuple
 
 from .._exceptions import ProxyError
-from .base import AsyncByteStream, AsyncHTTPTransport
-from .connection import AsyncHTTPConnection
+from .._trace import TraceCallback, trace
+from .base import AsyncByteStream, AsyncHTTPTransport, ConnectionState
 from .connection_pool import AsyncConnectionPool, ResponseByteStream
 
 Origin = Tuple[bytes, bytes, int]
@@ -28,10 +28,12 @@ class AsyncHTTPProxy(AsyncConnectionPool):
     * **proxy_origin** - `Tuple[bytes, bytes, int]` - The address of the proxy service as a 3-tuple of (scheme, host, port).
     * **proxy_headers** - `Optional[List[Tuple[bytes, bytes]]]` - A list of proxy headers to include.
     * **proxy_mode** - `str` - A proxy mode to operate in. May be "DEFAULT", "FORWARD_ONLY", or "TUNNEL_ONLY".
-    * **ssl_context** - `Optional[SSLContext]` - An SSL context to use for verifying connections.
+    * **ssl_context** - `Optional[SSLContext]` - An SSL context to use for verifying connections. Defaults to a shared context that verifies certificates against the system trust store.
     * **max_connections** - `Optional[int]` - The maximum number of concurrent connections to allow.
     * **max_keepalive** - `Optional[int]` - The maximum number of connections to allow before closing keep-alive connections.
     * **http2** - `bool` - Enable HTTP/2 support.
+    * **trace** - `Optional[Callable[[str, Dict[str, Any]], None]]` - A callback that is invoked at the start and end of each phase of a request.
+    * **uds** - `Optional[str]` - The path to a Unix domain socket on which the proxy service is listening, to connect through rather than TCP.
     """
 
     def __init__(
@@ -40,13 +42,15 @@ class AsyncHTTPProxy(AsyncConnectionPool):
         proxy_headers: Headers = None,
         proxy_mode: str = "DEFAULT",
         ssl_context: SSLContext = None,
+        trace: TraceCallback = None,
+        uds: str = None,
     ):
         assert proxy_mode in ("DEFAULT", "FORWARD_ONLY", "TUNNEL_ONLY")
 
         self.proxy_origin = proxy_origin
         self.proxy_headers = [] if proxy_headers is None else proxy_headers
         self.proxy_mode = proxy_mode
-        super().__init__(ssl_context=ssl_context)
+        super().__init__(ssl_context=ssl_context, trace=trace, uds=uds)
 
     async def request(
         self,
@@ -84,16 +88,12 @@ class AsyncHTTPProxy(AsyncConnectionPool):
         Forwarded proxy requests include the entire URL as the HTTP target,
         rather than just the path.
         """
+        timeout = {} if timeout is None else timeout
         origin = self.proxy_origin
-        connection = await self._get_connection_from_pool(origin)
-
-        if connection is None:
-            connection = AsyncHTTPConnection(
-                origin=origin, http2=False, ssl_context=self.ssl_context,
-            )
-            async with self.thread_lock:
-                self.connections.setdefault(origin, set())
-                self.connections[origin].add(connection)
+        with trace(
+            self.trace, self.backend.time, "connection_pool.acquire_connection", url=url
+        ):
+            connection = await self._acquire_connection(origin, timeout=timeout)
 
         # Issue a forwarded proxy request...
 
@@ -107,6 +107,7 @@ class AsyncHTTPProxy(AsyncConnectionPool):
         response = await connection.request(
             method, url, headers=headers, stream=stream, timeout=timeout
         )
+        await self._update_connection_state(connection)
         wrapped_stream = ResponseByteStream(
             response[4], connection=connection, callback=self._response_closed
         )
@@ -124,17 +125,14 @@ class AsyncHTTPProxy(AsyncConnectionPool):
         Tunnelled proxy requests require an initial CONNECT request to
         establish the connection, and then send regular requests.
         """
+        timeout = {} if timeout is None else timeout
         origin = url[:3]
-        connection = await self._get_connection_from_pool(origin)
-
-        if connection is None:
-            connection = AsyncHTTPConnection(
-                origin=origin, http2=False, ssl_context=self.ssl_context,
-            )
-            async with self.thread_lock:
-                self.connections.setdefault(origin, set())
-                self.connections[origin].add(connection)
+        with trace(
+            self.trace, self.backend.time, "connection_pool.acquire_connection", url=url
+        ):
+            connection = await self._acquire_connection(origin, timeout=timeout)
 
+        if connection.state == ConnectionState.PENDING:
             # Establish the connection by issuing a CONNECT request...
 
             # CONNECT www.example.org:80 HTTP/1.1
@@ -155,10 +153,7 @@ class AsyncHTTPProxy(AsyncConnectionPool):
             # If the proxy responds with an error, then drop the connection
             # from the pool, and raise an exception.
             if proxy_status_code < 200 or proxy_status_code > 299:
-                async with self.thread_lock:
-                    self.connections[connection.origin].remove(connection)
-                    if not self.connections[connection.origin]:
-                        del self.connections[connection.origin]
+                await self._remove_from_pool(connection)
                 msg = "%d %s" % (proxy_status_code, proxy_reason_phrase.decode("ascii"))
                 raise ProxyError(msg)
 
@@ -170,6 +165,7 @@ class AsyncHTTPProxy(AsyncConnectionPool):
         response = await connection.request(
             method, url, headers=headers, stream=stream, timeout=timeout
         )
+        await self._update_connection_state(connection)
         wrapped_stream = ResponseByteStream(
             response[4], connection=connection, callback=self._response_closed
         )
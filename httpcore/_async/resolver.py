@@ -0,0 +1,70 @@
+from typing import Dict, List, Optional
+
+from .._backends.auto import AsyncResolver, AutoBackend
+from .._dns import DNSCache
+from .._exceptions import ConnectError
+
+
+class AsyncSystemResolver(AsyncResolver):
+    """
+    Resolves hostnames using `getaddrinfo()`, as provided by the concurrency
+    backend.
+    """
+
+    def __init__(self) -> None:
+        self.backend = AutoBackend()
+
+    async def resolve(
+        self, hostname: bytes, port: int, timeout: Dict[str, Optional[float]]
+    ) -> List[str]:
+        return await self.backend.getaddrinfo(hostname, port, timeout)
+
+
+class AsyncCachingResolver(AsyncResolver):
+    """
+    Wraps another resolver, caching both the addresses that it returns and
+    any lookups that fail.
+    """
+
+    def __init__(self, resolver: AsyncResolver, cache: DNSCache = None) -> None:
+        self.resolver = resolver
+        self.cache = DNSCache() if cache is None else cache
+
+    async def resolve(
+        self, hostname: bytes, port: int, timeout: Dict[str, Optional[float]]
+    ) -> List[str]:
+        addresses = self.cache.get(hostname, port)
+        if addresses is not None:
+            return addresses
+
+        try:
+            addresses = await self.resolver.resolve(hostname, port, timeout)
+        except ConnectError as exc:
+            # Timeouts are not cached, since they say more about the
+            # resolver than about the hostname.
+            self.cache.set_error(hostname, port, exc)
+            raise
+        self.cache.set(hostname, port, addresses)
+        return addresses
+
+
+class AsyncResolvedResolver(AsyncResolver):
+    """
+    Wraps another resolver, returning addresses that have already been looked
+    up for one hostname and port, rather than looking them up again.
+    """
+
+    def __init__(
+        self, resolver: AsyncResolver, hostname: bytes, port: int, addresses: List[str]
+    ) -> None:
+        self.resolver = resolver
+        self.hostname = hostname
+        self.port = port
+        self.addresses = addresses
+
+    async def resolve(
+        self, hostname: bytes, port: int, timeout: Dict[str, Optional[float]]
+    ) -> List[str]:
+        if (hostname, port) == (self.hostname, self.port):
+            return self.addresses
+        return await self.resolver.resolve(hostname, port, timeout)
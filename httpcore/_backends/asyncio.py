@@ -1,6 +1,7 @@
 import asyncio
-from ssl import SSLContext
-from typing import Dict, Optional
+import socket
+from ssl import SSLContext, SSLSession
+from typing import Any, Awaitable, BinaryIO, Callable, Dict, List, Optional, Set, Type
 
 from .._exceptions import (
     CloseError,
@@ -12,7 +13,19 @@ from .._exceptions import (
     WriteTimeout,
     map_exceptions,
 )
-from .base import AsyncBackend, AsyncLock, AsyncSemaphore, AsyncSocketStream
+from .._tls import TLS_SESSION, ResumingSSLObject
+from .base import (
+    HAPPY_EYEBALLS_DELAY,
+    SENDFILE_CHUNK_SIZE,
+    AsyncBackend,
+    AsyncEvent,
+    AsyncLock,
+    AsyncResolver,
+    AsyncSemaphore,
+    AsyncSocketStream,
+    SocketOption,
+    interleave_addresses,
+)
 
 SSL_MONKEY_PATCH_APPLIED = False
 
@@ -41,7 +54,7 @@ def ssl_monkey_patch() -> None:
 async def backport_start_tls(
     transport: asyncio.BaseTransport,
     protocol: asyncio.BaseProtocol,
-    ssl_context: SSLContext,
+    sslcontext: SSLContext,
     *,
     server_side: bool = False,
     server_hostname: str = None,
@@ -60,7 +73,7 @@ async def backport_start_tls(
     ssl_protocol = asyncio.sslproto.SSLProtocol(
         loop,
         protocol,
-        ssl_context,
+        sslcontext,
         waiter,
         server_side=False,
         server_hostname=server_hostname,
@@ -93,11 +106,24 @@ class SocketStream(AsyncSocketStream):
         ident = ssl_object.selected_alpn_protocol()
         return "HTTP/2" if ident == "h2" else "HTTP/1.1"
 
+    def get_peer_address(self) -> Optional[str]:
+        peername = self.stream_writer.get_extra_info("peername")
+        # Unix domain sockets report the peer as a path, rather than a tuple.
+        return str(peername[0]) if isinstance(peername, tuple) else None
+
+    def get_peer_certificate(self) -> Optional[Dict[str, Any]]:
+        return self.stream_writer.get_extra_info("peercert")
+
+    def get_tls_session(self) -> Optional[SSLSession]:
+        ssl_object = self.stream_writer.get_extra_info("ssl_object")
+        return None if ssl_object is None else ssl_object.session
+
     async def start_tls(
         self,
         hostname: bytes,
         ssl_context: SSLContext,
         timeout: Dict[str, Optional[float]],
+        session: SSLSession = None,
     ) -> "SocketStream":
         loop = asyncio.get_event_loop()
 
@@ -107,15 +133,35 @@ class SocketStream(AsyncSocketStream):
 
         loop_start_tls = getattr(loop, "start_tls", backport_start_tls)
 
-        transport = await asyncio.wait_for(
-            loop_start_tls(
-                transport=transport,
-                protocol=protocol,
-                sslcontext=ssl_context,
-                server_hostname=hostname.decode("ascii"),
-            ),
-            timeout=timeout.get("connect"),
+        # We can only resume a session with SSL contexts that we created, since
+        # we don't want to change the behaviour of a context that was given to
+        # us. See `ResumingSSLObject`.
+        resume = (
+            session is not None
+            and TLS_SESSION is not None
+            and issubclass(ssl_context.sslobject_class, ResumingSSLObject)
         )
+        if resume:
+            token = TLS_SESSION.set(session)
+
+        exc_map: Dict[Type[Exception], Type[Exception]] = {
+            asyncio.TimeoutError: ConnectTimeout,
+            OSError: ConnectError,
+        }
+        try:
+            with map_exceptions(exc_map):
+                transport = await asyncio.wait_for(
+                    loop_start_tls(
+                        transport=transport,
+                        protocol=protocol,
+                        sslcontext=ssl_context,
+                        server_hostname=hostname.decode("ascii"),
+                    ),
+                    timeout=timeout.get("connect"),
+                )
+        finally:
+            if resume:
+                TLS_SESSION.reset(token)
 
         stream_reader.set_transport(transport)
         stream_writer = asyncio.StreamWriter(
@@ -127,28 +173,95 @@ class SocketStream(AsyncSocketStream):
         # we need to keep references to the old StreamReader/StreamWriter so that they
         # are not garbage collected and closed while we're still using them.
         ssl_stream._inner = self  # type: ignore
+        ssl_stream.bytes_read = self.bytes_read
+        ssl_stream.bytes_written = self.bytes_written
         return ssl_stream
 
     async def read(self, n: int, timeout: Dict[str, Optional[float]]) -> bytes:
-        exc_map = {asyncio.TimeoutError: ReadTimeout, OSError: ReadError}
+        exc_map: Dict[Type[Exception], Type[Exception]] = {
+            asyncio.TimeoutError: ReadTimeout,
+            OSError: ReadError,
+        }
         async with self.read_lock:
             with map_exceptions(exc_map):
-                return await asyncio.wait_for(
+                data = await asyncio.wait_for(
                     self.stream_reader.read(n), timeout.get("read")
                 )
+                self.bytes_read += len(data)
+                return data
 
     async def write(self, data: bytes, timeout: Dict[str, Optional[float]]) -> None:
         if not data:
             return
 
-        exc_map = {asyncio.TimeoutError: WriteTimeout, OSError: WriteError}
+        exc_map: Dict[Type[Exception], Type[Exception]] = {
+            asyncio.TimeoutError: WriteTimeout,
+            OSError: WriteError,
+        }
         async with self.write_lock:
             with map_exceptions(exc_map):
                 self.stream_writer.write(data)
+                self.bytes_written += len(data)
                 return await asyncio.wait_for(
                     self.stream_writer.drain(), timeout.get("write")
                 )
 
+    async def write_many(
+        self, buffers: List[bytes], timeout: Dict[str, Optional[float]]
+    ) -> None:
+        buffers = [buffer for buffer in buffers if buffer]
+        if not buffers:
+            return
+
+        exc_map: Dict[Type[Exception], Type[Exception]] = {
+            asyncio.TimeoutError: WriteTimeout,
+            OSError: WriteError,
+        }
+        async with self.write_lock:
+            with map_exceptions(exc_map):
+                # Buffered by the transport, and drained only once.
+                self.stream_writer.writelines(buffers)
+                self.bytes_written += sum(len(buffer) for buffer in buffers)
+                return await asyncio.wait_for(
+                    self.stream_writer.drain(), timeout.get("write")
+                )
+
+    async def sendfile(
+        self,
+        file: BinaryIO,
+        offset: int,
+        count: int,
+        timeout: Dict[str, Optional[float]],
+    ) -> None:
+        loop = asyncio.get_event_loop()
+        if not hasattr(loop, "sendfile"):
+            # `loop.sendfile()` is only available on Python 3.7+.
+            await super().sendfile(file, offset, count, timeout)
+            return
+
+        exc_map: Dict[Type[Exception], Type[Exception]] = {
+            asyncio.TimeoutError: WriteTimeout,
+            OSError: WriteError,
+        }
+        transport = self.stream_writer.transport
+        async with self.write_lock:
+            with map_exceptions(exc_map):
+                # Sent in chunks, so that the write timeout applies to each
+                # chunk rather than to the whole file. Over TLS, asyncio falls
+                # back to reading the file and writing it to the transport.
+                while count:
+                    sent = await asyncio.wait_for(
+                        loop.sendfile(
+                            transport, file, offset, min(count, SENDFILE_CHUNK_SIZE)
+                        ),
+                        timeout.get("write"),
+                    )
+                    if not sent:
+                        break
+                    self.bytes_written += sent
+                    offset += sent
+                    count -= sent
+
     async def aclose(self) -> None:
         # NOTE: StreamWriter instances expose a '.wait_closed()' coroutine function,
         # but using it has caused compatibility issues with certain sites in
@@ -210,6 +323,20 @@ class Semaphore(AsyncSemaphore):
         self.semaphore.release()
 
 
+class Event(AsyncEvent):
+    def __init__(self) -> None:
+        self._event = asyncio.Event()
+
+    def set(self) -> None:
+        self._event.set()
+
+    async def wait(self, timeout: float = None) -> None:
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
 class AsyncioBackend(AsyncBackend):
     def __init__(self) -> None:
         global SSL_MONKEY_PATCH_APPLIED
@@ -218,30 +345,199 @@ class AsyncioBackend(AsyncBackend):
             ssl_monkey_patch()
         SSL_MONKEY_PATCH_APPLIED = True
 
+        # The event loop only keeps weak references to tasks, so we hold onto
+        # any background tasks until they have completed.
+        self.background_tasks: Set[asyncio.Future] = set()
+
     async def open_tcp_stream(
         self,
         hostname: bytes,
         port: int,
         ssl_context: Optional[SSLContext],
         timeout: Dict[str, Optional[float]],
+        happy_eyeballs_delay: float = HAPPY_EYEBALLS_DELAY,
+        resolver: AsyncResolver = None,
+        socket_options: List[SocketOption] = None,
+        local_address: str = None,
+    ) -> SocketStream:
+        connect_timeout = timeout.get("connect")
+        exc_map: Dict[Type[Exception], Type[Exception]] = {
+            asyncio.TimeoutError: ConnectTimeout,
+            OSError: ConnectError,
+        }
+        with map_exceptions(exc_map):
+            return await asyncio.wait_for(
+                self._open_tcp_stream(
+                    hostname,
+                    port,
+                    ssl_context,
+                    timeout,
+                    happy_eyeballs_delay,
+                    resolver,
+                    [] if socket_options is None else socket_options,
+                    local_address,
+                ),
+                connect_timeout,
+            )
+
+    async def _open_tcp_stream(
+        self,
+        hostname: bytes,
+        port: int,
+        ssl_context: Optional[SSLContext],
+        timeout: Dict[str, Optional[float]],
+        happy_eyeballs_delay: float,
+        resolver: Optional[AsyncResolver],
+        socket_options: List[SocketOption],
+        local_address: Optional[str],
     ) -> SocketStream:
-        host = hostname.decode("ascii")
+        if resolver is None:
+            addresses = await self._getaddrinfo(hostname, port)
+        else:
+            addresses = await resolver.resolve(hostname, port, timeout)
+        if not addresses:
+            raise ConnectError(f"No addresses found for {hostname.decode('ascii')!r}")
+        sock = await self._connect_first(
+            addresses, port, happy_eyeballs_delay, socket_options, local_address
+        )
+        try:
+            stream_reader, stream_writer = await asyncio.open_connection(
+                sock=sock,
+                ssl=ssl_context,
+                server_hostname=None
+                if ssl_context is None
+                else hostname.decode("ascii"),
+            )
+        except BaseException:
+            sock.close()
+            raise
+        return SocketStream(stream_reader=stream_reader, stream_writer=stream_writer)
+
+    async def _connect_first(
+        self,
+        addresses: List[str],
+        port: int,
+        happy_eyeballs_delay: float,
+        socket_options: List[SocketOption],
+        local_address: Optional[str],
+    ) -> socket.socket:
+        """
+        Race connection attempts to each address, starting a new attempt whenever
+        the previous attempt fails or `happy_eyeballs_delay` elapses, and return
+        the first socket to connect. See RFC 8305.
+        """
+        loop = asyncio.get_event_loop()
+
+        async def attempt(address: str) -> socket.socket:
+            family = socket.AF_INET6 if ":" in address else socket.AF_INET
+            sock = socket.socket(family, socket.SOCK_STREAM)
+            try:
+                sock.setblocking(False)
+                # asyncio only disables Nagle's algorithm for sockets that it
+                # creates itself, so we need to do so here.
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                for option in socket_options:
+                    sock.setsockopt(*option)
+                if local_address is not None:
+                    sock.bind((local_address, 0))
+                await loop.sock_connect(sock, (address, port))
+            except BaseException:
+                sock.close()
+                raise
+            return sock
+
+        remaining = interleave_addresses(addresses)
+        pending: Set[asyncio.Future] = set()
+        error: Optional[BaseException] = None
+        try:
+            while remaining or pending:
+                if remaining:
+                    pending.add(loop.create_task(attempt(remaining.pop(0))))
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=happy_eyeballs_delay if remaining else None,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                winner = None
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                    elif winner is None:
+                        winner = task.result()
+                    else:
+                        task.result().close()
+                if winner is not None:
+                    return winner
+        finally:
+            # Any attempts that are still in progress close their sockets
+            # when cancelled.
+            for task in pending:
+                task.cancel()
+
+        assert error is not None
+        raise error
+
+    async def open_uds_stream(
+        self,
+        path: str,
+        hostname: bytes,
+        ssl_context: Optional[SSLContext],
+        timeout: Dict[str, Optional[float]],
+    ) -> AsyncSocketStream:
         connect_timeout = timeout.get("connect")
-        exc_map = {asyncio.TimeoutError: ConnectTimeout, OSError: ConnectError}
+        exc_map: Dict[Type[Exception], Type[Exception]] = {
+            asyncio.TimeoutError: ConnectTimeout,
+            OSError: ConnectError,
+        }
         with map_exceptions(exc_map):
             stream_reader, stream_writer = await asyncio.wait_for(
-                asyncio.open_connection(host, port, ssl=ssl_context), connect_timeout,
+                asyncio.open_unix_connection(
+                    path,
+                    ssl=ssl_context,
+                    server_hostname=None
+                    if ssl_context is None
+                    else hostname.decode("ascii"),
+                ),
+                connect_timeout,
             )
-            return SocketStream(
-                stream_reader=stream_reader, stream_writer=stream_writer
+        return SocketStream(stream_reader=stream_reader, stream_writer=stream_writer)
+
+    async def getaddrinfo(
+        self, hostname: bytes, port: int, timeout: Dict[str, Optional[float]]
+    ) -> List[str]:
+        exc_map: Dict[Type[Exception], Type[Exception]] = {
+            asyncio.TimeoutError: ConnectTimeout,
+            OSError: ConnectError,
+        }
+        with map_exceptions(exc_map):
+            return await asyncio.wait_for(
+                self._getaddrinfo(hostname, port), timeout.get("connect"),
             )
 
+    async def _getaddrinfo(self, hostname: bytes, port: int) -> List[str]:
+        loop = asyncio.get_event_loop()
+        infos = await loop.getaddrinfo(hostname, port, type=socket.SOCK_STREAM)
+        return list(dict.fromkeys(str(info[4][0]) for info in infos))
+
     def create_lock(self) -> AsyncLock:
         return Lock()
 
     def create_semaphore(self, max_value: int, exc_class: type) -> AsyncSemaphore:
         return Semaphore(max_value, exc_class=exc_class)
 
+    def create_event(self) -> AsyncEvent:
+        return Event()
+
+    def start_background_task(self, func: Callable[[], Awaitable[None]]) -> None:
+        task = asyncio.ensure_future(func())
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+
+    async def run_concurrently(
+        self, funcs: List[Callable[[], Awaitable[None]]]
+    ) -> None:
+        await asyncio.gather(*[func() for func in funcs])
+
     def time(self) -> float:
         loop = asyncio.get_event_loop()
         return loop.time()
@@ -1,10 +1,26 @@
 from ssl import SSLContext
-from typing import Dict, Optional
+from typing import Awaitable, Callable, Dict, List, Optional
 
 import sniffio
 
-from .base import AsyncBackend, AsyncLock, AsyncSemaphore, AsyncSocketStream
-from .sync import SyncBackend, SyncLock, SyncSemaphore, SyncSocketStream
+from .base import (
+    HAPPY_EYEBALLS_DELAY,
+    AsyncBackend,
+    AsyncEvent,
+    AsyncLock,
+    AsyncResolver,
+    AsyncSemaphore,
+    AsyncSocketStream,
+    SocketOption,
+)
+from .sync import (
+    SyncBackend,
+    SyncEvent,
+    SyncLock,
+    SyncResolver,
+    SyncSemaphore,
+    SyncSocketStream,
+)
 
 
 class AutoBackend(AsyncBackend):
@@ -31,8 +47,35 @@ class AutoBackend(AsyncBackend):
         port: int,
         ssl_context: Optional[SSLContext],
         timeout: Dict[str, Optional[float]],
+        happy_eyeballs_delay: float = HAPPY_EYEBALLS_DELAY,
+        resolver: AsyncResolver = None,
+        socket_options: List[SocketOption] = None,
+        local_address: str = None,
     ) -> AsyncSocketStream:
-        return await self.backend.open_tcp_stream(hostname, port, ssl_context, timeout)
+        return await self.backend.open_tcp_stream(
+            hostname,
+            port,
+            ssl_context,
+            timeout,
+            happy_eyeballs_delay,
+            resolver,
+            socket_options,
+            local_address,
+        )
+
+    async def open_uds_stream(
+        self,
+        path: str,
+        hostname: bytes,
+        ssl_context: Optional[SSLContext],
+        timeout: Dict[str, Optional[float]],
+    ) -> AsyncSocketStream:
+        return await self.backend.open_uds_stream(path, hostname, ssl_context, timeout)
+
+    async def getaddrinfo(
+        self, hostname: bytes, port: int, timeout: Dict[str, Optional[float]]
+    ) -> List[str]:
+        return await self.backend.getaddrinfo(hostname, port, timeout)
 
     def create_lock(self) -> AsyncLock:
         return self.backend.create_lock()
@@ -40,5 +83,16 @@ class AutoBackend(AsyncBackend):
     def create_semaphore(self, max_value: int, exc_class: type) -> AsyncSemaphore:
         return self.backend.create_semaphore(max_value, exc_class=exc_class)
 
+    def create_event(self) -> AsyncEvent:
+        return self.backend.create_event()
+
+    def start_background_task(self, func: Callable[[], Awaitable[None]]) -> None:
+        self.backend.start_background_task(func)
+
+    async def run_concurrently(
+        self, funcs: List[Callable[[], Awaitable[None]]]
+    ) -> None:
+        await self.backend.run_concurrently(funcs)
+
     def time(self) -> float:
         return self.backend.time()
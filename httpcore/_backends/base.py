@@ -1,6 +1,48 @@
-from ssl import SSLContext
+from ssl import SSLContext, SSLSession
 from types import TracebackType
-from typing import Dict, Optional, Type
+from typing import (
+    Any,
+    Awaitable,
+    BinaryIO,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    Type,
+    Union,
+)
+
+# A (level, option, value) tuple, as passed to `socket.setsockopt()`.
+SocketOption = Tuple[int, int, Union[int, bytes]]
+
+# The delay between starting concurrent connection attempts to each of the
+# addresses for a host, as recommended by RFC 8305, section 5.
+HAPPY_EYEBALLS_DELAY = 0.25
+
+# The number of bytes of a file to send at a time, where `sendfile()` is not
+# available, or as the unit that each write timeout applies to.
+SENDFILE_CHUNK_SIZE = 1024 * 1024
+
+
+def interleave_addresses(addresses: List[str]) -> List[str]:
+    """
+    Order the resolved addresses for a host so that connection attempts
+    alternate between IPv6 and IPv4, starting with the family of the first
+    address. See RFC 8305, section 4.
+    """
+    if not addresses:
+        return []
+    first = [
+        address for address in addresses if (":" in address) == (":" in addresses[0])
+    ]
+    second = [
+        address for address in addresses if (":" in address) != (":" in addresses[0])
+    ]
+    interleaved = []
+    for index in range(max(len(first), len(second))):
+        interleaved.extend(first[index : index + 1] + second[index : index + 1])
+    return interleaved
 
 
 class AsyncSocketStream:
@@ -10,23 +52,82 @@ class AsyncSocketStream:
     backends, or for stand-alone test cases.
     """
 
+    # The total number of bytes read from, and written to, the stream.
+    bytes_read = 0
+    bytes_written = 0
+
+    # Whether `readinto()` reads directly into the given buffer. If not, then
+    # callers should use `read()` instead, to avoid an extra copy.
+    supports_readinto = False
+
     def get_http_version(self) -> str:
         raise NotImplementedError()  # pragma: no cover
 
+    def get_peer_address(self) -> Optional[str]:
+        raise NotImplementedError()  # pragma: no cover
+
+    def get_peer_certificate(self) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError()  # pragma: no cover
+
+    def get_tls_session(self) -> Optional[SSLSession]:
+        raise NotImplementedError()  # pragma: no cover
+
     async def start_tls(
         self,
         hostname: bytes,
         ssl_context: SSLContext,
         timeout: Dict[str, Optional[float]],
+        session: SSLSession = None,
     ) -> "AsyncSocketStream":
         raise NotImplementedError()  # pragma: no cover
 
     async def read(self, n: int, timeout: Dict[str, Optional[float]]) -> bytes:
         raise NotImplementedError()  # pragma: no cover
 
+    async def readinto(
+        self, buffer: memoryview, timeout: Dict[str, Optional[float]]
+    ) -> int:
+        """
+        Read up to `len(buffer)` bytes into the buffer, returning the number
+        of bytes read, or zero once the connection has been closed.
+
+        By default this reads a new `bytes` and copies it into the buffer.
+        Backends that can read directly into the buffer override this, and set
+        `supports_readinto`.
+        """
+        data = await self.read(len(buffer), timeout)
+        buffer[: len(data)] = data
+        return len(data)
+
     async def write(self, data: bytes, timeout: Dict[str, Optional[float]]) -> None:
         raise NotImplementedError()  # pragma: no cover
 
+    async def write_many(
+        self, buffers: List[bytes], timeout: Dict[str, Optional[float]]
+    ) -> None:
+        """
+        Write several buffers to the network, as if they were a single buffer.
+        """
+        await self.write(b"".join(buffers), timeout)
+
+    async def sendfile(
+        self,
+        file: BinaryIO,
+        offset: int,
+        count: int,
+        timeout: Dict[str, Optional[float]],
+    ) -> None:
+        """
+        Write `count` bytes of a file to the network, starting from `offset`.
+        """
+        file.seek(offset)
+        while count:
+            data = file.read(min(count, SENDFILE_CHUNK_SIZE))
+            if not data:
+                break
+            await self.write(data, timeout)
+            count -= len(data)
+
     async def aclose(self) -> None:
         raise NotImplementedError()  # pragma: no cover
 
@@ -70,6 +171,44 @@ class AsyncSemaphore:
         raise NotImplementedError()  # pragma: no cover
 
 
+class AsyncEvent:
+    """
+    An abstract interface for Event classes.
+    Abstracts away any asyncio-specific interfaces.
+    """
+
+    def set(self) -> None:
+        raise NotImplementedError()  # pragma: no cover
+
+    async def wait(self, timeout: float = None) -> None:
+        raise NotImplementedError()  # pragma: no cover
+
+
+class AsyncResolver:
+    """
+    The base interface for resolving a hostname into a list of IP addresses,
+    which may be passed to a connection pool in order to use a static hosts
+    table, a local stub resolver, or a dedicated thread pool for lookups.
+    """
+
+    async def resolve(
+        self, hostname: bytes, port: int, timeout: Dict[str, Optional[float]]
+    ) -> List[str]:
+        """
+        Return the IP addresses for a hostname, in order of preference.
+
+        **Parameters:**
+
+        * **hostname** - `bytes` - The hostname to resolve.
+        * **port** - `int` - The port that will be connected to.
+        * **timeout** - `Dict[str, Optional[float]]` - A dictionary of timeout values, of which the "connect" timeout applies to the lookup.
+
+        Should raise `ConnectError` if the hostname cannot be resolved, or
+        `ConnectTimeout` if the lookup does not complete in time.
+        """
+        raise NotImplementedError()  # pragma: no cover
+
+
 class AsyncBackend:
     async def open_tcp_stream(
         self,
@@ -77,14 +216,43 @@ class AsyncBackend:
         port: int,
         ssl_context: Optional[SSLContext],
         timeout: Dict[str, Optional[float]],
+        happy_eyeballs_delay: float = HAPPY_EYEBALLS_DELAY,
+        resolver: AsyncResolver = None,
+        socket_options: List[SocketOption] = None,
+        local_address: str = None,
+    ) -> AsyncSocketStream:
+        raise NotImplementedError()  # pragma: no cover
+
+    async def open_uds_stream(
+        self,
+        path: str,
+        hostname: bytes,
+        ssl_context: Optional[SSLContext],
+        timeout: Dict[str, Optional[float]],
     ) -> AsyncSocketStream:
         raise NotImplementedError()  # pragma: no cover
 
+    async def getaddrinfo(
+        self, hostname: bytes, port: int, timeout: Dict[str, Optional[float]]
+    ) -> List[str]:
+        raise NotImplementedError()  # pragma: no cover
+
     def create_lock(self) -> AsyncLock:
         raise NotImplementedError()  # pragma: no cover
 
     def create_semaphore(self, max_value: int, exc_class: type) -> AsyncSemaphore:
         raise NotImplementedError()  # pragma: no cover
 
+    def create_event(self) -> AsyncEvent:
+        raise NotImplementedError()  # pragma: no cover
+
+    def start_background_task(self, func: Callable[[], Awaitable[None]]) -> None:
+        raise NotImplementedError()  # pragma: no cover
+
+    async def run_concurrently(
+        self, funcs: List[Callable[[], Awaitable[None]]]
+    ) -> None:
+        raise NotImplementedError()  # pragma: no cover
+
     def time(self) -> float:
         raise NotImplementedError()  # pragma: no cover
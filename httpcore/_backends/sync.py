@@ -1,10 +1,13 @@
+import errno
+import os
 import select
 import socket
+import ssl
 import threading
 import time
-from ssl import SSLContext
+from ssl import SSLContext, SSLSession
 from types import TracebackType
-from typing import Dict, Optional, Type
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Type
 
 from .._exceptions import (
     CloseError,
@@ -16,6 +19,18 @@ from .._exceptions import (
     WriteTimeout,
     map_exceptions,
 )
+from .base import HAPPY_EYEBALLS_DELAY, SocketOption, interleave_addresses
+
+# The number of buffers to pass to each `sendmsg()` call, which is limited by
+# the platform's IOV_MAX.
+MAX_IOVECS = 64
+
+# Error codes from a non-blocking `connect_ex()` that is still in progress.
+CONNECT_IN_PROGRESS = {
+    errno.EINPROGRESS,
+    errno.EWOULDBLOCK,
+    getattr(errno, "WSAEWOULDBLOCK", errno.EWOULDBLOCK),
+}
 
 
 class SyncSocketStream:
@@ -25,6 +40,13 @@ class SyncSocketStream:
     backends, or for stand-alone test cases.
     """
 
+    # The total number of bytes read from, and written to, the stream.
+    bytes_read = 0
+    bytes_written = 0
+
+    # `readinto()` reads directly into the given buffer, with `recv_into()`.
+    supports_readinto = True
+
     def __init__(self, sock: socket.socket) -> None:
         self.sock = sock
         self.read_lock = threading.Lock()
@@ -37,51 +59,166 @@ class SyncSocketStream:
             return "HTTP/2" if ident == "h2" else "HTTP/1.1"
         return "HTTP/1.1"
 
+    def get_peer_address(self) -> Optional[str]:
+        # Unix domain sockets report the peer as a path, rather than a tuple.
+        peername = self.sock.getpeername()
+        return str(peername[0]) if isinstance(peername, tuple) else None
+
+    def get_peer_certificate(self) -> Optional[Dict[str, Any]]:
+        if not isinstance(self.sock, ssl.SSLSocket):
+            return None
+        return self.sock.getpeercert()
+
+    def get_tls_session(self) -> Optional[SSLSession]:
+        if not isinstance(self.sock, ssl.SSLSocket):
+            return None
+        return self.sock.session
+
     def start_tls(
         self,
         hostname: bytes,
         ssl_context: SSLContext,
         timeout: Dict[str, Optional[float]],
+        session: SSLSession = None,
     ) -> "SyncSocketStream":
         connect_timeout = timeout.get("connect")
-        exc_map = {socket.timeout: ConnectTimeout, socket.error: ConnectError}
+        exc_map: Dict[Type[Exception], Type[Exception]] = {
+            socket.timeout: ConnectTimeout,
+            socket.error: ConnectError,
+        }
 
         with map_exceptions(exc_map):
             self.sock.settimeout(connect_timeout)
             wrapped = ssl_context.wrap_socket(
-                self.sock, server_hostname=hostname.decode("ascii")
+                self.sock, server_hostname=hostname.decode("ascii"), session=session
             )
 
-        return SyncSocketStream(wrapped)
+        stream = SyncSocketStream(wrapped)
+        stream.bytes_read = self.bytes_read
+        stream.bytes_written = self.bytes_written
+        return stream
 
     def read(self, n: int, timeout: Dict[str, Optional[float]]) -> bytes:
         read_timeout = timeout.get("read")
-        exc_map = {socket.timeout: ReadTimeout, socket.error: ReadError}
+        exc_map: Dict[Type[Exception], Type[Exception]] = {
+            socket.timeout: ReadTimeout,
+            socket.error: ReadError,
+        }
 
         with self.read_lock:
             with map_exceptions(exc_map):
                 self.sock.settimeout(read_timeout)
-                return self.sock.recv(n)
+                data = self.sock.recv(n)
+                self.bytes_read += len(data)
+                return data
+
+    def readinto(self, buffer: memoryview, timeout: Dict[str, Optional[float]]) -> int:
+        read_timeout = timeout.get("read")
+        exc_map: Dict[Type[Exception], Type[Exception]] = {
+            socket.timeout: ReadTimeout,
+            socket.error: ReadError,
+        }
+
+        with self.read_lock:
+            with map_exceptions(exc_map):
+                self.sock.settimeout(read_timeout)
+                n = self.sock.recv_into(buffer)
+                self.bytes_read += n
+                return n
 
     def write(self, data: bytes, timeout: Dict[str, Optional[float]]) -> None:
         write_timeout = timeout.get("write")
-        exc_map = {socket.timeout: WriteTimeout, socket.error: WriteError}
+        exc_map: Dict[Type[Exception], Type[Exception]] = {
+            socket.timeout: WriteTimeout,
+            socket.error: WriteError,
+        }
 
         with self.write_lock:
             with map_exceptions(exc_map):
                 while data:
                     self.sock.settimeout(write_timeout)
                     n = self.sock.send(data)
+                    self.bytes_written += n
                     data = data[n:]
 
+    def write_many(
+        self, buffers: List[bytes], timeout: Dict[str, Optional[float]]
+    ) -> None:
+        if isinstance(self.sock, ssl.SSLSocket) or not hasattr(self.sock, "sendmsg"):
+            # `sendmsg()` is not supported for TLS, or on every platform.
+            self.write(b"".join(buffers), timeout)
+            return
+
+        write_timeout = timeout.get("write")
+        exc_map: Dict[Type[Exception], Type[Exception]] = {
+            socket.timeout: WriteTimeout,
+            socket.error: WriteError,
+        }
+        views = [memoryview(buffer) for buffer in buffers if buffer]
+
+        with self.write_lock:
+            with map_exceptions(exc_map):
+                while views:
+                    self.sock.settimeout(write_timeout)
+                    n = self.sock.sendmsg(views[:MAX_IOVECS])
+                    self.bytes_written += n
+                    # Drop whatever was sent from the front of the buffers.
+                    while n:
+                        if n >= len(views[0]):
+                            n -= len(views.pop(0))
+                        else:
+                            views[0] = views[0][n:]
+                            n = 0
+
+    def sendfile(
+        self,
+        file: BinaryIO,
+        offset: int,
+        count: int,
+        timeout: Dict[str, Optional[float]],
+    ) -> None:
+        write_timeout = timeout.get("write")
+        exc_map: Dict[Type[Exception], Type[Exception]] = {
+            socket.timeout: WriteTimeout,
+            socket.error: WriteError,
+        }
+
+        with self.write_lock:
+            with map_exceptions(exc_map):
+                # Falls back to reading the file and sending it, for TLS or
+                # where `os.sendfile()` is not available.
+                self.sock.settimeout(write_timeout)
+                self.bytes_written += self.sock.sendfile(file, offset, count)
+
     def close(self) -> None:
         with self.write_lock:
+            try:
+                # Wakes up any thread that is blocked reading from the socket,
+                # which closing it alone does not do.
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
             with map_exceptions({socket.error: CloseError}):
                 self.sock.close()
 
     def is_connection_dropped(self) -> bool:
         rready, _wready, _xready = select.select([self.sock], [], [], 0)
-        return bool(rready)
+        if not rready:
+            return False
+
+        if isinstance(self.sock, ssl.SSLSocket):
+            # A readable TLS socket may only have post-handshake messages
+            # pending, such as TLS 1.3 session tickets, which the server sends
+            # just after the handshake completes. Peek at the raw socket,
+            # beneath the TLS layer, so that nothing is consumed, and only
+            # treat the connection as dropped if we see EOF.
+            try:
+                data = socket.socket.recv(self.sock, 1, socket.MSG_PEEK)
+            except OSError:
+                return True
+            return not data
+
+        return True
 
 
 class SyncLock:
@@ -120,6 +257,42 @@ class SyncSemaphore:
         self._semaphore.release()
 
 
+class SyncEvent:
+    def __init__(self) -> None:
+        self._event = threading.Event()
+
+    def set(self) -> None:
+        self._event.set()
+
+    def wait(self, timeout: float = None) -> None:
+        self._event.wait(timeout)
+
+
+class SyncResolver:
+    """
+    The base interface for resolving a hostname into a list of IP addresses,
+    which may be passed to a connection pool in order to use a static hosts
+    table, a local stub resolver, or a dedicated thread pool for lookups.
+    """
+
+    def resolve(
+        self, hostname: bytes, port: int, timeout: Dict[str, Optional[float]]
+    ) -> List[str]:
+        """
+        Return the IP addresses for a hostname, in order of preference.
+
+        **Parameters:**
+
+        * **hostname** - `bytes` - The hostname to resolve.
+        * **port** - `int` - The port that will be connected to.
+        * **timeout** - `Dict[str, Optional[float]]` - A dictionary of timeout values, of which the "connect" timeout applies to the lookup.
+
+        Should raise `ConnectError` if the hostname cannot be resolved, or
+        `ConnectTimeout` if the lookup does not complete in time.
+        """
+        raise NotImplementedError()  # pragma: no cover
+
+
 class SyncBackend:
     def open_tcp_stream(
         self,
@@ -127,25 +300,178 @@ class SyncBackend:
         port: int,
         ssl_context: Optional[SSLContext],
         timeout: Dict[str, Optional[float]],
+        happy_eyeballs_delay: float = HAPPY_EYEBALLS_DELAY,
+        resolver: SyncResolver = None,
+        socket_options: List[SocketOption] = None,
+        local_address: str = None,
     ) -> SyncSocketStream:
         connect_timeout = timeout.get("connect")
-        exc_map = {socket.timeout: ConnectTimeout, socket.error: ConnectError}
+        exc_map: Dict[Type[Exception], Type[Exception]] = {
+            socket.timeout: ConnectTimeout,
+            socket.error: ConnectError,
+        }
 
         with map_exceptions(exc_map):
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            if resolver is None:
+                addresses = self._getaddrinfo(hostname, port)
+            else:
+                addresses = resolver.resolve(hostname, port, timeout)
+            if not addresses:
+                raise ConnectError(
+                    f"No addresses found for {hostname.decode('ascii')!r}"
+                )
+            sock = self._connect_first(
+                addresses,
+                port,
+                connect_timeout,
+                happy_eyeballs_delay,
+                [] if socket_options is None else socket_options,
+                local_address,
+            )
             sock.settimeout(connect_timeout)
-            sock.connect((hostname.decode("ascii"), port))
             if ssl_context is not None:
                 sock = ssl_context.wrap_socket(
                     sock, server_hostname=hostname.decode("ascii")
                 )
             return SyncSocketStream(sock=sock)
 
+    def open_uds_stream(
+        self,
+        path: str,
+        hostname: bytes,
+        ssl_context: Optional[SSLContext],
+        timeout: Dict[str, Optional[float]],
+    ) -> SyncSocketStream:
+        connect_timeout = timeout.get("connect")
+        exc_map: Dict[Type[Exception], Type[Exception]] = {
+            socket.timeout: ConnectTimeout,
+            socket.error: ConnectError,
+        }
+
+        with map_exceptions(exc_map):
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.settimeout(connect_timeout)
+                sock.connect(path)
+                if ssl_context is not None:
+                    sock = ssl_context.wrap_socket(
+                        sock, server_hostname=hostname.decode("ascii")
+                    )
+            except BaseException:
+                sock.close()
+                raise
+            return SyncSocketStream(sock=sock)
+
+    def _connect_first(
+        self,
+        addresses: List[str],
+        port: int,
+        connect_timeout: Optional[float],
+        happy_eyeballs_delay: float,
+        socket_options: List[SocketOption],
+        local_address: Optional[str],
+    ) -> socket.socket:
+        """
+        Race connection attempts to each address, starting a new attempt whenever
+        the previous attempt fails or `happy_eyeballs_delay` elapses, and return
+        the first socket to connect. See RFC 8305.
+        """
+        remaining = interleave_addresses(addresses)
+        pending: List[socket.socket] = []
+        error: Optional[OSError] = None
+        now = time.monotonic()
+        deadline = None if connect_timeout is None else now + connect_timeout
+        next_attempt_at = now
+
+        try:
+            while remaining or pending:
+                if remaining and (not pending or now >= next_attempt_at):
+                    address = remaining.pop(0)
+                    family = socket.AF_INET6 if ":" in address else socket.AF_INET
+                    sock = socket.socket(family, socket.SOCK_STREAM)
+                    pending.append(sock)
+                    next_attempt_at = now + happy_eyeballs_delay
+                    sock.setblocking(False)
+                    # Unlike asyncio and trio, plain sockets don't disable
+                    # Nagle's algorithm by default.
+                    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                    try:
+                        for option in socket_options:
+                            sock.setsockopt(*option)
+                        if local_address is not None:
+                            sock.bind((local_address, 0))
+                    except OSError as exc:
+                        pending.remove(sock)
+                        sock.close()
+                        error = exc
+                        next_attempt_at = now
+                        continue
+                    result = sock.connect_ex((address, port))
+                    if result == 0:
+                        pending.remove(sock)
+                        return sock
+                    elif result not in CONNECT_IN_PROGRESS:
+                        pending.remove(sock)
+                        sock.close()
+                        error = OSError(result, os.strerror(result))
+                        next_attempt_at = now
+                    continue
+
+                wait = None if not remaining else next_attempt_at - now
+                if deadline is not None:
+                    if now >= deadline:
+                        raise socket.timeout("timed out")
+                    wait = deadline - now if wait is None else min(wait, deadline - now)
+
+                # Failed connections are reported as writable, or on Windows,
+                # as having an exceptional condition.
+                _, writable, failed = select.select([], pending, pending, wait)
+                now = time.monotonic()
+                for sock in dict.fromkeys(writable + failed):
+                    pending.remove(sock)
+                    result = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                    if result == 0:
+                        return sock
+                    sock.close()
+                    error = OSError(result, os.strerror(result))
+                    # Start the next attempt straight away.
+                    next_attempt_at = now
+        finally:
+            for sock in pending:
+                sock.close()
+
+        assert error is not None
+        raise error
+
+    def getaddrinfo(
+        self, hostname: bytes, port: int, timeout: Dict[str, Optional[float]]
+    ) -> List[str]:
+        with map_exceptions({socket.error: ConnectError}):
+            return self._getaddrinfo(hostname, port)
+
+    def _getaddrinfo(self, hostname: bytes, port: int) -> List[str]:
+        infos = socket.getaddrinfo(hostname, port, type=socket.SOCK_STREAM)
+        return list(dict.fromkeys(str(info[4][0]) for info in infos))
+
     def create_lock(self) -> SyncLock:
         return SyncLock()
 
     def create_semaphore(self, max_value: int, exc_class: type) -> SyncSemaphore:
         return SyncSemaphore(max_value, exc_class=exc_class)
 
+    def create_event(self) -> SyncEvent:
+        return SyncEvent()
+
+    def start_background_task(self, func: Callable[[], None]) -> None:
+        thread = threading.Thread(target=func, daemon=True)
+        thread.start()
+
+    def run_concurrently(self, funcs: List[Callable[[], None]]) -> None:
+        threads = [threading.Thread(target=func) for func in funcs]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
     def time(self) -> float:
         return time.monotonic()
@@ -1,5 +1,6 @@
-from ssl import SSLContext
-from typing import Dict, Optional, Union
+import os
+from ssl import SSLContext, SSLSession
+from typing import Any, Awaitable, BinaryIO, Callable, Dict, List, Optional, Union
 
 import trio
 
@@ -13,7 +14,18 @@ from .._exceptions import (
     WriteTimeout,
     map_exceptions,
 )
-from .base import AsyncBackend, AsyncLock, AsyncSemaphore, AsyncSocketStream
+from .base import (
+    HAPPY_EYEBALLS_DELAY,
+    SENDFILE_CHUNK_SIZE,
+    AsyncBackend,
+    AsyncEvent,
+    AsyncLock,
+    AsyncResolver,
+    AsyncSemaphore,
+    AsyncSocketStream,
+    SocketOption,
+    interleave_addresses,
+)
 
 
 def none_as_inf(value: Optional[float]) -> float:
@@ -25,6 +37,8 @@ class SocketStream(AsyncSocketStream):
         self.stream = stream
         self.read_lock = trio.Lock()
         self.write_lock = trio.Lock()
+        # `SSLStream` only supports reading into a new `bytes`.
+        self.supports_readinto = isinstance(stream, trio.SocketStream)
 
     def get_http_version(self) -> str:
         if not isinstance(self.stream, trio.SSLStream):
@@ -33,11 +47,34 @@ class SocketStream(AsyncSocketStream):
         ident = self.stream.selected_alpn_protocol()
         return "HTTP/2" if ident == "h2" else "HTTP/1.1"
 
+    def get_peer_address(self) -> Optional[str]:
+        stream = self.stream
+
+        # Peek through any SSLStream wrappers to get the underlying SocketStream.
+        while hasattr(stream, "transport_stream"):
+            stream = stream.transport_stream
+        assert isinstance(stream, trio.SocketStream)
+
+        # Unix domain sockets report the peer as a path, rather than a tuple.
+        peername = stream.socket.getpeername()
+        return str(peername[0]) if isinstance(peername, tuple) else None
+
+    def get_peer_certificate(self) -> Optional[Dict[str, Any]]:
+        if not isinstance(self.stream, trio.SSLStream):
+            return None
+        return self.stream.getpeercert()
+
+    def get_tls_session(self) -> Optional[SSLSession]:
+        if not isinstance(self.stream, trio.SSLStream):
+            return None
+        return self.stream.session
+
     async def start_tls(
         self,
         hostname: bytes,
         ssl_context: SSLContext,
         timeout: Dict[str, Optional[float]],
+        session: SSLSession = None,
     ) -> "SocketStream":
         connect_timeout = none_as_inf(timeout.get("connect"))
         exc_map = {
@@ -47,11 +84,18 @@ class SocketStream(AsyncSocketStream):
         ssl_stream = trio.SSLStream(
             self.stream, ssl_context=ssl_context, server_hostname=hostname
         )
+        if session is not None:
+            # Forwarded to the underlying `SSLObject`, before the handshake.
+            ssl_stream.session = session
 
         with map_exceptions(exc_map):
             with trio.fail_after(connect_timeout):
                 await ssl_stream.do_handshake()
-            return SocketStream(ssl_stream)
+
+        stream = SocketStream(ssl_stream)
+        stream.bytes_read = self.bytes_read
+        stream.bytes_written = self.bytes_written
+        return stream
 
     async def read(self, n: int, timeout: Dict[str, Optional[float]]) -> bytes:
         read_timeout = none_as_inf(timeout.get("read"))
@@ -60,7 +104,29 @@ class SocketStream(AsyncSocketStream):
         async with self.read_lock:
             with map_exceptions(exc_map):
                 with trio.fail_after(read_timeout):
-                    return await self.stream.receive_some(max_bytes=n)
+                    data = await self.stream.receive_some(max_bytes=n)
+                    self.bytes_read += len(data)
+                    return data
+
+    async def readinto(
+        self, buffer: memoryview, timeout: Dict[str, Optional[float]]
+    ) -> int:
+        if not self.supports_readinto:
+            return await super().readinto(buffer, timeout)
+
+        read_timeout = none_as_inf(timeout.get("read"))
+        exc_map = {
+            trio.TooSlowError: ReadTimeout,
+            trio.BrokenResourceError: ReadError,
+            OSError: ReadError,
+        }
+
+        async with self.read_lock:
+            with map_exceptions(exc_map):
+                with trio.fail_after(read_timeout):
+                    n = await self.stream.socket.recv_into(buffer)
+                    self.bytes_read += n
+                    return n
 
     async def write(self, data: bytes, timeout: Dict[str, Optional[float]]) -> None:
         if not data:
@@ -75,7 +141,49 @@ class SocketStream(AsyncSocketStream):
         async with self.write_lock:
             with map_exceptions(exc_map):
                 with trio.fail_after(write_timeout):
-                    return await self.stream.send_all(data)
+                    await self.stream.send_all(data)
+                    self.bytes_written += len(data)
+
+    async def sendfile(
+        self,
+        file: BinaryIO,
+        offset: int,
+        count: int,
+        timeout: Dict[str, Optional[float]],
+    ) -> None:
+        if not isinstance(self.stream, trio.SocketStream) or not hasattr(
+            os, "sendfile"
+        ):
+            # TLS needs the file contents to be encrypted in userspace.
+            return await super().sendfile(file, offset, count, timeout)
+
+        write_timeout = none_as_inf(timeout.get("write"))
+        exc_map = {
+            trio.TooSlowError: WriteTimeout,
+            trio.BrokenResourceError: WriteError,
+            OSError: WriteError,
+        }
+        sock = self.stream.socket
+
+        async with self.write_lock:
+            with map_exceptions(exc_map):
+                while count:
+                    with trio.fail_after(write_timeout):
+                        await trio.lowlevel.wait_writable(sock)
+                    try:
+                        sent = os.sendfile(
+                            sock.fileno(),
+                            file.fileno(),
+                            offset,
+                            min(count, SENDFILE_CHUNK_SIZE),
+                        )
+                    except BlockingIOError:
+                        continue
+                    if not sent:
+                        break
+                    self.bytes_written += sent
+                    offset += sent
+                    count -= sent
 
     async def aclose(self) -> None:
         async with self.write_lock:
@@ -133,6 +241,20 @@ class Semaphore(AsyncSemaphore):
         self.semaphore.release()
 
 
+class Event(AsyncEvent):
+    def __init__(self) -> None:
+        self._event = trio.Event()
+
+    def set(self) -> None:
+        self._event.set()
+
+    async def wait(self, timeout: float = None) -> None:
+        timeout = none_as_inf(timeout)
+
+        with trio.move_on_after(timeout):
+            await self._event.wait()
+
+
 class TrioBackend(AsyncBackend):
     async def open_tcp_stream(
         self,
@@ -140,16 +262,38 @@ class TrioBackend(AsyncBackend):
         port: int,
         ssl_context: Optional[SSLContext],
         timeout: Dict[str, Optional[float]],
+        happy_eyeballs_delay: float = HAPPY_EYEBALLS_DELAY,
+        resolver: AsyncResolver = None,
+        socket_options: List[SocketOption] = None,
+        local_address: str = None,
     ) -> AsyncSocketStream:
         connect_timeout = none_as_inf(timeout.get("connect"))
         exc_map = {
             trio.TooSlowError: ConnectTimeout,
             trio.BrokenResourceError: ConnectError,
+            OSError: ConnectError,
         }
 
         with map_exceptions(exc_map):
             with trio.fail_after(connect_timeout):
-                stream: trio.SocketStream = await trio.open_tcp_stream(hostname, port)
+                if resolver is None:
+                    addresses = await self._getaddrinfo(hostname, port)
+                else:
+                    addresses = await resolver.resolve(hostname, port, timeout)
+                if not addresses:
+                    raise ConnectError(
+                        f"No addresses found for {hostname.decode('ascii')!r}"
+                    )
+                sock = await self._connect_first(
+                    addresses,
+                    port,
+                    happy_eyeballs_delay,
+                    [] if socket_options is None else socket_options,
+                    local_address,
+                )
+                stream: Union[trio.SocketStream, trio.SSLStream] = trio.SocketStream(
+                    sock
+                )
 
                 if ssl_context is not None:
                     stream = trio.SSLStream(
@@ -159,11 +303,125 @@ class TrioBackend(AsyncBackend):
 
                 return SocketStream(stream=stream)
 
+    async def open_uds_stream(
+        self,
+        path: str,
+        hostname: bytes,
+        ssl_context: Optional[SSLContext],
+        timeout: Dict[str, Optional[float]],
+    ) -> AsyncSocketStream:
+        connect_timeout = none_as_inf(timeout.get("connect"))
+        exc_map = {
+            trio.TooSlowError: ConnectTimeout,
+            trio.BrokenResourceError: ConnectError,
+            OSError: ConnectError,
+        }
+
+        with map_exceptions(exc_map):
+            with trio.fail_after(connect_timeout):
+                stream: Union[
+                    trio.SocketStream, trio.SSLStream
+                ] = await trio.open_unix_socket(path)
+
+                if ssl_context is not None:
+                    stream = trio.SSLStream(
+                        stream, ssl_context, server_hostname=hostname
+                    )
+                    await stream.do_handshake()
+
+                return SocketStream(stream=stream)
+
+    async def _connect_first(
+        self,
+        addresses: List[str],
+        port: int,
+        happy_eyeballs_delay: float,
+        socket_options: List[SocketOption],
+        local_address: Optional[str],
+    ) -> trio.socket.SocketType:
+        """
+        Race connection attempts to each address, starting a new attempt whenever
+        the previous attempt fails or `happy_eyeballs_delay` elapses, and return
+        the first socket to connect. See RFC 8305.
+        """
+        winner: Optional[trio.socket.SocketType] = None
+        errors: List[OSError] = []
+
+        async def attempt(
+            address: str, failed: trio.Event, nursery: trio.Nursery
+        ) -> None:
+            nonlocal winner
+
+            family = trio.socket.AF_INET6 if ":" in address else trio.socket.AF_INET
+            sock = trio.socket.socket(family, trio.socket.SOCK_STREAM)
+            try:
+                for option in socket_options:
+                    sock.setsockopt(*option)
+                if local_address is not None:
+                    await sock.bind((local_address, 0))
+                await sock.connect((address, port))
+            except OSError as exc:
+                sock.close()
+                errors.append(exc)
+                failed.set()
+                return
+            except BaseException:
+                sock.close()
+                raise
+
+            if winner is None:
+                winner = sock
+                nursery.cancel_scope.cancel()
+            else:
+                sock.close()
+
+        async with trio.open_nursery() as nursery:
+            for address in interleave_addresses(addresses):
+                failed = trio.Event()
+                nursery.start_soon(attempt, address, failed, nursery)
+                with trio.move_on_after(happy_eyeballs_delay):
+                    await failed.wait()
+
+        if winner is None:
+            raise errors[-1]
+        return winner
+
+    async def getaddrinfo(
+        self, hostname: bytes, port: int, timeout: Dict[str, Optional[float]]
+    ) -> List[str]:
+        connect_timeout = none_as_inf(timeout.get("connect"))
+        exc_map = {trio.TooSlowError: ConnectTimeout, OSError: ConnectError}
+
+        with map_exceptions(exc_map):
+            with trio.fail_after(connect_timeout):
+                return await self._getaddrinfo(hostname, port)
+
+    async def _getaddrinfo(self, hostname: bytes, port: int) -> List[str]:
+        infos = await trio.socket.getaddrinfo(
+            hostname, port, type=trio.socket.SOCK_STREAM
+        )
+        return list(dict.fromkeys(str(info[4][0]) for info in infos))
+
     def create_lock(self) -> AsyncLock:
         return Lock()
 
     def create_semaphore(self, max_value: int, exc_class: type) -> AsyncSemaphore:
         return Semaphore(max_value, exc_class=exc_class)
 
+    def create_event(self) -> AsyncEvent:
+        return Event()
+
+    def start_background_task(self, func: Callable[[], Awaitable[None]]) -> None:
+        # System tasks are not tied to any nursery, and are cancelled
+        # automatically when the main task exits.
+        trio.lowlevel.spawn_system_task(func)
+
+    async def run_concurrently(
+        self, funcs: List[Callable[[], Awaitable[None]]]
+    ) -> None:
+        async with trio.open_nursery() as nursery:
+            for func in funcs:
+                nursery.start_soon(func)
+
     def time(self) -> float:
         return trio.current_time()
@@ -0,0 +1,83 @@
+from typing import List
+
+DEFAULT_READ_SIZE = 4096
+MAX_READ_SIZE = 256 * 1024
+WRITE_BUFFER_SIZE = 64 * 1024
+
+
+class ReadBuffer:
+    """
+    A preallocated buffer for reading from a socket, which adapts its size to
+    the rate at which data arrives.
+
+    The buffer doubles in size, up to `max_size`, each time a read fills it,
+    so that bulk downloads need fewer reads. It returns to `initial_size` when
+    `shrink()` is called, once the connection is idle.
+    """
+
+    def __init__(
+        self, initial_size: int = DEFAULT_READ_SIZE, max_size: int = MAX_READ_SIZE
+    ) -> None:
+        self.initial_size = initial_size
+        self.max_size = max(initial_size, max_size)
+        self.buffer = bytearray(initial_size)
+
+    @property
+    def size(self) -> int:
+        return len(self.buffer)
+
+    def view(self) -> memoryview:
+        """
+        Return a writable view onto the whole buffer, to read into.
+        """
+        return memoryview(self.buffer)
+
+    def filled(self, num_bytes: int) -> None:
+        """
+        Record that a read returned `num_bytes`, growing the buffer for the
+        next read if this one filled it.
+        """
+        if num_bytes >= self.size and self.size < self.max_size:
+            # Allocate a new buffer rather than resizing this one, since the
+            # caller may still hold a view onto it.
+            self.buffer = bytearray(min(self.size * 2, self.max_size))
+
+    def shrink(self) -> None:
+        """
+        Return the buffer to its initial size.
+        """
+        if self.size > self.initial_size:
+            self.buffer = bytearray(self.initial_size)
+
+
+class WriteBuffer:
+    """
+    Collects outgoing data, so that several small writes, such as the request
+    headers and the start of the body, may be sent together with a single
+    vectored write.
+    """
+
+    def __init__(self, max_size: int = WRITE_BUFFER_SIZE) -> None:
+        self.max_size = max_size
+        self.buffers: List[bytes] = []
+        self.size = 0
+
+    def __bool__(self) -> bool:
+        return bool(self.buffers)
+
+    def append(self, data: bytes) -> None:
+        if data:
+            self.buffers.append(data)
+            self.size += len(data)
+
+    def is_full(self) -> bool:
+        return self.size >= self.max_size
+
+    def take(self) -> List[bytes]:
+        """
+        Remove and return all of the buffered data.
+        """
+        buffers = self.buffers
+        self.buffers = []
+        self.size = 0
+        return buffers
@@ -0,0 +1,81 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple, Union
+
+from ._exceptions import ConnectError
+
+CacheKey = Tuple[bytes, int]
+
+
+class DNSCache:
+    """
+    An in-memory cache of resolved addresses, keyed on (hostname, port).
+
+    Successful lookups are kept for `ttl` seconds, and failed lookups for
+    `negative_ttl` seconds, so by default failures are not cached. Once there
+    are more than `max_entries` entries the least recently used entry is
+    evicted.
+
+    Its state is guarded by a thread lock, which is never held across any I/O.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 60.0,
+        negative_ttl: float = 0.0,
+        max_entries: int = 256,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        # Maps each key to an (expires_at, addresses or error message) pair,
+        # from least to most recently used.
+        self.entries: "OrderedDict[CacheKey, Tuple[float, Union[List[str], str]]]" = (
+            OrderedDict()
+        )
+        self.lock = threading.Lock()
+
+    def get(self, hostname: bytes, port: int) -> Optional[List[str]]:
+        """
+        Return the cached addresses for a host, or `None` on a cache miss.
+        Raises `ConnectError` if a recent lookup for the host failed.
+        """
+        key = (hostname, port)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= self.clock():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+
+        if isinstance(value, str):
+            raise ConnectError(value)
+        return list(value)
+
+    def set(self, hostname: bytes, port: int, addresses: List[str]) -> None:
+        if not addresses:
+            # Nothing to connect to, so let the next request look again.
+            return
+        self._store((hostname, port), self.ttl, list(addresses))
+
+    def set_error(self, hostname: bytes, port: int, exc: Exception) -> None:
+        self._store((hostname, port), self.negative_ttl, str(exc))
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+    def _store(self, key: CacheKey, ttl: float, value: Union[List[str], str]) -> None:
+        if ttl <= 0 or self.max_entries <= 0:
+            return
+        with self.lock:
+            self.entries[key] = (self.clock() + ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
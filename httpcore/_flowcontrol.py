@@ -0,0 +1,68 @@
+from typing import Optional
+
+# The receive windows used for HTTP/2 connections, unless configured otherwise.
+STREAM_WINDOW_SIZE = 2 ** 24
+CONNECTION_WINDOW_SIZE = 2 ** 24
+# The largest window that HTTP/2 allows. See RFC 7540, section 6.9.1.
+MAX_WINDOW_SIZE = 2 ** 31 - 1
+# The window that each HTTP/2 connection and stream starts with, before any
+# SETTINGS or WINDOW_UPDATE frames.
+DEFAULT_WINDOW_SIZE = 65535
+
+
+class BDPEstimator:
+    """
+    Estimates the bandwidth-delay product of a connection, in order to size
+    its receive windows.
+
+    Each sample starts with some received data, at which point a PING should
+    be sent, and ends when the PING is acknowledged. The data received in the
+    meantime is roughly what the link holds in flight. When a sample fills
+    most of the current window, the window is what limits throughput, so it is
+    grown to twice the sample, up to `max_window_size`.
+    """
+
+    def __init__(self, window_size: int, max_window_size: int) -> None:
+        self.window_size = window_size
+        self.max_window_size = max(window_size, max_window_size)
+        self.sample = 0
+        self.ping_sent_at: Optional[float] = None
+        self.rtt: Optional[float] = None
+        self.max_bandwidth = 0.0
+
+    def data_received(self, num_bytes: int, now: float) -> bool:
+        """
+        Record that `num_bytes` of data were received, returning `True` if a
+        PING should be sent now, to start a new sample.
+        """
+        if self.ping_sent_at is not None:
+            self.sample += num_bytes
+            return False
+        if self.window_size >= self.max_window_size:
+            return False
+
+        self.ping_sent_at = now
+        self.sample = num_bytes
+        return True
+
+    def ping_acknowledged(self, now: float) -> Optional[int]:
+        """
+        Complete the current sample, returning the new window size if the
+        window should grow.
+        """
+        if self.ping_sent_at is None:
+            return None
+
+        rtt = max(now - self.ping_sent_at, 1e-6)
+        self.ping_sent_at = None
+        # Smoothed, so that a single delayed acknowledgement doesn't make the
+        # link look slower than it is.
+        self.rtt = rtt if self.rtt is None else min(rtt, 0.9 * self.rtt + 0.1 * rtt)
+
+        bandwidth = self.sample / self.rtt
+        if self.sample < self.window_size * 2 / 3 or bandwidth < self.max_bandwidth:
+            return None
+
+        self.max_bandwidth = bandwidth
+        self.window_size = min(self.sample * 2, self.max_window_size)
+        return self.window_size
@@ -1,7 +1,18 @@
-from ssl import SSLContext
+from ssl import SSLContext, SSLSession
 from typing import Dict, List, Optional, Tuple, Union
 
-from .._backends.auto import SyncLock, SyncSocketStream, SyncBackend
+from .._backends.auto import (
+    HAPPY_EYEBALLS_DELAY,
+    SyncLock,
+    SyncResolver,
+    SyncSocketStream,
+    SyncBackend,
+    SocketOption,
+)
+from .._buffers import MAX_READ_SIZE
+from .._flowcontrol import CONNECTION_WINDOW_SIZE, STREAM_WINDOW_SIZE
+from .._tls import certificate_matches_hostname, default_ssl_context
+from .._trace import TraceCallback, trace
 from .base import (
     SyncByteStream,
     SyncHTTPTransport,
@@ -9,7 +20,11 @@ from .base import (
     NewConnectionRequired,
 )
 from .http2 import SyncHTTP2Connection
-from .http11 import SyncHTTP11Connection
+from .http11 import (
+    SyncHTTP11Connection,
+    SyncPipelinedHTTP11Connection,
+    is_pipelinable,
+)
 
 
 class SyncHTTPConnection(SyncHTTPTransport):
@@ -18,19 +33,49 @@ class SyncHTTPConnection(SyncHTTPTransport):
         origin: Tuple[bytes, bytes, int],
         http2: bool = False,
         ssl_context: SSLContext = None,
+        trace: TraceCallback = None,
+        happy_eyeballs_delay: float = HAPPY_EYEBALLS_DELAY,
+        resolver: SyncResolver = None,
+        uds: str = None,
+        socket_options: List[SocketOption] = None,
+        local_address: str = None,
+        tls_session: SSLSession = None,
+        pipeline_depth: int = 1,
+        read_buffer_size: int = None,
+        max_read_buffer_size: int = MAX_READ_SIZE,
+        http2_stream_window_size: int = STREAM_WINDOW_SIZE,
+        http2_connection_window_size: int = CONNECTION_WINDOW_SIZE,
+        http2_max_window_size: int = None,
     ):
         self.origin = origin
         self.http2 = http2
-        self.ssl_context = SSLContext() if ssl_context is None else ssl_context
-
-        if self.http2:
-            self.ssl_context.set_alpn_protocols(["http/1.1", "h2"])
+        self.ssl_context = (
+            default_ssl_context(http2) if ssl_context is None else ssl_context
+        )
+        self.trace = trace
+        self.happy_eyeballs_delay = happy_eyeballs_delay
+        self.resolver = resolver
+        self.uds = uds
+        self.socket_options = socket_options
+        self.local_address = local_address
+        # A TLS session from an earlier connection to the origin, to resume.
+        self.resume_tls_session = tls_session
+        self.pipeline_depth = pipeline_depth
+        self.read_buffer_size = read_buffer_size
+        self.max_read_buffer_size = max_read_buffer_size
+        self.http2_stream_window_size = http2_stream_window_size
+        self.http2_connection_window_size = http2_connection_window_size
+        self.http2_max_window_size = http2_max_window_size
 
         self.connection: Union[None, SyncHTTP11Connection, SyncHTTP2Connection] = None
         self.is_http11 = False
         self.is_http2 = False
         self.connect_failed = False
         self.expires_at: Optional[float] = None
+        # Used by the pool to decide when the connection should be retired.
+        self.num_requests = 0
+        self.connected_at: Optional[float] = None
+        self.is_retired = False
         self.backend = SyncBackend()
 
     @property
@@ -49,7 +94,9 @@ class SyncHTTPConnection(SyncHTTPTransport):
         stream: SyncByteStream = None,
         timeout: Dict[str, Optional[float]] = None,
     ) -> Tuple[bytes, int, bytes, List[Tuple[bytes, bytes]], SyncByteStream]:
-        assert url[:3] == self.origin
+        # HTTP/2 connections may also be shared by other origins.
+        # See `can_coalesce()`.
+        assert url[:3] == self.origin or self.is_http2
 
         with self.request_lock:
             if self.state == ConnectionState.PENDING:
@@ -62,28 +109,120 @@ class SyncHTTPConnection(SyncHTTPTransport):
                 pass
             elif self.state == ConnectionState.ACTIVE and self.is_http2:
                 pass
+            elif (
+                self.state == ConnectionState.ACTIVE
+                and self.can_pipeline()
+                and is_pipelinable(method, headers or [])
+            ):
+                pass
             else:
                 raise NewConnectionRequired()
+            self.num_requests += 1
 
         assert self.connection is not None
         return self.connection.request(method, url, headers, stream, timeout)
 
+    def connect(self, timeout: Dict[str, Optional[float]] = None) -> None:
+        """
+        Establish the connection ahead of sending any requests, leaving it IDLE.
+        """
+        with self.request_lock:
+            if self.state == ConnectionState.PENDING:
+                try:
+                    self._connect(timeout)
+                except:
+                    self.connect_failed = True
+                    raise
+                assert self.connection is not None
+                self.connection.state = ConnectionState.IDLE
+
     def _connect(
         self, timeout: Dict[str, Optional[float]] = None,
     ):
         scheme, hostname, port = self.origin
         timeout = {} if timeout is None else timeout
-        ssl_context = self.ssl_context if scheme == b"https" else None
-        socket = self.backend.open_tcp_stream(
-            hostname, port, ssl_context, timeout
-        )
+
+        # We open the TCP connection and perform the TLS handshake as separate
+        # steps, so that each may be traced individually.
+        if self.uds is not None:
+            with trace(
+                self.trace,
+                self.backend.time,
+                "connection.connect_uds",
+                origin=self.origin,
+                path=self.uds,
+            ):
+                socket = self.backend.open_uds_stream(
+                    self.uds, hostname, None, timeout
+                )
+        else:
+            with trace(
+                self.trace,
+                self.backend.time,
+                "connection.connect_tcp",
+                origin=self.origin,
+            ):
+                socket = self.backend.open_tcp_stream(
+                    hostname,
+                    port,
+                    None,
+                    timeout,
+                    self.happy_eyeballs_delay,
+                    self.resolver,
+                    self.socket_options,
+                    self.local_address,
+                )
+        if scheme == b"https":
+            with trace(
+                self.trace,
+                self.backend.time,
+                "connection.start_tls",
+                origin=self.origin,
+            ):
+                try:
+                    socket = socket.start_tls(
+                        hostname, self.ssl_context, timeout, self.resume_tls_session
+                    )
+                except BaseException:
+                    socket.close()
+                    raise
+
+        self.connected_at = self.backend.time()
         http_version = socket.get_http_version()
         if http_version == "HTTP/2":
             self.is_http2 = True
-            self.connection = SyncHTTP2Connection(socket=socket, backend=self.backend)
+            self.connection = SyncHTTP2Connection(
+                socket=socket,
+                ssl_context=self.ssl_context,
+                backend=self.backend,
+                trace=self.trace,
+                read_buffer_size=self.read_buffer_size,
+                max_read_buffer_size=self.max_read_buffer_size,
+                stream_window_size=self.http2_stream_window_size,
+                connection_window_size=self.http2_connection_window_size,
+                max_window_size=self.http2_max_window_size,
+            )
+        elif self.pipeline_depth > 1:
+            self.is_http11 = True
+            self.connection = SyncPipelinedHTTP11Connection(
+                socket=socket,
+                ssl_context=self.ssl_context,
+                backend=self.backend,
+                trace=self.trace,
+                read_buffer_size=self.read_buffer_size,
+                max_read_buffer_size=self.max_read_buffer_size,
+                pipeline_depth=self.pipeline_depth,
+            )
         else:
             self.is_http11 = True
-            self.connection = SyncHTTP11Connection(socket=socket)
+            self.connection = SyncHTTP11Connection(
+                socket=socket,
+                ssl_context=self.ssl_context,
+                backend=self.backend,
+                trace=self.trace,
+                read_buffer_size=self.read_buffer_size,
+                max_read_buffer_size=self.max_read_buffer_size,
+            )
 
     @property
     def state(self) -> ConnectionState:
@@ -93,15 +232,86 @@ class SyncHTTPConnection(SyncHTTPTransport):
             return ConnectionState.PENDING
         return self.connection.state
 
+    def can_pipeline(self) -> bool:
+        """
+        Return `True` if another request that `is_pipelinable()` may be
+        pipelined on the connection while it is ACTIVE.
+        """
+        if isinstance(self.connection, SyncPipelinedHTTP11Connection):
+            return self.connection.can_pipeline()
+        return False
+
+    @property
+    def http_version(self) -> Optional[str]:
+        if self.is_http2:
+            return "HTTP/2"
+        elif self.is_http11:
+            return "HTTP/1.1"
+        return None
+
+    @property
+    def bytes_read(self) -> int:
+        return 0 if self.connection is None else self.connection.socket.bytes_read
+
+    @property
+    def bytes_written(self) -> int:
+        return 0 if self.connection is None else self.connection.socket.bytes_written
+
+    @property
+    def tls_session(self) -> Optional[SSLSession]:
+        """
+        The TLS session for the connection, which may be resumed by later
+        connections to the same origin.
+        """
+        if self.connection is None:
+            return None
+        return self.connection.socket.get_tls_session()
+
     def is_connection_dropped(self) -> bool:
         return self.connection is not None and self.connection.is_connection_dropped()
 
+    def can_coalesce(
+        self, origin: Tuple[bytes, bytes, int], addresses: List[str]
+    ) -> bool:
+        """
+        Return `True` if this is an HTTP/2 connection that may also be used for
+        requests to another origin, whose host resolves to `addresses`.
+
+        The connection must be to one of those addresses, and the certificate
+        presented by the server must be valid for the host.
+        See RFC 7540, section 9.1.1.
+        """
+        scheme, hostname, port = origin
+        if (
+            self.connection is None
+            or not self.is_http2
+            or scheme != b"https"
+            or (scheme, port) != (self.origin[0], self.origin[2])
+        ):
+            return False
+
+        socket = self.connection.socket
+        return socket.get_peer_address() in addresses and certificate_matches_hostname(
+            socket.get_peer_certificate(), hostname.decode("ascii")
+        )
+
     def mark_as_ready(self) -> None:
         if self.connection is not None:
             self.connection.mark_as_ready()
 
+    def close(self) -> None:
+        with self.request_lock:
+            if self.connection is not None:
+                self.connection.close()
+
     def start_tls(
         self, hostname: bytes, timeout: Dict[str, Optional[float]] = None
     ):
         if self.connection is not None:
-            self.connection.start_tls(hostname, timeout)
+            with trace(
+                self.trace,
+                self.backend.time,
+                "connection.start_tls",
+                origin=self.origin,
+            ):
+                self.connection.start_tls(hostname, timeout)
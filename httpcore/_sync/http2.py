@@ -1,11 +1,14 @@
+from collections import deque
 from http import HTTPStatus
 from ssl import SSLContext
 from typing import (
     Iterator,
     Awaitable,
     Callable,
+    Deque,
     Dict,
     List,
+    NoReturn,
     Optional,
     Tuple,
     Union,
@@ -14,11 +17,34 @@ from typing import (
 import h2.connection
 import h2.events
 from h2.config import H2Configuration
+from h2.errors import ErrorCodes
 from h2.exceptions import NoAvailableStreamIDError
 from h2.settings import SettingCodes, Settings
 
-from .._backends.auto import SyncLock, SyncSemaphore, SyncSocketStream, SyncBackend
-from .._exceptions import PoolTimeout, ProtocolError
+from .._backends.auto import (
+    SyncEvent,
+    SyncLock,
+    SyncSemaphore,
+    SyncSocketStream,
+    SyncBackend,
+)
+from .._buffers import DEFAULT_READ_SIZE, MAX_READ_SIZE, ReadBuffer, WriteBuffer
+from .._exceptions import (
+    PoolTimeout,
+    ProtocolError,
+    ReadError,
+    ReadTimeout,
+    WriteTimeout,
+)
+from .._flowcontrol import (
+    CONNECTION_WINDOW_SIZE,
+    DEFAULT_WINDOW_SIZE,
+    STREAM_WINDOW_SIZE,
+    BDPEstimator,
+)
+from .._threadlock import ThreadLock
+from .._tls import default_ssl_context
+from .._trace import NullTrace, Trace, TraceCallback, trace
 from .base import (
     SyncByteStream,
     SyncHTTPTransport,
@@ -27,6 +53,10 @@ from .base import (
 )
 
 
+# Identifies the PINGs that we send to measure the round trip time.
+BDP_PING_DATA = b"httpcore"
+
+
 def get_reason_phrase(status_code: int) -> bytes:
     try:
         return HTTPStatus(status_code).phrase.encode("ascii")
@@ -35,7 +65,7 @@ def get_reason_phrase(status_code: int) -> bytes:
 
 
 class SyncHTTP2Connection(SyncHTTPTransport):
-    READ_NUM_BYTES = 4096
+    READ_NUM_BYTES = DEFAULT_READ_SIZE
     CONFIG = H2Configuration(validate_inbound_headers=False)
 
     def __init__(
@@ -43,16 +73,61 @@ class SyncHTTP2Connection(SyncHTTPTransport):
         socket: SyncSocketStream,
         backend: SyncBackend,
         ssl_context: SSLContext = None,
+        trace: TraceCallback = None,
+        read_buffer_size: int = None,
+        max_read_buffer_size: int = MAX_READ_SIZE,
+        stream_window_size: int = STREAM_WINDOW_SIZE,
+        connection_window_size: int = CONNECTION_WINDOW_SIZE,
+        max_window_size: int = None,
     ):
         self.socket = socket
-        self.ssl_context = SSLContext() if ssl_context is None else ssl_context
+        self.ssl_context = default_ssl_context() if ssl_context is None else ssl_context
+        self.stream_window_size = stream_window_size
+        self.connection_window_size = max(connection_window_size, DEFAULT_WINDOW_SIZE)
+        # If a maximum is given, then the windows grow towards it, as far as
+        # the bandwidth-delay product of the connection calls for.
+        self.bdp_estimator = (
+            None
+            if max_window_size is None
+            else BDPEstimator(
+                max(stream_window_size, self.connection_window_size), max_window_size
+            )
+        )
 
         self.backend = backend
+        self.trace = trace
+        self.read_buffer = ReadBuffer(
+            self.READ_NUM_BYTES if read_buffer_size is None else read_buffer_size,
+            max_read_buffer_size,
+        )
+        self.write_buffer = WriteBuffer()
         self.h2_state = h2.connection.H2Connection(config=self.CONFIG)
 
         self.sent_connection_init = False
         self.streams = {}  # type: Dict[int, SyncHTTP2Stream]
-        self.events = {}  # type: Dict[int, List[h2.events.Event]]
+        self.events = {}  # type: Dict[int, Deque[h2.events.Event]]
+        # Received data is returned to the connection's flow control window as
+        # soon as it arrives, so that a stream which is not being read cannot
+        # hold up the others. It is only returned to the stream's window once
+        # the stream's consumer has drained it, so that the amount buffered for
+        # each stream is bounded by its window, rather than by how quickly it
+        # is read. Both are batched up into WINDOW_UPDATE frames of at least
+        # half of the window.
+        self.connection_unacknowledged_bytes = 0
+        # For each stream that the server may still send data on.
+        self.unacknowledged_bytes = {}  # type: Dict[int, int]
+
+        # Once the connection is initiated, a background task reads from the
+        # network and dispatches events to each stream, waking the stream's
+        # consumer if it is waiting for one.
+        self.stream_wakeups = {}  # type: Dict[int, SyncEvent]
+        # Streams that are waiting for the outgoing flow control window to grow.
+        self.flow_wakeups = []  # type: List[SyncEvent]
+        self.reader_done = False
+        self.reader_error: Optional[Exception] = None
+        # Guards the H2 state, and the above, against the reader in the sync
+        # code, which runs in its own thread.
+        self.state_lock = ThreadLock()
 
         self.state = ConnectionState.ACTIVE
 
@@ -65,12 +140,12 @@ class SyncHTTP2Connection(SyncHTTPTransport):
         return self._initialization_lock
 
     @property
-    def read_lock(self) -> SyncLock:
+    def write_lock(self) -> SyncLock:
         # We do this lazily, to make sure backend autodetection always
         # runs within an async context.
-        if not hasattr(self, "_read_lock"):
-            self._read_lock = self.backend.create_lock()
-        return self._read_lock
+        if not hasattr(self, "_write_lock"):
+            self._write_lock = self.backend.create_lock()
+        return self._write_lock
 
     @property
     def streams_semaphore(self) -> SyncSemaphore:
@@ -105,11 +180,20 @@ class SyncHTTP2Connection(SyncHTTPTransport):
         self.streams_semaphore.acquire()
         try:
             with self.init_lock:
+                if self.reader_done:
+                    raise NewConnectionRequired()
                 if not self.sent_connection_init:
                     # The very first stream is responsible for initiating the connection.
                     self.state = ConnectionState.ACTIVE
-                    self.send_connection_init(timeout)
+                    with trace(
+                        self.trace,
+                        self.backend.time,
+                        "http2.send_connection_init",
+                        url=url,
+                    ):
+                        self.send_connection_init(timeout)
                     self.sent_connection_init = True
+                    self.backend.start_background_task(self.receive_loop)
 
                 try:
                     stream_id = self.h2_state.get_next_available_stream_id()
@@ -118,13 +202,19 @@ class SyncHTTP2Connection(SyncHTTPTransport):
                     raise NewConnectionRequired()
                 else:
                     self.state = ConnectionState.ACTIVE
+
+                h2_stream = SyncHTTP2Stream(stream_id=stream_id, connection=self)
+                with self.state_lock:
+                    self.streams[stream_id] = h2_stream
+                    self.events[stream_id] = deque()
+                    self.unacknowledged_bytes[stream_id] = 0
+                # Streams must be opened in the order that their IDs were
+                # allocated, so the headers are sent before releasing the lock.
+                h2_stream.open(method, url, headers, timeout)
         finally:
             self.streams_semaphore.release()
 
-        h2_stream = SyncHTTP2Stream(stream_id=stream_id, connection=self)
-        self.streams[stream_id] = h2_stream
-        self.events[stream_id] = []
-        return h2_stream.request(method, url, headers, stream, timeout)
+        return h2_stream.request(url, stream, timeout)
 
     def send_connection_init(self, timeout: Dict[str, Optional[float]]) -> None:
         """
@@ -143,6 +233,8 @@ class SyncHTTP2Connection(SyncHTTPTransport):
                 # These two are taken from h2 for safe defaults
                 SettingCodes.MAX_CONCURRENT_STREAMS: 100,
                 SettingCodes.MAX_HEADER_LIST_SIZE: 65536,
+                # Applies to every stream, without a WINDOW_UPDATE for each.
+                SettingCodes.INITIAL_WINDOW_SIZE: self.stream_window_size,
             },
         )
 
@@ -154,15 +246,22 @@ class SyncHTTP2Connection(SyncHTTPTransport):
         ]
 
         self.h2_state.initiate_connection()
-        self.h2_state.increment_flow_control_window(2 ** 24)
-        data_to_send = self.h2_state.data_to_send()
-        self.socket.write(data_to_send, timeout)
+        if self.connection_window_size > DEFAULT_WINDOW_SIZE:
+            self.h2_state.increment_flow_control_window(
+                self.connection_window_size - DEFAULT_WINDOW_SIZE
+            )
+        # Sent along with the headers of the first request.
+        self.write_outgoing_data(timeout, flush=False)
 
     @property
     def is_closed(self) -> bool:
         return False
 
     def is_connection_dropped(self) -> bool:
+        if self.sent_connection_init:
+            # The reader consumes any data as soon as it arrives, so the
+            # socket is never left readable.
+            return self.reader_done
         return self.socket.is_connection_dropped()
 
     def close(self) -> None:
@@ -176,18 +275,30 @@ class SyncHTTP2Connection(SyncHTTPTransport):
     ) -> int:
         """
         Returns the maximum allowable outgoing flow for a given stream.
-        If the allowable flow is zero, then waits on the network until
-        WindowUpdated frames have increased the flow rate.
+        If the allowable flow is zero, then waits until WindowUpdated frames
+        have increased the flow rate.
         https://tools.ietf.org/html/rfc7540#section-6.9
         """
-        local_flow = self.h2_state.local_flow_control_window(stream_id)
-        connection_flow = self.h2_state.max_outbound_frame_size
-        flow = min(local_flow, connection_flow)
-        while flow == 0:
-            self.receive_events(timeout)
-            local_flow = self.h2_state.local_flow_control_window(stream_id)
-            connection_flow = self.h2_state.max_outbound_frame_size
-            flow = min(local_flow, connection_flow)
+        while True:
+            with self.state_lock:
+                local_flow = self.h2_state.local_flow_control_window(stream_id)
+                connection_flow = self.h2_state.max_outbound_frame_size
+                flow = min(local_flow, connection_flow)
+                if flow > 0 or self.reader_done:
+                    break
+                wakeup = self.backend.create_event()
+                self.flow_wakeups.append(wakeup)
+
+            # The server may be waiting on data that has been held back.
+            self.write_outgoing_data(timeout)
+            wakeup.wait(timeout.get("write"))
+            with self.state_lock:
+                if wakeup in self.flow_wakeups:
+                    self.flow_wakeups.remove(wakeup)
+                    raise WriteTimeout()
+
+        if flow == 0:
+            self.raise_reader_error()
         return flow
 
     def wait_for_event(
@@ -195,31 +306,145 @@ class SyncHTTP2Connection(SyncHTTPTransport):
     ) -> h2.events.Event:
         """
         Returns the next event for a given stream.
-        If no events are available yet, then waits on the network until
-        an event is available.
+        If no events are available yet, then waits until the reader
+        receives one.
         """
-        with self.read_lock:
-            while not self.events[stream_id]:
-                self.receive_events(timeout)
-        return self.events[stream_id].pop(0)
+        if self.write_buffer:
+            # The server may be waiting on data that has been held back.
+            self.write_outgoing_data(timeout)
 
-    def receive_events(self, timeout: Dict[str, Optional[float]]) -> None:
+        event: Optional[h2.events.Event]
+        while True:
+            with self.state_lock:
+                if self.events[stream_id]:
+                    event = self.events[stream_id].popleft()
+                    break
+                if self.reader_done:
+                    event = None
+                    break
+                wakeup = self.backend.create_event()
+                self.stream_wakeups[stream_id] = wakeup
+
+            wakeup.wait(timeout.get("read"))
+            with self.state_lock:
+                if self.stream_wakeups.get(stream_id) is wakeup:
+                    del self.stream_wakeups[stream_id]
+                    raise ReadTimeout()
+
+        if event is None:
+            self.raise_reader_error()
+        if hasattr(event, "error_code"):
+            raise ProtocolError(event)
+        return event
+
+    def raise_reader_error(self) -> NoReturn:
+        if self.reader_error is not None:
+            raise self.reader_error
+        raise ReadError("The connection was closed.")
+
+    def receive_loop(self) -> None:
         """
-        Read some data from the network, and update the H2 state.
+        Read from the network for as long as the connection is open. Runs as
+        a background task, so that no stream has to read on behalf of others.
         """
-        data = self.socket.read(self.READ_NUM_BYTES, timeout)
-        events = self.h2_state.receive_data(data)
-        for event in events:
-            event_stream_id = getattr(event, "stream_id", 0)
-
-            if hasattr(event, "error_code"):
-                raise ProtocolError(event)
-
-            if event_stream_id in self.events:
-                self.events[event_stream_id].append(event)
+        try:
+            while self.state != ConnectionState.CLOSED:
+                self.receive_events({})
+        except Exception as exc:
+            if self.state != ConnectionState.CLOSED:
+                self.reader_error = exc
+        finally:
+            with self.state_lock:
+                self.reader_done = True
+                wakeups = list(self.stream_wakeups.values()) + self.flow_wakeups
+                self.stream_wakeups.clear()
+                self.flow_wakeups.clear()
+            for wakeup in wakeups:
+                wakeup.set()
+            try:
+                self.close()
+            except Exception:
+                pass
 
-        data_to_send = self.h2_state.data_to_send()
-        self.socket.write(data_to_send, timeout)
+    def receive_events(self, timeout: Dict[str, Optional[float]]) -> None:
+        """
+        Read some data from the network, update the H2 state, and dispatch
+        the resulting events to their streams.
+        """
+        if self.socket.supports_readinto:
+            view = self.read_buffer.view()
+            num_bytes = self.socket.readinto(view, timeout)
+            data: Union[bytes, memoryview] = view[:num_bytes]
+        else:
+            data = self.socket.read(self.read_buffer.size, timeout)
+            num_bytes = len(data)
+        if not num_bytes:
+            raise ReadError("The server closed the connection.")
+
+        wakeups = []
+        with self.state_lock:
+            events = self.h2_state.receive_data(data)
+            self.read_buffer.filled(num_bytes)
+            for event in events:
+                if isinstance(event, h2.events.ConnectionTerminated):
+                    raise ProtocolError(event)
+
+                if self.bdp_estimator is not None:
+                    self.sample_bdp(event)
+
+                if isinstance(event, h2.events.DataReceived):
+                    self.acknowledge_connection_data(event.flow_controlled_length)
+                elif isinstance(event, (h2.events.StreamEnded, h2.events.StreamReset)):
+                    # No more data will be sent on the stream.
+                    self.unacknowledged_bytes.pop(event.stream_id, None)
+
+                event_stream_id = getattr(event, "stream_id", 0)
+                if event_stream_id in self.events:
+                    self.events[event_stream_id].append(event)
+                    if event_stream_id in self.stream_wakeups:
+                        wakeups.append(self.stream_wakeups.pop(event_stream_id))
+
+                if isinstance(
+                    event, (h2.events.WindowUpdated, h2.events.RemoteSettingsChanged),
+                ):
+                    wakeups.extend(self.flow_wakeups)
+                    self.flow_wakeups.clear()
+
+        for wakeup in wakeups:
+            wakeup.set()
+        self.write_outgoing_data(timeout)
+
+    def sample_bdp(self, event: h2.events.Event) -> None:
+        """
+        Feed an event to the BDP estimator, sending the PINGs that it needs,
+        and growing the receive windows when it calls for it.
+        """
+        assert self.bdp_estimator is not None
+
+        if isinstance(event, h2.events.DataReceived):
+            amount = event.flow_controlled_length
+            if self.bdp_estimator.data_received(amount, self.backend.time()):
+                self.h2_state.ping(BDP_PING_DATA)
+        elif (
+            # Renamed to `PingAckReceived` in h2 3.1, which subclasses this.
+            isinstance(event, h2.events.PingAcknowledged)
+            and event.ping_data == BDP_PING_DATA
+        ):
+            window_size = self.bdp_estimator.ping_acknowledged(self.backend.time())
+            if window_size is None:
+                return
+
+            if window_size > self.stream_window_size:
+                # Open streams are adjusted once the server acknowledges this.
+                self.stream_window_size = window_size
+                self.h2_state.update_settings(
+                    {SettingCodes.INITIAL_WINDOW_SIZE: window_size}
+                )
+            if window_size > self.connection_window_size:
+                self.h2_state.increment_flow_control_window(
+                    window_size - self.connection_window_size
+                )
+                self.connection_window_size = window_size
 
     def send_headers(
         self,
@@ -228,37 +453,99 @@ class SyncHTTP2Connection(SyncHTTPTransport):
         end_stream: bool,
         timeout: Dict[str, Optional[float]],
     ) -> None:
-        self.h2_state.send_headers(stream_id, headers, end_stream=end_stream)
-        self.h2_state.increment_flow_control_window(2 ** 24, stream_id=stream_id)
-        data_to_send = self.h2_state.data_to_send()
-        self.socket.write(data_to_send, timeout)
+        with self.state_lock:
+            self.h2_state.send_headers(stream_id, headers, end_stream=end_stream)
+        # If there is a request body, then the headers are sent along with
+        # the start of it.
+        self.write_outgoing_data(timeout, flush=end_stream)
 
     def send_data(
         self, stream_id: int, chunk: bytes, timeout: Dict[str, Optional[float]]
     ) -> None:
-        self.h2_state.send_data(stream_id, chunk)
-        data_to_send = self.h2_state.data_to_send()
-        self.socket.write(data_to_send, timeout)
+        with self.state_lock:
+            self.h2_state.send_data(stream_id, chunk)
+        # Sent along with the headers, if they were held back, but otherwise
+        # as soon as it is available.
+        self.write_outgoing_data(timeout)
 
     def end_stream(
         self, stream_id: int, timeout: Dict[str, Optional[float]]
     ) -> None:
-        self.h2_state.end_stream(stream_id)
-        data_to_send = self.h2_state.data_to_send()
-        self.socket.write(data_to_send, timeout)
+        with self.state_lock:
+            self.h2_state.end_stream(stream_id)
+        self.write_outgoing_data(timeout)
+
+    def acknowledge_connection_data(self, amount: int) -> None:
+        """
+        Return received data to the connection's flow control window. Must be
+        called with the state lock held.
+        """
+        self.connection_unacknowledged_bytes += amount
+        if self.connection_unacknowledged_bytes >= self.connection_window_size // 2:
+            self.h2_state.increment_flow_control_window(
+                self.connection_unacknowledged_bytes
+            )
+            self.connection_unacknowledged_bytes = 0
 
     def acknowledge_received_data(
         self, stream_id: int, amount: int, timeout: Dict[str, Optional[float]]
     ) -> None:
-        self.h2_state.acknowledge_received_data(amount, stream_id)
-        data_to_send = self.h2_state.data_to_send()
-        self.socket.write(data_to_send, timeout)
+        """
+        Return data that has been read from a stream to its flow control window.
+        """
+        with self.state_lock:
+            if stream_id not in self.unacknowledged_bytes or not amount:
+                return
+            self.unacknowledged_bytes[stream_id] += amount
+            unacknowledged = self.unacknowledged_bytes[stream_id]
+            if unacknowledged < self.stream_window_size // 2:
+                return
+            self.h2_state.increment_flow_control_window(unacknowledged, stream_id)
+            self.unacknowledged_bytes[stream_id] = 0
+        self.write_outgoing_data(timeout)
+
+    def write_outgoing_data(
+        self, timeout: Dict[str, Optional[float]], flush: bool = True
+    ) -> None:
+        """
+        Send any outgoing data from the H2 state to the network.
+
+        If `flush` is `False` then the data may be held back, and sent along
+        with later frames in a single write.
+        """
+        with self.state_lock:
+            self.write_buffer.append(self.h2_state.data_to_send())
+            if not self.write_buffer or not (flush or self.write_buffer.is_full()):
+                return
+
+        # Frames must be written in the order that the H2 state produced
+        # them, so the data is taken and written while holding the lock.
+        # Another task may already have written it in the meantime.
+        with self.write_lock:
+            with self.state_lock:
+                self.write_buffer.append(self.h2_state.data_to_send())
+                buffers = self.write_buffer.take()
+            if buffers:
+                self.socket.write_many(buffers, timeout)
 
     def close_stream(self, stream_id: int) -> None:
-        del self.streams[stream_id]
-        del self.events[stream_id]
+        with self.state_lock:
+            del self.streams[stream_id]
+            del self.events[stream_id]
+            self.stream_wakeups.pop(stream_id, None)
+            # Any unread data has already been returned to the connection's
+            # flow control window, but not to the stream's window, so if the
+            # server has not finished sending then it must be told to stop.
+            cancel = stream_id in self.unacknowledged_bytes and not self.reader_done
+            self.unacknowledged_bytes.pop(stream_id, None)
+            if cancel:
+                self.h2_state.reset_stream(stream_id, ErrorCodes.CANCEL)
+
+        if cancel:
+            self.write_outgoing_data({})
 
         if not self.streams:
+            self.read_buffer.shrink()
             if self.state == ConnectionState.ACTIVE:
                 self.state = ConnectionState.IDLE
             elif self.state == ConnectionState.FULL:
@@ -269,34 +556,60 @@ class SyncHTTP2Stream:
     def __init__(self, stream_id: int, connection: SyncHTTP2Connection) -> None:
         self.stream_id = stream_id
         self.connection = connection
+        self.has_body = False
+
+    def trace_phase(
+        self, name: str, url: Tuple[bytes, bytes, int, bytes]
+    ) -> Union[Trace, NullTrace]:
+        return trace(
+            self.connection.trace,
+            self.connection.backend.time,
+            name,
+            url=url,
+            stream_id=self.stream_id,
+        )
 
-    def request(
+    def open(
         self,
         method: bytes,
         url: Tuple[bytes, bytes, int, bytes],
         headers: List[Tuple[bytes, bytes]] = None,
-        stream: SyncByteStream = None,
         timeout: Dict[str, Optional[float]] = None,
-    ) -> Tuple[bytes, int, bytes, List[Tuple[bytes, bytes]], SyncByteStream]:
+    ) -> None:
+        """
+        Open the stream, by sending the request headers.
+        """
         headers = [] if headers is None else [(k.lower(), v) for (k, v) in headers]
-        stream = SyncByteStream() if stream is None else stream
         timeout = {} if timeout is None else timeout
 
-        # Send the request.
         seen_headers = set(key for key, value in headers)
-        has_body = (
+        self.has_body = (
             b"content-length" in seen_headers or b"transfer-encoding" in seen_headers
         )
 
-        self.send_headers(method, url, headers, has_body, timeout)
-        if has_body:
-            self.send_body(stream, timeout)
+        with self.trace_phase("http2.send_request_headers", url):
+            self.send_headers(method, url, headers, self.has_body, timeout)
+
+    def request(
+        self,
+        url: Tuple[bytes, bytes, int, bytes],
+        stream: SyncByteStream = None,
+        timeout: Dict[str, Optional[float]] = None,
+    ) -> Tuple[bytes, int, bytes, List[Tuple[bytes, bytes]], SyncByteStream]:
+        stream = SyncByteStream() if stream is None else stream
+        timeout = {} if timeout is None else timeout
+
+        # Send the request body.
+        if self.has_body:
+            with self.trace_phase("http2.send_request_body", url):
+                self.send_body(stream, timeout)
 
         # Receive the response.
-        status_code, headers = self.receive_response(timeout)
+        with self.trace_phase("http2.receive_response_headers", url):
+            status_code, headers = self.receive_response(timeout)
         reason_phrase = get_reason_phrase(status_code)
         stream = SyncByteStream(
-            iterator=self.body_iter(timeout), close_func=self._response_closed
+            iterator=self.body_iter(url, timeout), close_func=self._response_closed
         )
 
         return (b"HTTP/2", status_code, reason_phrase, headers, stream)
@@ -359,18 +672,21 @@ class SyncHTTP2Stream:
         return (status_code, headers)
 
     def body_iter(
-        self, timeout: Dict[str, Optional[float]]
+        self, url: Tuple[bytes, bytes, int, bytes], timeout: Dict[str, Optional[float]]
     ) -> Iterator[bytes]:
-        while True:
-            event = self.connection.wait_for_event(self.stream_id, timeout)
-            if isinstance(event, h2.events.DataReceived):
-                amount = event.flow_controlled_length
-                self.connection.acknowledge_received_data(
-                    self.stream_id, amount, timeout
-                )
-                yield event.data
-            elif isinstance(event, (h2.events.StreamEnded, h2.events.StreamReset)):
-                break
+        with self.trace_phase("http2.receive_response_body", url):
+            while True:
+                event = self.connection.wait_for_event(self.stream_id, timeout)
+                if isinstance(event, h2.events.DataReceived):
+                    yield event.data
+                    # The consumer has asked for more, so has finished with
+                    # this data, and the peer may send more in its place.
+                    amount = event.flow_controlled_length
+                    self.connection.acknowledge_received_data(
+                        self.stream_id, amount, timeout
+                    )
+                elif isinstance(event, (h2.events.StreamEnded, h2.events.StreamReset)):
+                    break
 
     def _response_closed(self) -> None:
         self.connection.close_stream(self.stream_id)
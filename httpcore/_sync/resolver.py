@@ -0,0 +1,70 @@
+from typing import Dict, List, Optional
+
+from .._backends.auto import SyncResolver, SyncBackend
+from .._dns import DNSCache
+from .._exceptions import ConnectError
+
+
+class SyncSystemResolver(SyncResolver):
+    """
+    Resolves hostnames using `getaddrinfo()`, as provided by the concurrency
+    backend.
+    """
+
+    def __init__(self) -> None:
+        self.backend = SyncBackend()
+
+    def resolve(
+        self, hostname: bytes, port: int, timeout: Dict[str, Optional[float]]
+    ) -> List[str]:
+        return self.backend.getaddrinfo(hostname, port, timeout)
+
+
+class SyncCachingResolver(SyncResolver):
+    """
+    Wraps another resolver, caching both the addresses that it returns and
+    any lookups that fail.
+    """
+
+    def __init__(self, resolver: SyncResolver, cache: DNSCache = None) -> None:
+        self.resolver = resolver
+        self.cache = DNSCache() if cache is None else cache
+
+    def resolve(
+        self, hostname: bytes, port: int, timeout: Dict[str, Optional[float]]
+    ) -> List[str]:
+        addresses = self.cache.get(hostname, port)
+        if addresses is not None:
+            return addresses
+
+        try:
+            addresses = self.resolver.resolve(hostname, port, timeout)
+        except ConnectError as exc:
+            # Timeouts are not cached, since they say more about the
+            # resolver than about the hostname.
+            self.cache.set_error(hostname, port, exc)
+            raise
+        self.cache.set(hostname, port, addresses)
+        return addresses
+
+
+class SyncResolvedResolver(SyncResolver):
+    """
+    Wraps another resolver, returning addresses that have already been looked
+    up for one hostname and port, rather than looking them up again.
+    """
+
+    def __init__(
+        self, resolver: SyncResolver, hostname: bytes, port: int, addresses: List[str]
+    ) -> None:
+        self.resolver = resolver
+        self.hostname = hostname
+        self.port = port
+        self.addresses = addresses
+
+    def resolve(
+        self, hostname: bytes, port: int, timeout: Dict[str, Optional[float]]
+    ) -> List[str]:
+        if (hostname, port) == (self.hostname, self.port):
+            return self.addresses
+        return self.resolver.resolve(hostname, port, timeout)
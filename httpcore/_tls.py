@@ -0,0 +1,115 @@
+import ipaddress
+import ssl
+import threading
+from typing import Any, Dict, Optional
+
+try:
+    import contextvars
+except ImportError:  # pragma: nocover
+    contextvars = None  # type: ignore
+
+DEFAULT_SSL_CONTEXTS: Dict[bool, ssl.SSLContext] = {}
+DEFAULT_SSL_CONTEXTS_LOCK = threading.Lock()
+
+# The TLS session to resume in the handshake that is being started, if any.
+# See `ResumingSSLObject`.
+TLS_SESSION: Any = (
+    None if contextvars is None else contextvars.ContextVar("TLS_SESSION", default=None)
+)
+
+
+class ResumingSSLObject(ssl.SSLObject):
+    """
+    asyncio doesn't let us pass a TLS session to resume into `start_tls()`.
+    Instead, the SSL contexts that we create use this class as their
+    `sslobject_class`, and the asyncio backend passes the session through a
+    context variable, which is copied into the callback that starts the
+    handshake. Without a session it behaves exactly like `SSLObject`.
+
+    SSL contexts that are passed in by users are never modified, so with the
+    asyncio backend their sessions are not resumed.
+    """
+
+    @classmethod
+    def _create(cls, *args: Any, session: Any = None, **kwargs: Any) -> Any:
+        if session is None and TLS_SESSION is not None:
+            session = TLS_SESSION.get()
+        return super()._create(*args, session=session, **kwargs)  # type: ignore
+
+
+def default_ssl_context(http2: bool = False) -> ssl.SSLContext:
+    """
+    Return the SSL context to use when none is given, which verifies
+    certificates against the system trust store, and negotiates either
+    HTTP/1.1 only, or HTTP/1.1 and HTTP/2, using ALPN.
+
+    Loading the trust store is expensive, so each variant is created once
+    per process and shared by every connection. These contexts can resume
+    TLS sessions with every backend, see `ResumingSSLObject`.
+    """
+    with DEFAULT_SSL_CONTEXTS_LOCK:
+        ssl_context = DEFAULT_SSL_CONTEXTS.get(http2)
+        if ssl_context is None:
+            ssl_context = ssl.create_default_context()
+            ssl_context.sslobject_class = ResumingSSLObject
+            if http2:
+                ssl_context.set_alpn_protocols(["http/1.1", "h2"])
+            else:
+                ssl_context.set_alpn_protocols(["http/1.1"])
+            DEFAULT_SSL_CONTEXTS[http2] = ssl_context
+        return ssl_context
+
+
+def certificate_matches_hostname(
+    certificate: Optional[Dict[str, Any]], hostname: str
+) -> bool:
+    """
+    Return `True` if a peer certificate, as returned by `SSLSocket.getpeercert()`,
+    is valid for the given hostname.
+
+    Follows the rules of RFC 6125, as `ssl.match_hostname()` did. A wildcard is
+    only allowed as the entire left-most label, and matches exactly one label.
+    Certificates that were not verified are reported as an empty dictionary by
+    `getpeercert()`, and never match.
+    """
+    if not certificate:
+        return False
+
+    hostname = hostname.lower().rstrip(".")
+    try:
+        ip_address: Optional[Any] = ipaddress.ip_address(hostname)
+    except ValueError:
+        ip_address = None
+
+    dns_names = []
+    for key, value in certificate.get("subjectAltName", ()):
+        if key == "DNS":
+            dns_names.append(value)
+        elif key == "IP Address" and ip_address is not None:
+            if ipaddress.ip_address(value.rstrip()) == ip_address:
+                return True
+
+    if ip_address is not None:
+        return False
+
+    if not dns_names:
+        # Only fall back to the subject common name if there are
+        # no DNS names in the subject alternative name.
+        for rdn in certificate.get("subject", ()):
+            for key, value in rdn:
+                if key == "commonName":
+                    dns_names.append(value)
+
+    return any(_dns_name_matches(name, hostname) for name in dns_names)
+
+
+def _dns_name_matches(pattern: str, hostname: str) -> bool:
+    pattern = pattern.lower().rstrip(".")
+    if not pattern.startswith("*."):
+        return pattern == hostname
+
+    # "*.example.org" matches "www.example.org", but neither "example.org"
+    # nor "a.b.example.org".
+    _, _, suffix = pattern.partition(".")
+    label, _, rest = hostname.partition(".")
+    return bool(label) and rest == suffix
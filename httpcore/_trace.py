@@ -0,0 +1,84 @@
+from types import TracebackType
+from typing import Any, Callable, Dict, Optional, Type, Union
+
+TraceCallback = Callable[[str, Dict[str, Any]], None]
+
+
+class Trace:
+    """
+    Reports the phase of a request that it wraps to a trace callback, as a
+    "<name>.started" event, followed by either a "<name>.complete" or a
+    "<name>.failed" event.
+
+    Each event is passed a dictionary holding a monotonic "timestamp", any
+    additional information given for the phase, and for "<name>.failed"
+    events, the "exception" that was raised.
+
+    Used as a sync context manager in both the async and the sync code,
+    since it never performs any I/O.
+    """
+
+    def __init__(
+        self,
+        callback: TraceCallback,
+        clock: Callable[[], float],
+        name: str,
+        info: Dict[str, Any],
+    ) -> None:
+        self.callback = callback
+        self.clock = clock
+        self.name = name
+        self.info = info
+
+    def __enter__(self) -> None:
+        info = dict(self.info, timestamp=self.clock())
+        self.callback(self.name + ".started", info)
+
+    def __exit__(
+        self,
+        exc_type: Type[BaseException] = None,
+        exc_value: BaseException = None,
+        traceback: TracebackType = None,
+    ) -> None:
+        info = dict(self.info, timestamp=self.clock())
+        if exc_value is None:
+            self.callback(self.name + ".complete", info)
+        else:
+            info["exception"] = exc_value
+            self.callback(self.name + ".failed", info)
+
+
+class NullTrace:
+    """
+    Used in place of `Trace` when no trace callback is installed.
+    """
+
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(
+        self,
+        exc_type: Type[BaseException] = None,
+        exc_value: BaseException = None,
+        traceback: TracebackType = None,
+    ) -> None:
+        pass
+
+
+NULL_TRACE = NullTrace()
+
+
+def trace(
+    callback: Optional[TraceCallback],
+    clock: Callable[[], float],
+    name: str,
+    **info: Any,
+) -> Union[Trace, NullTrace]:
+    """
+    Return a context manager that traces a phase of a request, or a shared
+    no-op if there is no trace callback, so that tracing costs nothing
+    unless it is enabled.
+    """
+    if callback is None:
+        return NULL_TRACE
+    return Trace(callback, clock, name, info)
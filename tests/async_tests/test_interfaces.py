@@ -1,6 +1,12 @@
+import functools
+import socket
+import ssl
+
 import pytest
 
 import httpcore
+from httpcore._backends.auto import AutoBackend
+from httpcore._exceptions import ConnectError, PoolTimeout
 
 
 async def read_body(stream):
@@ -13,6 +19,17 @@ async def read_body(stream):
         await stream.aclose()
 
 
+async def wait_until(predicate, timeout=5.0):
+    """
+    Wait for another task, or thread, to make `predicate()` true.
+    """
+    backend = AutoBackend()
+    deadline = backend.time() + timeout
+    while not predicate():
+        assert backend.time() < deadline
+        await backend.create_event().wait(timeout=0.01)
+
+
 @pytest.mark.usefixtures("async_environment")
 async def test_http_request():
     async with httpcore.AsyncConnectionPool() as http:
@@ -173,3 +190,709 @@ async def test_http_request_cannot_reuse_dropped_connection():
         assert status_code == 200
         assert reason == b"OK"
         assert len(http.connections[url[:3]]) == 1
+
+
+@pytest.mark.usefixtures("async_environment")
+async def test_max_connections_closes_idle_connection_for_other_origin():
+    async with httpcore.AsyncConnectionPool(max_connections=1) as http:
+        method = b"GET"
+        url = (b"http", b"example.org", 80, b"/")
+        headers = [(b"host", b"example.org")]
+        http_version, status_code, reason, headers, stream = await http.request(
+            method, url, headers
+        )
+        body = await read_body(stream)
+
+        assert status_code == 200
+        assert len(http.connections[url[:3]]) == 1
+
+        # The IDLE connection to the first origin should be closed to make
+        # room, rather than blocking until the pool timeout.
+        method = b"GET"
+        url = (b"https", b"example.org", 443, b"/")
+        headers = [(b"host", b"example.org")]
+        http_version, status_code, reason, headers, stream = await http.request(
+            method, url, headers, timeout={"pool": 5.0}
+        )
+        body = await read_body(stream)
+
+        assert status_code == 200
+        assert list(http.connections.keys()) == [url[:3]]
+        assert http.num_connections == 1
+
+
+@pytest.mark.usefixtures("async_environment")
+async def test_max_connections_per_origin():
+    async with httpcore.AsyncConnectionPool(max_connections_per_origin=1) as http:
+        method = b"GET"
+        url = (b"http", b"example.org", 80, b"/")
+        headers = [(b"host", b"example.org")]
+        http_version, status_code, reason, _, stream = await http.request(
+            method, url, headers
+        )
+
+        # The only connection slot for this origin is in use, so a second
+        # request to the same origin should time out waiting for it.
+        with pytest.raises(PoolTimeout):
+            await http.request(method, url, headers, timeout={"pool": 0.1})
+
+        body = await read_body(stream)
+
+        assert status_code == 200
+        assert http.num_origin_connections == {url[:3]: 1}
+
+
+@pytest.mark.usefixtures("async_environment")
+async def test_waiters_are_served_in_order(server):
+    async with httpcore.AsyncConnectionPool(max_connections=1) as http:
+        method = b"GET"
+        headers = [(b"host", server.host)]
+        served = []
+        _, _, _, _, first_stream = await http.request(
+            method, server.url(b"/first"), headers
+        )
+
+        async def wait_for_connection(index):
+            # Queue up behind the waiters that were started before this one.
+            await wait_until(lambda: len(http.waiters) == index)
+            _, status_code, _, _, stream = await http.request(
+                method, server.url(b"/%d" % index), headers, timeout={"pool": 5.0}
+            )
+            served.append(index)
+            await read_body(stream)
+
+        async def release_connection():
+            await wait_until(lambda: len(http.waiters) == 3)
+            await read_body(first_stream)
+
+        await AutoBackend().run_concurrently(
+            [functools.partial(wait_for_connection, index) for index in range(3)]
+            + [release_connection]
+        )
+
+        # Each waiter was handed the connection in turn, as it was released.
+        assert served == [0, 1, 2]
+        assert server.requests == [
+            (0, b"GET", b"/first"),
+            (0, b"GET", b"/0"),
+            (0, b"GET", b"/1"),
+            (0, b"GET", b"/2"),
+        ]
+        assert http.num_connections == 1
+        assert not http.waiters
+
+
+@pytest.mark.usefixtures("async_environment")
+async def test_connection_pool_warm():
+    async with httpcore.AsyncConnectionPool(max_connections=2) as http:
+        url = (b"https", b"example.org", 443, b"/")
+        count = await http.warm(url[:3], 3)
+
+        assert count == 2
+        assert len(http.connections[url[:3]].idle) == 2
+
+        method = b"GET"
+        headers = [(b"host", b"example.org")]
+        http_version, status_code, reason, headers, stream = await http.request(
+            method, url, headers
+        )
+        body = await read_body(stream)
+
+        assert status_code == 200
+        assert len(http.connections[url[:3]]) == 2
+
+
+@pytest.mark.usefixtures("async_environment")
+async def test_connection_pool_stats():
+    async with httpcore.AsyncConnectionPool() as http:
+        method = b"GET"
+        url = (b"http", b"example.org", 80, b"/")
+        headers = [(b"host", b"example.org")]
+        for _ in range(2):
+            http_version, status_code, reason, _, stream = await http.request(
+                method, url, headers
+            )
+            body = await read_body(stream)
+            assert status_code == 200
+
+        stats = await http.stats()
+        assert stats["connects"] == 1
+        assert stats["reuses"] == 1
+        assert stats["closes"] == 0
+        origin_stats = stats["origins"][url[:3]]
+        assert origin_stats["states"] == {"IDLE": 1}
+        assert origin_stats["http_versions"] == {"HTTP/1.1": 1}
+        assert origin_stats["bytes_read"][0] > 0
+        assert origin_stats["bytes_written"][0] > 0
+
+
+@pytest.mark.usefixtures("async_environment")
+async def test_connection_index_after_reuse_and_close(server):
+    async with httpcore.AsyncConnectionPool() as http:
+        method = b"GET"
+        url = server.url()
+        headers = [(b"host", server.host)]
+        for _ in range(2):
+            http_version, status_code, reason, _, stream = await http.request(
+                method, url, headers
+            )
+            body = await read_body(stream)
+            assert status_code == 200
+
+        connections = http.connections[url[:3]]
+        assert len(connections) == 1
+        assert len(connections.idle) == 1
+        assert (await http.stats())["origins"][url[:3]]["states"] == {"IDLE": 1}
+
+        headers = [(b"host", server.host), (b"connection", b"close")]
+        http_version, status_code, reason, _, stream = await http.request(
+            method, url, headers
+        )
+        body = await read_body(stream)
+
+        assert status_code == 200
+        assert http.connections == {}
+        assert http.num_connections == 0
+        assert not http.idle_connections
+
+
+@pytest.mark.usefixtures("async_environment")
+async def test_connection_index_after_new_connection_required(server):
+    async with httpcore.AsyncConnectionPool(max_connections=1) as http:
+        method = b"GET"
+        url = server.url()
+        headers = [(b"host", server.host)]
+        http_version, status_code, reason, _, stream = await http.request(
+            method, url, headers
+        )
+        body = await read_body(stream)
+
+        # Close the connection underneath the pool, so that the next request
+        # to be sent on it raises `NewConnectionRequired`.
+        connection = list(http.connections[url[:3]])[0]
+        await connection.aclose()
+        connection.is_connection_dropped = lambda: False
+
+        http_version, status_code, reason, _, stream = await http.request(
+            method, url, headers, timeout={"pool": 1.0}
+        )
+        body = await read_body(stream)
+
+        assert status_code == 200
+        assert connection not in http.connections[url[:3]]
+        assert http.num_connections == 1
+        assert (await http.stats())["origins"][url[:3]]["states"] == {"IDLE": 1}
+
+
+@pytest.mark.usefixtures("async_environment")
+async def test_keepalive_expiry(server):
+    async with httpcore.AsyncConnectionPool(keepalive_expiry=10.0) as http:
+        now = [0.0]
+        http.backend.time = lambda: now[0]
+        method = b"GET"
+        url = server.url()
+        headers = [(b"host", server.host)]
+        http_version, status_code, reason, _, stream = await http.request(
+            method, url, headers
+        )
+        body = await read_body(stream)
+        connection = list(http.connections[url[:3]])[0]
+        assert connection.expires_at == 10.0
+
+        # Reusing the connection leaves a stale entry for it in the heap.
+        now[0] = 5.0
+        http_version, status_code, reason, _, stream = await http.request(
+            method, url, headers
+        )
+        body = await read_body(stream)
+        assert connection.expires_at == 15.0
+        assert len(http.expiry_heap) == 2
+
+        # The stale entry has expired, but the connection has not.
+        now[0] = 12.0
+        await http._close_expired_connections()
+        assert list(http.connections[url[:3]]) == [connection]
+        assert len(http.expiry_heap) == 1
+
+        now[0] = 16.0
+        await http._close_expired_connections()
+        assert http.connections == {}
+        assert http.num_connections == 0
+        assert http.expiry_heap == []
+
+
+@pytest.mark.usefixtures("async_environment")
+async def test_trace_callback():
+    events = []
+
+    def trace(name, info):
+        events.append((name, info["timestamp"]))
+
+    async with httpcore.AsyncConnectionPool(trace=trace) as http:
+        method = b"GET"
+        url = (b"https", b"example.org", 443, b"/")
+        headers = [(b"host", b"example.org")]
+        http_version, status_code, reason, headers, stream = await http.request(
+            method, url, headers
+        )
+        body = await read_body(stream)
+
+        assert status_code == 200
+        assert [name for name, timestamp in events] == [
+            "connection_pool.acquire_connection.started",
+            "connection_pool.acquire_connection.complete",
+            "connection.connect_tcp.started",
+            "connection.connect_tcp.complete",
+            "connection.start_tls.started",
+            "connection.start_tls.complete",
+            "http11.send_request_headers.started",
+            "http11.send_request_headers.complete",
+            "http11.send_request_body.started",
+            "http11.send_request_body.complete",
+            "http11.receive_response_headers.started",
+            "http11.receive_response_headers.complete",
+            "http11.receive_response_body.started",
+            "http11.receive_response_body.complete",
+        ]
+        timestamps = [timestamp for name, timestamp in events]
+        assert timestamps == sorted(timestamps)
+
+
+@pytest.mark.usefixtures("async_environment")
+async def test_max_requests_per_connection():
+    async with httpcore.AsyncConnectionPool(max_requests_per_connection=1) as http:
+        method = b"GET"
+        url = (b"http", b"example.org", 80, b"/")
+        headers = [(b"host", b"example.org")]
+        http_version, status_code, reason, _, stream = await http.request(
+            method, url, headers
+        )
+        body = await read_body(stream)
+
+        # The connection is retired, rather than kept alive, once the
+        # response has been read.
+        assert status_code == 200
+        assert http.connections == {}
+
+
+@pytest.mark.usefixtures("async_environment")
+async def test_max_keepalive_closes_least_recently_used_connection():
+    async with httpcore.AsyncConnectionPool(max_keepalive=1) as http:
+        method = b"GET"
+        http_url = (b"http", b"example.org", 80, b"/")
+        https_url = (b"https", b"example.org", 443, b"/")
+        headers = [(b"host", b"example.org")]
+        for url in (http_url, https_url):
+            http_version, status_code, reason, _, stream = await http.request(
+                method, url, headers
+            )
+            body = await read_body(stream)
+            assert status_code == 200
+
+        # The most recently used connection is the one that is kept alive.
+        assert list(http.connections.keys()) == [https_url[:3]]
+
+
+class StaticResolver(httpcore.AsyncResolver):
+    def __init__(self):
+        self.lookups = []
+
+    async def resolve(self, hostname, port, timeout):
+        self.lookups.append(hostname)
+        return ["127.0.0.1"]
+
+
+@pytest.mark.usefixtures("async_environment")
+async def test_http2_connection_coalescing(https_server, client_ssl_context):
+    resolver = StaticResolver()
+    async with httpcore.AsyncConnectionPool(
+        http2=True, ssl_context=client_ssl_context, resolver=resolver
+    ) as http:
+        method = b"GET"
+        for hostname in (b"example.org", b"example.com"):
+            url = (b"https", hostname, https_server.port, b"/")
+            headers = [(b"host", hostname)]
+            http_version, status_code, reason, _, stream = await http.request(
+                method, url, headers
+            )
+            body = await read_body(stream)
+            assert http_version == b"HTTP/2"
+            assert status_code == 200
+
+        # Both hosts resolve to the server's address, and are covered by its
+        # certificate, so the second request reuses the first connection.
+        assert https_server.requests == [(0, b"GET", b"/"), (0, b"GET", b"/")]
+        assert list(http.connections.keys()) == [
+            (b"https", b"example.org", https_server.port)
+        ]
+        assert resolver.lookups == [b"example.org", b"example.com"]
+
+
+@pytest.mark.usefixtures("async_environment")
+async def test_http2_connection_not_coalesced_for_other_certificate(
+    https_server, client_ssl_context
+):
+    resolver = StaticResolver()
+    async with httpcore.AsyncConnectionPool(
+        http2=True, ssl_context=client_ssl_context, resolver=resolver
+    ) as http:
+        method = b"GET"
+        url = (b"https", b"example.org", https_server.port, b"/")
+        headers = [(b"host", b"example.org")]
+        http_version, status_code, reason, _, stream = await http.request(
+            method, url, headers
+        )
+        body = await read_body(stream)
+        assert http_version == b"HTTP/2"
+
+        # The host resolves to the same address, but is not covered by the
+        # server's certificate, so a new connection is opened, and fails to
+        # verify the certificate.
+        url = (b"https", b"example.net", https_server.port, b"/")
+        headers = [(b"host", b"example.net")]
+        with pytest.raises(ConnectError):
+            await http.request(method, url, headers)
+
+        assert https_server.requests == [(0, b"GET", b"/")]
+        assert list(http.connections.keys()) == [
+            (b"https", b"example.org", https_server.port)
+        ]
+        # The addresses looked up for coalescing are reused by the new
+        # connection, so each host is only looked up once.
+        assert resolver.lookups == [b"example.org", b"example.net"]
+
+
+@pytest.mark.usefixtures("async_environment")
+async def test_tls_session_resumption_leaves_ssl_context_unchanged(
+    https_server, client_ssl_context
+):
+    async with httpcore.AsyncConnectionPool(
+        ssl_context=client_ssl_context, max_keepalive=0
+    ) as http:
+        method = b"GET"
+        url = https_server.url()
+        headers = [(b"host", https_server.host)]
+        for _ in range(2):
+            http_version, status_code, reason, _, stream = await http.request(
+                method, url, headers
+            )
+            body = await read_body(stream)
+            assert status_code == 200
+
+        # The second connection was offered the first connection's session.
+        assert [number for number, _, _ in https_server.requests] == [0, 1]
+        assert http.tls_sessions
+        assert client_ssl_context.sslobject_class is ssl.SSLObject
+
+
+@pytest.mark.usefixtures("async_environment")
+async def test_dns_cache():
+    async with httpcore.AsyncConnectionPool(
+        max_keepalive=0, dns_cache_ttl=60.0
+    ) as http:
+        method = b"GET"
+        url = (b"http", b"example.org", 80, b"/")
+        headers = [(b"host", b"example.org")]
+        http_version, status_code, reason, _, stream = await http.request(
+            method, url, headers
+        )
+        body = await read_body(stream)
+
+        assert status_code == 200
+        assert http.resolver.cache.get(b"example.org", 80)
+
+
+@pytest.mark.usefixtures("async_environment")
+async def test_custom_resolver():
+    class RecordingResolver(httpcore.AsyncResolver):
+        def __init__(self):
+            self.backend = AutoBackend()
+            self.hostnames = []
+
+        async def resolve(self, hostname, port, timeout):
+            self.hostnames.append(hostname)
+            return await self.backend.getaddrinfo(hostname, port, timeout)
+
+    resolver = RecordingResolver()
+    async with httpcore.AsyncConnectionPool(resolver=resolver) as http:
+        method = b"GET"
+        url = (b"http", b"example.org", 80, b"/")
+        headers = [(b"host", b"example.org")]
+        http_version, status_code, reason, _, stream = await http.request(
+            method, url, headers
+        )
+        body = await read_body(stream)
+
+        assert status_code == 200
+        assert resolver.hostnames == [b"example.org"]
+
+
+@pytest.mark.usefixtures("async_environment")
+async def test_dns_cache_disabled_by_default():
+    async with httpcore.AsyncConnectionPool() as http:
+        assert not hasattr(http.resolver, "cache")
+
+
+@pytest.mark.usefixtures("async_environment")
+async def test_resolver_without_addresses():
+    class EmptyResolver(httpcore.AsyncResolver):
+        async def resolve(self, hostname, port, timeout):
+            return []
+
+    async with httpcore.AsyncConnectionPool(resolver=EmptyResolver()) as http:
+        method = b"GET"
+        url = (b"http", b"example.org", 80, b"/")
+        headers = [(b"host", b"example.org")]
+        with pytest.raises(ConnectError):
+            await http.request(method, url, headers)
+
+
+@pytest.mark.usefixtures("async_environment")
+async def test_uds_connect_error():
+    async with httpcore.AsyncConnectionPool(uds="/nonexistent/httpcore.sock") as http:
+        method = b"GET"
+        url = (b"http", b"example.org", 80, b"/")
+        headers = [(b"host", b"example.org")]
+        with pytest.raises(ConnectError):
+            await http.request(method, url, headers)
+
+
+@pytest.mark.usefixtures("async_environment")
+async def test_socket_options():
+    socket_options = [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+    async with httpcore.AsyncConnectionPool(
+        socket_options=socket_options, local_address="0.0.0.0"
+    ) as http:
+        method = b"GET"
+        url = (b"http", b"example.org", 80, b"/")
+        headers = [(b"host", b"example.org")]
+        http_version, status_code, reason, _, stream = await http.request(
+            method, url, headers
+        )
+        body = await read_body(stream)
+
+        assert status_code == 200
+
+
+@pytest.mark.usefixtures("async_environment")
+async def test_tls_session_is_cached_for_origin():
+    async with httpcore.AsyncConnectionPool(max_requests_per_connection=1) as http:
+        method = b"GET"
+        url = (b"https", b"example.org", 443, b"/")
+        headers = [(b"host", b"example.org")]
+        for _ in range(2):
+            http_version, status_code, reason, _, stream = await http.request(
+                method, url, headers
+            )
+            body = await read_body(stream)
+            assert status_code == 200
+
+        # Each connection is retired after a single request, so the second
+        # connection may resume the TLS session of the first.
+        assert list(http.tls_sessions.keys()) == [url[:3]]
+
+
+@pytest.mark.usefixtures("async_environment")
+async def test_http11_pipelining(server):
+    async with httpcore.AsyncConnectionPool(pipeline_depth=2) as http:
+        method = b"GET"
+        headers = [(b"host", server.host)]
+        bodies = []
+
+        # The response to the first request is held open while the second
+        # request is sent, so the second request is pipelined behind it.
+        http_version, status_code, reason, _, first = await http.request(
+            method, server.url(b"/first"), headers
+        )
+
+        async def send_second() -> None:
+            http_version, status_code, reason, _, stream = await http.request(
+                method, server.url(b"/second"), headers
+            )
+            bodies.append(await read_body(stream))
+
+        async def read_first() -> None:
+            await wait_until(lambda: len(server.requests) == 2)
+            bodies.append(await read_body(first))
+
+        await AutoBackend().run_concurrently([send_second, read_first])
+
+        assert server.requests == [(0, b"GET", b"/first"), (0, b"GET", b"/second")]
+        assert bodies == [b"/first", b"/second"]
+
+
+@pytest.mark.usefixtures("async_environment")
+async def test_http11_requests_with_a_body_are_not_pipelined(server):
+    async with httpcore.AsyncConnectionPool(pipeline_depth=2) as http:
+        method = b"GET"
+        headers = [(b"host", server.host)]
+        http_version, status_code, reason, _, first = await http.request(
+            method, server.url(b"/first"), headers
+        )
+
+        async def request_body():
+            yield b"data"
+
+        headers = [(b"host", server.host), (b"content-length", b"4")]
+        stream = httpcore.AsyncByteStream(iterator=request_body())
+        http_version, status_code, reason, _, second = await http.request(
+            method, server.url(b"/second"), headers, stream
+        )
+
+        assert await read_body(second) == b"/second"
+        assert await read_body(first) == b"/first"
+        assert server.requests == [(0, b"GET", b"/first"), (1, b"GET", b"/second")]
+
+
+@pytest.mark.usefixtures("async_environment")
+async def test_http11_pipelined_request_times_out(server):
+    async with httpcore.AsyncConnectionPool(pipeline_depth=2) as http:
+        method = b"GET"
+        headers = [(b"host", server.host)]
+        http_version, status_code, reason, _, first = await http.request(
+            method, server.url(b"/first"), headers
+        )
+
+        # The second request is sent, but the first response is never read,
+        # so it cannot read its own response.
+        with pytest.raises(PoolTimeout):
+            await http.request(
+                method, server.url(b"/second"), headers, timeout={"pool": 0.1}
+            )
+
+        assert await read_body(first) == b"/first"
+        assert server.requests == [(0, b"GET", b"/first"), (0, b"GET", b"/second")]
+        # The unread response to the second request means that the connection
+        # cannot be reused.
+        assert not http._get_all_connections()
+
+
+@pytest.mark.usefixtures("async_environment")
+async def test_response_readinto():
+    async with httpcore.AsyncConnectionPool() as http:
+        method = b"GET"
+        url = (b"https", b"example.org", 443, b"/")
+        headers = [(b"host", b"example.org")]
+        http_version, status_code, reason, headers, stream = await http.request(
+            method, url, headers
+        )
+        buffer = bytearray(1024 * 1024)
+        view = memoryview(buffer)
+        total = 0
+        try:
+            while True:
+                num_bytes = await stream.readinto(view[total:])
+                if not num_bytes:
+                    break
+                total += num_bytes
+        finally:
+            await stream.aclose()
+
+        assert status_code == 200
+        assert b"Example Domain" in buffer[:total]
+
+
+@pytest.mark.usefixtures("async_environment")
+async def test_http2_unread_stream_does_not_block_others(
+    https_server, client_ssl_context
+):
+    # Each response is larger than the connection's flow control window.
+    https_server.handler = lambda method, target: b"x" * 200000
+    async with httpcore.AsyncConnectionPool(
+        http2=True,
+        ssl_context=client_ssl_context,
+        http2_stream_window_size=65535,
+        http2_connection_window_size=65535,
+    ) as http:
+        method = b"GET"
+        headers = [(b"host", https_server.host)]
+        timeout = {"read": 5.0}
+        _, _, _, _, unread_stream = await http.request(
+            method, https_server.url(b"/unread"), headers, timeout=timeout
+        )
+        # The first stream is never read, and fills its own window, but the
+        # data returns to the connection's window as soon as it is received.
+        http_version, status_code, reason, _, stream = await http.request(
+            method, https_server.url(b"/read"), headers, timeout=timeout
+        )
+        body = await read_body(stream)
+        await unread_stream.aclose()
+
+        assert http_version == b"HTTP/2"
+        assert len(body) == 200000
+        assert https_server.requests == [(0, b"GET", b"/unread"), (0, b"GET", b"/read")]
+
+
+@pytest.mark.usefixtures("async_environment")
+async def test_http2_unread_response_closed(https_server, client_ssl_context):
+    https_server.handler = lambda method, target: b"x" * 200000
+    async with httpcore.AsyncConnectionPool(
+        http2=True,
+        ssl_context=client_ssl_context,
+        http2_stream_window_size=65535,
+        http2_connection_window_size=65535,
+    ) as http:
+        method = b"GET"
+        headers = [(b"host", https_server.host)]
+        timeout = {"read": 5.0}
+        _, _, _, _, stream = await http.request(
+            method, https_server.url(b"/closed"), headers, timeout=timeout
+        )
+        await stream.aclose()
+
+        http_version, status_code, reason, _, stream = await http.request(
+            method, https_server.url(b"/read"), headers, timeout=timeout
+        )
+        body = await read_body(stream)
+
+        assert http_version == b"HTTP/2"
+        assert len(body) == 200000
+        assert len(http.connections[https_server.origin]) == 1
+
+
+@pytest.mark.usefixtures("async_environment")
+async def test_http2_response_closed_early_resets_stream(
+    https_server, client_ssl_context
+):
+    https_server.handler = lambda method, target: b"x" * 200000
+    async with httpcore.AsyncConnectionPool(
+        http2=True, ssl_context=client_ssl_context, http2_stream_window_size=65535
+    ) as http:
+        method = b"GET"
+        headers = [(b"host", https_server.host)]
+        for _ in range(3):
+            _, _, _, _, stream = await http.request(
+                method, https_server.url(), headers, timeout={"read": 5.0}
+            )
+            await stream.aclose()
+
+        # The server would otherwise wait forever for more of each stream's
+        # flow control window, and keep the streams open.
+        await wait_until(lambda: len(https_server.resets) == 3)
+        assert https_server.resets == [(0, 1), (0, 3), (0, 5)]
+
+
+@pytest.mark.usefixtures("async_environment")
+async def test_http2_window_autotuning(https_server, client_ssl_context):
+    # Enough data to fill the initial window many times over.
+    https_server.handler = lambda method, target: b"x" * (4 * 1024 * 1024)
+    async with httpcore.AsyncConnectionPool(
+        http2=True,
+        ssl_context=client_ssl_context,
+        http2_stream_window_size=65535,
+        http2_connection_window_size=65535,
+        http2_max_window_size=2 ** 24,
+    ) as http:
+        method = b"GET"
+        headers = [(b"host", https_server.host)]
+        http_version, status_code, reason, _, stream = await http.request(
+            method, https_server.url(), headers
+        )
+        body = await read_body(stream)
+
+        assert http_version == b"HTTP/2"
+        assert status_code == 200
+        assert len(body) == 4 * 1024 * 1024
+        (connection,) = http.connections[https_server.origin]
+        assert connection.connection.connection_window_size > 65535
+        assert connection.connection.stream_window_size > 65535
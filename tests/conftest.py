@@ -1,6 +1,207 @@
+import itertools
+import socket
+import ssl
+import threading
 import typing
 
+import h2.config
+import h2.connection
+import h2.events
+import h2.exceptions
+import h11
 import pytest
+import trustme
+
+# Called with the method and target of each request, returning the body.
+Handler = typing.Callable[[bytes, bytes], bytes]
+
+
+def default_handler(method: bytes, target: bytes) -> bytes:
+    """
+    Respond with the request target as the body, so that responses can be
+    matched up with their requests.
+    """
+    return target
+
+
+class Server:
+    """
+    A minimal HTTP server, which runs in background threads, for tests that
+    need to control or observe the server side of their connections.
+
+    If an `ssl_context` is given then connections use TLS, and either HTTP/2
+    or HTTP/1.1, as negotiated with ALPN.
+
+    Each request is recorded in `requests` as a (connection number, method,
+    target) tuple, as soon as its headers have been received, and is then
+    answered with the body returned by `handler`. HTTP/2 streams that the
+    client resets are recorded in `resets`, as (connection number, stream ID)
+    tuples.
+    """
+
+    host = b"127.0.0.1"
+
+    def __init__(
+        self, handler: Handler = default_handler, ssl_context: ssl.SSLContext = None
+    ) -> None:
+        self.handler = handler
+        self.ssl_context = ssl_context
+        self.scheme = b"http" if ssl_context is None else b"https"
+        self.requests: typing.List[typing.Tuple[int, bytes, bytes]] = []
+        self.resets: typing.List[typing.Tuple[int, int]] = []
+        self.connection_numbers = itertools.count()
+        self.connections: typing.List[socket.socket] = []
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.bind((self.host.decode("ascii"), 0))
+        self.listener.listen(16)
+        self.port = self.listener.getsockname()[1]
+        threading.Thread(target=self.serve, daemon=True).start()
+
+    def url(self, path: bytes = b"/") -> typing.Tuple[bytes, bytes, int, bytes]:
+        return (self.scheme, self.host, self.port, path)
+
+    @property
+    def origin(self) -> typing.Tuple[bytes, bytes, int]:
+        return (self.scheme, self.host, self.port)
+
+    def serve(self) -> None:
+        while True:
+            try:
+                sock, _ = self.listener.accept()
+            except OSError:
+                # The server has been closed.
+                return
+            self.connections.append(sock)
+            number = next(self.connection_numbers)
+            thread = threading.Thread(
+                target=self.handle_connection, args=(sock, number), daemon=True
+            )
+            thread.start()
+
+    def handle_connection(self, sock: socket.socket, number: int) -> None:
+        try:
+            if self.ssl_context is not None:
+                sock = self.ssl_context.wrap_socket(sock, server_side=True)
+                if sock.selected_alpn_protocol() == "h2":
+                    self.serve_http2(sock, number)
+                    return
+            self.serve_http11(sock, number)
+        except (OSError, h11.ProtocolError, h2.exceptions.ProtocolError):
+            pass
+        finally:
+            sock.close()
+
+    def serve_http11(self, sock: socket.socket, number: int) -> None:
+        conn = h11.Connection(our_role=h11.SERVER)
+        while True:
+            event = conn.next_event()
+            if event is h11.NEED_DATA:
+                conn.receive_data(sock.recv(65536))
+            elif isinstance(event, h11.Request):
+                self.requests.append((number, event.method, event.target))
+                body = self.handler(event.method, event.target)
+            elif isinstance(event, h11.EndOfMessage):
+                headers = [(b"content-length", str(len(body)).encode("ascii"))]
+                response = h11.Response(status_code=200, headers=headers)
+                sock.sendall(
+                    conn.send(response)
+                    + conn.send(h11.Data(data=body))
+                    + conn.send(h11.EndOfMessage())
+                )
+                if conn.our_state is not h11.DONE:
+                    return
+                conn.start_next_cycle()
+            elif isinstance(event, h11.ConnectionClosed):
+                return
+
+    def serve_http2(self, sock: socket.socket, number: int) -> None:
+        conn = h2.connection.H2Connection(
+            config=h2.config.H2Configuration(client_side=False)
+        )
+        conn.initiate_connection()
+        sock.sendall(conn.data_to_send())
+        # The rest of each response body, which is sent as flow control allows.
+        bodies: typing.Dict[int, bytes] = {}
+        while True:
+            data = sock.recv(65536)
+            if not data:
+                return
+            for event in conn.receive_data(data):
+                if isinstance(event, h2.events.RequestReceived):
+                    headers = dict(event.headers)
+                    method, target = headers[b":method"], headers[b":path"]
+                    self.requests.append((number, method, target))
+                    body = self.handler(method, target)
+                    headers = [
+                        (b":status", b"200"),
+                        (b"content-length", str(len(body)).encode("ascii")),
+                    ]
+                    conn.send_headers(event.stream_id, headers)
+                    bodies[event.stream_id] = body
+                elif isinstance(event, h2.events.StreamReset):
+                    self.resets.append((number, event.stream_id))
+                    bodies.pop(event.stream_id, None)
+
+            for stream_id, body in list(bodies.items()):
+                while body:
+                    window = conn.local_flow_control_window(stream_id)
+                    size = min(len(body), window, conn.max_outbound_frame_size)
+                    if not size:
+                        break
+                    conn.send_data(stream_id, body[:size])
+                    body = body[size:]
+                bodies[stream_id] = body
+                if not body:
+                    conn.end_stream(stream_id)
+                    del bodies[stream_id]
+            sock.sendall(conn.data_to_send())
+
+    def close(self) -> None:
+        self.listener.close()
+        for sock in self.connections:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+@pytest.fixture
+def server() -> typing.Iterator[Server]:
+    server = Server()
+    try:
+        yield server
+    finally:
+        server.close()
+
+
+@pytest.fixture(scope="session")
+def cert_authority() -> trustme.CA:
+    return trustme.CA()
+
+
+@pytest.fixture
+def https_server(cert_authority: trustme.CA) -> typing.Iterator[Server]:
+    ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    certificate = cert_authority.issue_cert(
+        "127.0.0.1", "localhost", "example.org", "example.com"
+    )
+    certificate.configure_cert(ssl_context)
+    ssl_context.set_alpn_protocols(["h2", "http/1.1"])
+    server = Server(ssl_context=ssl_context)
+    try:
+        yield server
+    finally:
+        server.close()
+
+
+@pytest.fixture
+def client_ssl_context(cert_authority: trustme.CA) -> ssl.SSLContext:
+    """
+    An SSL context that trusts the certificate of `https_server`.
+    """
+    ssl_context = ssl.create_default_context()
+    cert_authority.configure_trust(ssl_context)
+    return ssl_context
 
 
 @pytest.fixture(
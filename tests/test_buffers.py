@@ -0,0 +1,53 @@
+from httpcore._buffers import ReadBuffer, WriteBuffer
+
+
+def test_read_buffer_grows_when_filled():
+    buffer = ReadBuffer(initial_size=1024, max_size=4096)
+    assert buffer.size == 1024
+
+    buffer.filled(512)
+    assert buffer.size == 1024
+
+    buffer.filled(1024)
+    assert buffer.size == 2048
+    buffer.filled(2048)
+    assert buffer.size == 4096
+    buffer.filled(4096)
+    assert buffer.size == 4096
+
+
+def test_read_buffer_shrinks_when_idle():
+    buffer = ReadBuffer(initial_size=1024, max_size=4096)
+    buffer.filled(1024)
+    assert buffer.size == 2048
+
+    buffer.shrink()
+    assert buffer.size == 1024
+
+
+def test_read_buffer_view_may_outlive_resize():
+    buffer = ReadBuffer(initial_size=4, max_size=8)
+    view = buffer.view()
+    view[:4] = b"abcd"
+
+    buffer.filled(4)
+    assert bytes(view) == b"abcd"
+    assert len(buffer.view()) == 8
+
+
+def test_write_buffer():
+    buffer = WriteBuffer(max_size=8)
+    assert not buffer
+
+    buffer.append(b"")
+    assert not buffer
+
+    buffer.append(b"abcd")
+    assert buffer
+    assert not buffer.is_full()
+
+    buffer.append(b"efgh")
+    assert buffer.is_full()
+    assert buffer.take() == [b"abcd", b"efgh"]
+    assert not buffer
+    assert buffer.size == 0
@@ -0,0 +1,48 @@
+import tempfile
+
+from httpcore import SyncByteStream, SyncFileByteStream
+
+
+def test_readinto():
+    stream = SyncByteStream(iterator=iter([b"Hello, ", bytearray(b"world"), b"!"]))
+    buffer = bytearray(4)
+    chunks = []
+    while True:
+        num_bytes = stream.readinto(memoryview(buffer))
+        if not num_bytes:
+            break
+        chunks.append(bytes(buffer[:num_bytes]))
+
+    assert chunks == [b"Hell", b"o, ", b"worl", b"d", b"!"]
+
+
+def test_readinto_subclass():
+    class Stream(SyncByteStream):
+        def __iter__(self):
+            yield b"Hello, "
+            yield b"world!"
+
+    stream = Stream()
+    buffer = bytearray(16)
+    assert stream.readinto(memoryview(buffer)) == 7
+    assert stream.readinto(memoryview(buffer)[7:]) == 6
+    assert stream.readinto(memoryview(buffer)) == 0
+    assert buffer[:13] == b"Hello, world!"
+
+
+def test_iteration_yields_bytes():
+    stream = SyncByteStream(iterator=iter([bytearray(b"Hello")]))
+    assert [type(chunk) for chunk in stream] == [bytes]
+
+
+def test_file_byte_stream():
+    with tempfile.TemporaryFile() as file:
+        file.write(b"Hello, world!")
+        file.flush()
+
+        stream = SyncFileByteStream(file)
+        assert stream.count == 13
+        assert b"".join(stream) == b"Hello, world!"
+
+        stream = SyncFileByteStream(file, offset=7, count=5)
+        assert b"".join(stream) == b"world"
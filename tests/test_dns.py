@@ -0,0 +1,66 @@
+import pytest
+
+from httpcore._dns import DNSCache
+from httpcore._exceptions import ConnectError
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_cache_hit_and_expiry():
+    clock = Clock()
+    cache = DNSCache(ttl=10.0, clock=clock)
+
+    assert cache.get(b"example.org", 443) is None
+    cache.set(b"example.org", 443, ["93.184.216.34"])
+    assert cache.get(b"example.org", 443) == ["93.184.216.34"]
+    assert cache.get(b"example.org", 80) is None
+
+    clock.now = 10.0
+    assert cache.get(b"example.org", 443) is None
+
+
+def test_negative_cache():
+    clock = Clock()
+    cache = DNSCache(negative_ttl=5.0, clock=clock)
+
+    cache.set_error(b"invalid", 443, ConnectError("Name or service not known"))
+    with pytest.raises(ConnectError):
+        cache.get(b"invalid", 443)
+
+    clock.now = 5.0
+    assert cache.get(b"invalid", 443) is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = DNSCache(max_entries=2, clock=Clock())
+
+    cache.set(b"a.example.org", 443, ["10.0.0.1"])
+    cache.set(b"b.example.org", 443, ["10.0.0.2"])
+    assert cache.get(b"a.example.org", 443) == ["10.0.0.1"]
+    cache.set(b"c.example.org", 443, ["10.0.0.3"])
+
+    assert cache.get(b"a.example.org", 443) == ["10.0.0.1"]
+    assert cache.get(b"b.example.org", 443) is None
+    assert cache.get(b"c.example.org", 443) == ["10.0.0.3"]
+
+
+def test_cache_disabled():
+    cache = DNSCache(ttl=0, clock=Clock())
+
+    cache.set(b"example.org", 443, ["93.184.216.34"])
+    assert cache.get(b"example.org", 443) is None
+
+
+def test_failures_and_empty_results_are_not_cached_by_default():
+    cache = DNSCache(clock=Clock())
+
+    cache.set_error(b"invalid", 443, ConnectError("Name or service not known"))
+    assert cache.get(b"invalid", 443) is None
+    cache.set(b"example.org", 443, [])
+    assert cache.get(b"example.org", 443) is None
@@ -0,0 +1,30 @@
+from httpcore._flowcontrol import BDPEstimator
+
+
+def test_bdp_estimator_grows_window_when_it_limits_throughput():
+    estimator = BDPEstimator(window_size=1000, max_window_size=10000)
+
+    # The first data starts a sample, for which a PING should be sent.
+    assert estimator.data_received(100, now=0.0)
+    assert not estimator.data_received(800, now=0.05)
+    assert estimator.ping_acknowledged(now=0.1) == 1800
+    assert estimator.window_size == 1800
+
+
+def test_bdp_estimator_keeps_window_when_it_is_not_filled():
+    estimator = BDPEstimator(window_size=1000, max_window_size=10000)
+
+    assert estimator.data_received(100, now=0.0)
+    assert estimator.ping_acknowledged(now=0.1) is None
+    assert estimator.window_size == 1000
+
+
+def test_bdp_estimator_window_is_limited():
+    estimator = BDPEstimator(window_size=1000, max_window_size=1500)
+
+    assert estimator.data_received(1000, now=0.0)
+    assert estimator.ping_acknowledged(now=0.1) == 1500
+
+    # Once the window has reached its maximum, no more samples are taken.
+    assert not estimator.data_received(1000, now=0.2)
+    assert estimator.ping_acknowledged(now=0.3) is None
@@ -0,0 +1,22 @@
+from httpcore._backends.base import interleave_addresses
+
+
+def test_interleave_addresses():
+    addresses = ["::1", "::2", "10.0.0.1", "10.0.0.2", "10.0.0.3"]
+    assert interleave_addresses(addresses) == [
+        "::1",
+        "10.0.0.1",
+        "::2",
+        "10.0.0.2",
+        "10.0.0.3",
+    ]
+
+
+def test_interleave_addresses_starts_with_first_family():
+    addresses = ["10.0.0.1", "::1", "::2"]
+    assert interleave_addresses(addresses) == ["10.0.0.1", "::1", "::2"]
+
+
+def test_interleave_single_family():
+    assert interleave_addresses(["10.0.0.1", "10.0.0.2"]) == ["10.0.0.1", "10.0.0.2"]
+    assert interleave_addresses([]) == []
@@ -0,0 +1,109 @@
+from collections import OrderedDict
+
+from httpcore._async.base import ConnectionState
+from httpcore._async.connection_pool import OriginConnections
+
+
+class Connection:
+    def __init__(self, state: ConnectionState, http_version: str = None) -> None:
+        self.state = state
+        self.http_version = http_version
+        self.is_http11 = http_version == "HTTP/1.1"
+        self.is_http2 = http_version == "HTTP/2"
+        self.is_retired = False
+        self.pipelining = False
+
+    def can_pipeline(self) -> bool:
+        return self.pipelining
+
+
+def test_connections_are_indexed_by_state():
+    idle_lru = OrderedDict()
+    connections = OriginConnections(idle_lru)
+    connection = Connection(ConnectionState.PENDING)
+
+    connections.add(connection)
+    assert connections.pending == {connection}
+    assert connections.state_counts == {ConnectionState.PENDING: 1}
+
+    connection.state = ConnectionState.IDLE
+    connection.http_version = "HTTP/1.1"
+    connection.is_http11 = True
+    connections.update(connection)
+    assert not connections.pending
+    assert list(connections.idle) == [connection]
+    assert list(idle_lru) == [connection]
+    assert connections.http11 == {connection}
+    assert connections.state_counts == {ConnectionState.IDLE: 1}
+    assert connections.http_version_counts == {"HTTP/1.1": 1}
+
+    # Reusing the connection takes it out of the IDLE indexes.
+    assert connections.pop_idle() is connection
+    assert not idle_lru
+    connection.state = ConnectionState.ACTIVE
+    connections.update(connection)
+    assert not connections.idle
+    assert connections.state_counts == {ConnectionState.ACTIVE: 1}
+
+    connections.remove(connection)
+    assert not connections
+    assert not connections.http11
+    assert connections.state_counts == {}
+    assert connections.http_version_counts == {}
+
+
+def test_active_http2_connections_are_indexed():
+    connections = OriginConnections(OrderedDict())
+    connection = Connection(ConnectionState.ACTIVE, "HTTP/2")
+
+    connections.add(connection)
+    assert connections.http2 == {connection}
+
+    connection.state = ConnectionState.IDLE
+    connections.update(connection)
+    assert not connections.http2
+    assert list(connections.idle) == [connection]
+
+
+def test_pipelining_connections_are_indexed():
+    connections = OriginConnections(OrderedDict())
+    connection = Connection(ConnectionState.ACTIVE, "HTTP/1.1")
+    connection.pipelining = True
+
+    connections.add(connection)
+    assert connections.pipelining == {connection}
+
+    # For example, once the pipeline is full.
+    connection.pipelining = False
+    connections.update(connection)
+    assert not connections.pipelining
+
+    connection.pipelining = True
+    connections.update(connection)
+    connections.remove(connection)
+    assert not connections.pipelining
+
+
+def test_retired_connections_are_not_indexed_for_reuse():
+    connections = OriginConnections(OrderedDict())
+    connection = Connection(ConnectionState.IDLE, "HTTP/1.1")
+    connection.is_retired = True
+
+    connections.add(connection)
+    assert not connections.idle
+    assert connections.state_counts == {ConnectionState.IDLE: 1}
+
+
+def test_least_recently_used_is_shared_between_origins():
+    idle_lru = OrderedDict()
+    first = OriginConnections(idle_lru)
+    second = OriginConnections(idle_lru)
+    a = Connection(ConnectionState.IDLE, "HTTP/1.1")
+    b = Connection(ConnectionState.IDLE, "HTTP/1.1")
+
+    first.add(a)
+    second.add(b)
+    assert list(idle_lru) == [a, b]
+
+    first.discard_idle(a)
+    assert list(idle_lru) == [b]
@@ -0,0 +1,112 @@
+import ssl
+
+import pytest
+
+from httpcore._tls import (
+    TLS_SESSION,
+    ResumingSSLObject,
+    certificate_matches_hostname,
+    default_ssl_context,
+)
+
+CERTIFICATE = {
+    "subject": ((("commonName", "example.org"),),),
+    "subjectAltName": (
+        ("DNS", "example.org"),
+        ("DNS", "*.example.com"),
+        ("IP Address", "192.0.2.1"),
+    ),
+}
+
+
+@pytest.mark.parametrize(
+    "hostname,matches",
+    [
+        ("example.org", True),
+        ("EXAMPLE.ORG", True),
+        ("www.example.org", False),
+        ("www.example.com", True),
+        ("example.com", False),
+        ("a.b.example.com", False),
+        ("192.0.2.1", True),
+        ("192.0.2.2", False),
+    ],
+)
+def test_certificate_matches_hostname(hostname, matches):
+    assert certificate_matches_hostname(CERTIFICATE, hostname) is matches
+
+
+def test_common_name_fallback():
+    certificate = {"subject": ((("commonName", "example.org"),),)}
+    assert certificate_matches_hostname(certificate, "example.org")
+    assert not certificate_matches_hostname(certificate, "example.com")
+
+
+def test_unverified_certificate():
+    assert not certificate_matches_hostname({}, "example.org")
+    assert not certificate_matches_hostname(None, "example.org")
+
+
+def test_default_ssl_context_is_shared():
+    assert default_ssl_context() is default_ssl_context()
+    assert default_ssl_context(http2=True) is default_ssl_context(http2=True)
+    assert default_ssl_context() is not default_ssl_context(http2=True)
+
+
+def test_default_ssl_context_verifies_certificates():
+    ssl_context = default_ssl_context()
+    assert ssl_context.verify_mode == ssl.CERT_REQUIRED
+    assert ssl_context.check_hostname
+
+
+def test_default_ssl_context_can_resume_sessions():
+    assert default_ssl_context().sslobject_class is ResumingSSLObject
+    assert default_ssl_context(http2=True).sslobject_class is ResumingSSLObject
+
+
+def handshake(client_context, server_context):
+    """
+    Perform a TLS handshake in memory, returning the client's `SSLObject`.
+    """
+    client_incoming, client_outgoing = ssl.MemoryBIO(), ssl.MemoryBIO()
+    server_incoming, server_outgoing = ssl.MemoryBIO(), ssl.MemoryBIO()
+    client = client_context.wrap_bio(
+        client_incoming, client_outgoing, server_hostname="example.org"
+    )
+    server = server_context.wrap_bio(server_incoming, server_outgoing, server_side=True)
+    pending = [client, server]
+    while pending:
+        for ssl_object in list(pending):
+            try:
+                ssl_object.do_handshake()
+            except ssl.SSLWantReadError:
+                pass
+            else:
+                pending.remove(ssl_object)
+        server_incoming.write(client_outgoing.read())
+        client_incoming.write(server_outgoing.read())
+    return client
+
+
+def test_resuming_ssl_object(cert_authority):
+    server_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    # TLS 1.2 sessions are available as soon as the handshake completes.
+    server_context.maximum_version = ssl.TLSVersion.TLSv1_2
+    cert_authority.issue_cert("example.org").configure_cert(server_context)
+    client_context = ssl.create_default_context()
+    cert_authority.configure_trust(client_context)
+    client_context.sslobject_class = ResumingSSLObject
+
+    first = handshake(client_context, server_context)
+    assert not first.session_reused
+
+    token = TLS_SESSION.set(first.session)
+    try:
+        second = handshake(client_context, server_context)
+    finally:
+        TLS_SESSION.reset(token)
+    assert second.session_reused
+
+    # Without a session in the context variable, a new session is negotiated.
+    third = handshake(client_context, server_context)
+    assert not third.session_reused
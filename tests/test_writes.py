@@ -0,0 +1,122 @@
+import pytest
+
+from httpcore import SyncByteStream
+from httpcore._backends.base import AsyncSocketStream
+from httpcore._backends.sync import MAX_IOVECS, SyncSocketStream
+from httpcore._sync.http11 import SyncHTTP11Connection
+
+RESPONSE = b"HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n"
+
+
+class PartialSocket:
+    """
+    A fake socket that only accepts up to `limit` bytes for each send, and
+    which does not support `sendmsg()`.
+    """
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.received = b""
+
+    def settimeout(self, timeout):
+        pass
+
+    def send(self, data):
+        data = bytes(data[: self.limit])
+        self.received += data
+        return len(data)
+
+
+class PartialSendmsgSocket(PartialSocket):
+    def __init__(self, limit: int) -> None:
+        super().__init__(limit)
+        self.num_iovecs = []
+
+    def sendmsg(self, buffers):
+        self.num_iovecs.append(len(buffers))
+        return self.send(b"".join(buffers))
+
+
+def test_write_many_with_partial_sends():
+    sock = PartialSendmsgSocket(limit=3)
+    stream = SyncSocketStream(sock)
+
+    stream.write_many([b"Hello", b"", b", ", b"world!"], {})
+
+    assert sock.received == b"Hello, world!"
+    assert stream.bytes_written == len(b"Hello, world!")
+    assert len(sock.num_iovecs) == 5
+
+
+def test_write_many_is_limited_to_max_iovecs():
+    sock = PartialSendmsgSocket(limit=1000)
+    stream = SyncSocketStream(sock)
+    buffers = [b"%d," % index for index in range(MAX_IOVECS * 2 + 1)]
+
+    stream.write_many(buffers, {})
+
+    assert sock.received == b"".join(buffers)
+    assert sock.num_iovecs == [MAX_IOVECS, MAX_IOVECS, 1]
+
+
+def test_write_many_without_sendmsg():
+    sock = PartialSocket(limit=3)
+    stream = SyncSocketStream(sock)
+
+    stream.write_many([b"Hello", b", ", b"world!"], {})
+
+    assert sock.received == b"Hello, world!"
+
+
+@pytest.mark.asyncio
+async def test_write_many_default_implementation():
+    class Stream(AsyncSocketStream):
+        def __init__(self):
+            self.writes = []
+
+        async def write(self, data, timeout):
+            self.writes.append(data)
+
+    stream = Stream()
+    await stream.write_many([b"Hello", b", ", b"world!"], {})
+
+    assert stream.writes == [b"Hello, world!"]
+
+
+class RecordingStream:
+    """
+    A fake socket stream, which records each write, and responds with an
+    empty response.
+    """
+
+    supports_readinto = False
+
+    def __init__(self) -> None:
+        self.writes = []
+        self.response = RESPONSE
+
+    def write_many(self, buffers, timeout):
+        if buffers:
+            self.writes.append(b"".join(buffers))
+
+    def read(self, n, timeout):
+        data, self.response = self.response[:n], self.response[n:]
+        return data
+
+
+def test_request_body_chunks_are_not_held_back():
+    socket_stream = RecordingStream()
+    connection = SyncHTTP11Connection(socket=socket_stream)
+    method = b"POST"
+    url = (b"http", b"example.org", 80, b"/")
+    headers = [(b"host", b"example.org"), (b"content-length", b"10")]
+    stream = SyncByteStream(iterator=iter([b"01234", b"56789"]))
+
+    connection.request(method, url, headers, stream)
+
+    # The headers are sent along with the first chunk of the body, and each
+    # later chunk as soon as it is available.
+    assert len(socket_stream.writes) == 2
+    assert socket_stream.writes[0].startswith(b"POST / HTTP/1.1\r\n")
+    assert socket_stream.writes[0].endswith(b"\r\n\r\n01234")
+    assert socket_stream.writes[1] == b"56789"